@@ -0,0 +1,216 @@
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func
+
+from app import db
+from archive import attendance_rows, reaches_archive
+from models import Activity, DataVersion, Student
+
+# Participation histogram bucket edges, in percent
+HISTOGRAM_EDGES = list(range(0, 101, 10))
+
+def data_version():
+    """Return a key that changes whenever attendance, students or activities change, using one query"""
+    return tuple(DataVersion.get_many(DataVersion.ATTENDANCE, DataVersion.STUDENTS, DataVersion.ACTIVITIES).values())
+
+def window_start(now, weeks):
+    """Return the Monday starting the analytics window of the given number of weeks ending this week"""
+    today = now.date()
+    return today - timedelta(days=today.weekday() + 7 * (weeks - 1))
+
+class AnalyticsSnapshot:
+    """Columnar attendance for the activities in the analytics window and the statistics derived from it
+
+    Everything is computed with NumPy over column arrays, with all attendance in
+    the window pulled by a single query, so the cost is a few vector operations
+    per report instead of per-row Python work.
+    """
+
+    def __init__(self, now, weeks):
+        import numpy as np
+
+        self.built_at = now
+        self.weeks = weeks
+        self.start = window_start(now, weeks)
+
+        # Activities still in progress are left out until they end, so nobody counts as absent mid-scan
+        window = db.and_(
+            Activity.start_time >= self.start,
+            Activity.end_time <= now,
+            Activity.is_active == True
+        )
+
+        # Finished activities in the window, in chronological order
+        activities = db.session.query(Activity.id, Activity.name, Activity.start_time)\
+            .filter(window)\
+            .order_by(Activity.start_time, Activity.id)\
+            .all()
+        self.activity_ids = np.array([row.id for row in activities], dtype=np.int64)
+        self.activity_names = [row.name for row in activities]
+        self.activity_starts = [row.start_time for row in activities]
+
+        # The snapshot goes stale when the next activity ends or the week rolls over, even without writes
+        next_end = db.session.query(func.min(Activity.end_time))\
+            .filter(Activity.end_time > now, Activity.is_active == True)\
+            .scalar()
+        next_week = datetime.combine(self.start + timedelta(weeks=weeks), datetime.min.time())
+        self.expires_at = min(next_end, next_week) if next_end else next_week
+
+        students = db.session.query(Student.id, Student.student_id, Student.first_name, Student.last_name)\
+            .order_by(Student.id)\
+            .all()
+        self.student_ids = np.array([row.id for row in students], dtype=np.int64)
+        self.student_numbers = [row.student_id for row in students]
+        self.student_names = [f'{row.first_name} {row.last_name}' for row in students]
+
+        # One query for all attendance in the window, from both tiers once anything is archived,
+        # transposed into column arrays (a Core select skips the ORM's per-row bookkeeping)
+        attendance = attendance_rows(reaches_archive(self.start))
+        rows = db.session.execute(
+            db.select(attendance.c.student_id, attendance.c.activity_id)
+                .where(attendance.c.activity_id.in_(db.select(Activity.id).where(window)))
+        ).all()
+        columns = list(zip(*rows)) or [(), ()]
+        scanned_students = np.array(columns[0], dtype=np.int64)
+        scanned_activities = np.array(columns[1], dtype=np.int64)
+
+        n_students = len(self.student_ids)
+        n_activities = len(self.activity_ids)
+
+        # Map ids to positions; rows of students deleted meanwhile are dropped
+        student_pos = np.searchsorted(self.student_ids, scanned_students)
+        valid = student_pos < n_students
+        valid[valid] = self.student_ids[student_pos[valid]] == scanned_students[valid]
+        activity_order = np.argsort(self.activity_ids)
+        activity_pos = activity_order[np.searchsorted(self.activity_ids[activity_order], scanned_activities)] \
+            if n_activities else np.zeros(0, dtype=np.int64)
+        student_pos, activity_pos = student_pos[valid], activity_pos[valid]
+
+        # Per student: activities attended, participation rate and misses since the last attended one
+        self.attended = np.bincount(student_pos, minlength=n_students)
+        self.participation = self.attended / n_activities * 100 if n_activities else np.zeros(n_students)
+        self.last_attended = np.full(n_students, -1, dtype=np.int64)
+        np.maximum.at(self.last_attended, student_pos, activity_pos)
+        self.missed_streak = n_activities - 1 - self.last_attended
+
+        # Per activity: attendance count and rate
+        self.activity_counts = np.bincount(activity_pos, minlength=n_activities)
+        self.activity_rates = self.activity_counts / n_students * 100 if n_students else np.zeros(n_activities)
+
+        # Activity x week heatmap by session start; sessions sharing a name (a recurring activity) share a row
+        self.heatmap_names, name_codes = np.unique(np.array(self.activity_names, dtype=object), return_inverse=True) \
+            if n_activities else (np.array([], dtype=object), np.zeros(0, dtype=np.int64))
+        cells = name_codes * weeks + np.array(
+            [(start.date() - self.start).days // 7 for start in self.activity_starts], dtype=np.int64
+        )
+        shape = (len(self.heatmap_names), weeks)
+        self.heatmap_counts = np.bincount(cells, weights=self.activity_counts, minlength=shape[0] * weeks)\
+            .astype(np.int64).reshape(shape)
+        self.heatmap_sessions = np.bincount(cells, minlength=shape[0] * weeks).reshape(shape)
+
+    def student_row(self, index):
+        last = int(self.last_attended[index])
+        return {
+            'id': int(self.student_ids[index]),
+            'student_id': self.student_numbers[index],
+            'name': self.student_names[index],
+            'attended': int(self.attended[index]),
+            'participation': round(float(self.participation[index]), 1),
+            'missed_streak': int(self.missed_streak[index]),
+            'last_attended': self.activity_starts[last].isoformat() if last >= 0 else None
+        }
+
+    def summary(self):
+        import numpy as np
+
+        histogram, _ = np.histogram(self.participation, bins=HISTOGRAM_EDGES)
+        has_students = len(self.student_ids) > 0
+        return {
+            'window': {'start': self.start.isoformat(), 'weeks': self.weeks},
+            'students': len(self.student_ids),
+            'activities': len(self.activity_ids),
+            'attendance': int(self.activity_counts.sum()),
+            'mean_participation': round(float(self.participation.mean()), 1) if has_students else 0.0,
+            'median_participation': round(float(np.median(self.participation)), 1) if has_students else 0.0,
+            'histogram': {'edges': HISTOGRAM_EDGES, 'counts': histogram.tolist()},
+            'activity_rates': [
+                {
+                    'id': int(activity_id),
+                    'name': name,
+                    'start_time': start.isoformat(),
+                    'count': int(count),
+                    'rate': round(float(rate), 1)
+                }
+                for activity_id, name, start, count, rate in zip(
+                    self.activity_ids, self.activity_names, self.activity_starts,
+                    self.activity_counts, self.activity_rates
+                )
+            ]
+        }
+
+    def heatmap(self, limit):
+        """Return the busiest recurring activities' attendance and session counts per week"""
+        import numpy as np
+
+        rows = np.argsort(-self.heatmap_counts.sum(axis=1), kind='stable')[:limit]
+        return {
+            'weeks': [(self.start + timedelta(weeks=week)).isoformat() for week in range(self.weeks)],
+            'activities': [str(self.heatmap_names[row]) for row in rows],
+            'counts': self.heatmap_counts[rows].tolist(),
+            'sessions': self.heatmap_sessions[rows].tolist()
+        }
+
+    def participation_page(self, offset, limit, descending=False):
+        """Return students ordered by participation (lowest first unless descending)"""
+        import numpy as np
+
+        key = -self.participation if descending else self.participation
+        order = np.lexsort((self.student_ids, key))[offset:offset + limit]
+        return [self.student_row(index) for index in order]
+
+    def at_risk(self, max_rate, min_missed, limit):
+        """Return students below max_rate participation or with min_missed consecutive misses, worst first"""
+        import numpy as np
+
+        if len(self.activity_ids) < current_app.config['ANALYTICS_MIN_ACTIVITIES']:
+            return []
+        flagged = np.flatnonzero((self.participation < max_rate) | (self.missed_streak >= min_missed))
+        order = flagged[np.lexsort((self.student_ids[flagged], -self.missed_streak[flagged], self.participation[flagged]))]
+        return [self.student_row(index) for index in order[:limit]]
+
+class AnalyticsCache:
+    """Per-worker analytics snapshot, rebuilt when the data version changes or the snapshot expires"""
+
+    def __init__(self):
+        self._snapshot = None
+        self._version = None
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def get(self):
+        now = datetime.utcnow()
+        weeks = current_app.config['ANALYTICS_WEEKS']
+        version = data_version()
+
+        snapshot = self._snapshot
+        if self._is_current(snapshot, version, weeks, now):
+            return snapshot
+
+        # One build at a time; requests that waited reuse the result
+        with self._lock:
+            snapshot = self._snapshot
+            if not self._is_current(snapshot, version, weeks, now):
+                snapshot = AnalyticsSnapshot(now, weeks)
+                self._snapshot, self._version = snapshot, version
+                self.builds += 1
+        return snapshot
+
+    def _is_current(self, snapshot, version, weeks, now):
+        return snapshot is not None and self._version == version and snapshot.weeks == weeks and now < snapshot.expires_at
+
+    def invalidate(self):
+        self._snapshot = None
+
+analytics_cache = AnalyticsCache()
@@ -1,15 +1,21 @@
 import os
-import logging
+import sqlite3
+import threading
 
-from flask import Flask
+from flask import Flask, current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import DeclarativeBase
 from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
 from werkzeug.middleware.proxy_fix import ProxyFix
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+from logging_config import configure_logging, register_request_logging
+
+# Configure logging from LOG_MODE (text, or json through a background writer thread), LOG_LEVEL,
+# LOG_SAMPLE_RATES ("event=fraction" pairs for high-volume records such as scans) and LOG_SQL
+configure_logging()
 
 class Base(DeclarativeBase):
     pass
@@ -20,60 +26,218 @@ db = SQLAlchemy(model_class=Base)
 # Initialize CSRF protection
 csrf = CSRFProtect()
 
-# Create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "dev_secret_key")
-
-# Initialize CSRF protection
-csrf.init_app(app)
-
-# Configure the ProxyFix middleware
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)  # needed for url_for to generate with https
-
-# Configure database connection
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///student_management.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-# Initialize SQLAlchemy with the Flask app
-db.init_app(app)
-
 # Initialize LoginManager
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message_category = 'info'
 
-# Import routes after initializing everything to avoid circular imports
-with app.app_context():
-    # Import models for db.create_all()
-    from models import User, Student, Activity, Attendance
-    
-    # Create all database tables
-    db.create_all()
-    
-    # Check if an admin user exists, if not create one
-    if not User.query.filter_by(username='admin').first():
-        from werkzeug.security import generate_password_hash
-        admin = User(
-            username='admin',
-            email='admin@example.com',
-            password_hash=generate_password_hash('admin123'),
-            is_admin=True
-        )
-        db.session.add(admin)
-        db.session.commit()
-        logging.info("Created default admin user")
-    
-    # Import and register routes
+def create_app(test_config=None):
+    """Create and configure the Flask app without touching the database"""
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("SESSION_SECRET", "dev_secret_key")
+    
+    # Configure the ProxyFix middleware
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)  # needed for url_for to generate with https
+    
+    # Configure database connection
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///student_management.db")
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    
+    # SQLite connection tuning for concurrent workers (WAL journal with fewer fsyncs, lock wait in ms either way)
+    app.config["SQLITE_WAL"] = os.environ.get("SQLITE_WAL", "1") == "1"
+    app.config["SQLITE_BUSY_TIMEOUT"] = int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000))
+    
+    # Scan inserts (single, batch and sync): "direct" commits them with the request, "buffered" queues
+    # them for a background writer that commits every ATTENDANCE_FLUSH_MS or ATTENDANCE_FLUSH_ROWS scans
+    app.config["ATTENDANCE_WRITE_MODE"] = os.environ.get("ATTENDANCE_WRITE_MODE", "direct")
+    app.config["ATTENDANCE_FLUSH_MS"] = float(os.environ.get("ATTENDANCE_FLUSH_MS", 5))
+    app.config["ATTENDANCE_FLUSH_ROWS"] = int(os.environ.get("ATTENDANCE_FLUSH_ROWS", 200))
+    app.config["ATTENDANCE_WRITE_TIMEOUT"] = float(os.environ.get("ATTENDANCE_WRITE_TIMEOUT", 10))
+    
+    # Maximum number of scans accepted by the batch attendance endpoint
+    app.config["SCAN_BATCH_LIMIT"] = int(os.environ.get("SCAN_BATCH_LIMIT", 500))
+    # Seconds before an activity starts that an offline scanner's capture time is still trusted
+    app.config["SCAN_CAPTURE_SLACK"] = int(os.environ.get("SCAN_CAPTURE_SLACK", 3600))
+    
+    # Keyset pagination page sizes for listings
+    app.config["PAGE_SIZE"] = int(os.environ.get("PAGE_SIZE", 50))
+    app.config["MAX_PAGE_SIZE"] = int(os.environ.get("MAX_PAGE_SIZE", 500))
+    
+    # Rows fetched per round trip when streaming report exports
+    app.config["EXPORT_BATCH_SIZE"] = int(os.environ.get("EXPORT_BATCH_SIZE", 1000))
+    
+    # Per-worker student roster cache used by the scan endpoints
+    app.config["ROSTER_CACHE_SIZE"] = int(os.environ.get("ROSTER_CACHE_SIZE", 50000))
+    app.config["ROSTER_VERSION_CHECK_INTERVAL"] = float(os.environ.get("ROSTER_VERSION_CHECK_INTERVAL", 2.0))
+    
+    # Student typeahead search: SQLite FTS5 trigram index (when available) and default result count
+    app.config["SEARCH_FTS"] = os.environ.get("SEARCH_FTS", "1") == "1"
+    app.config["SEARCH_LIMIT"] = int(os.environ.get("SEARCH_LIMIT", 10))
+    
+    # Per-worker cache of logged-in users consulted on every authenticated request
+    app.config["USER_CACHE_SIZE"] = int(os.environ.get("USER_CACHE_SIZE", 1024))
+    app.config["USER_CACHE_TTL"] = float(os.environ.get("USER_CACHE_TTL", 60.0))
+    
+    # Signed student QR tokens; bumping the version revokes all issued codes
+    app.config["QR_TOKEN_VERSION"] = int(os.environ.get("QR_TOKEN_VERSION", 1))
+    # Keep accepting the old JSON QR payloads while printed codes are being reissued
+    app.config["QR_ACCEPT_LEGACY"] = os.environ.get("QR_ACCEPT_LEGACY", "1") == "1"
+    # Seconds browsers may reuse a student's QR data before revalidating it
+    app.config["QR_DATA_MAX_AGE"] = int(os.environ.get("QR_DATA_MAX_AGE", 3600))
+    
+    # Rows validated and inserted per transaction by the bulk student import
+    app.config["IMPORT_CHUNK_SIZE"] = int(os.environ.get("IMPORT_CHUNK_SIZE", 1000))
+    
+    # Live attendance feed: seconds between polls (by take pages, or per activity when the ASGI app
+    # streams it), rows per poll, seconds between keep-alive comments and seconds before a stream is closed
+    app.config["LIVE_FEED_POLL_INTERVAL"] = float(os.environ.get("LIVE_FEED_POLL_INTERVAL", 1.0))
+    app.config["LIVE_FEED_BATCH_SIZE"] = int(os.environ.get("LIVE_FEED_BATCH_SIZE", 500))
+    app.config["LIVE_FEED_KEEPALIVE"] = float(os.environ.get("LIVE_FEED_KEEPALIVE", 15.0))
+    app.config["LIVE_FEED_MAX_DURATION"] = float(os.environ.get("LIVE_FEED_MAX_DURATION", 300.0))
+    
+    # Server-side QR images: on-disk cache location, pixels per module and badge sheet worker processes
+    # (used by flask qr badges; badge downloads render in the request thread)
+    app.config["QR_CACHE_DIR"] = os.environ.get("QR_CACHE_DIR", os.path.join(app.instance_path, "qr_cache"))
+    app.config["QR_IMAGE_SCALE"] = int(os.environ.get("QR_IMAGE_SCALE", 8))
+    app.config["BADGE_WORKERS"] = int(os.environ.get("BADGE_WORKERS", os.cpu_count() or 1))
+    
+    # Attendance analytics: weeks covered, at-risk thresholds (participation % and consecutive
+    # misses), activities required before flagging anyone and rows shown in the heatmap
+    app.config["ANALYTICS_WEEKS"] = int(os.environ.get("ANALYTICS_WEEKS", 12))
+    app.config["ANALYTICS_AT_RISK_RATE"] = float(os.environ.get("ANALYTICS_AT_RISK_RATE", 50))
+    app.config["ANALYTICS_AT_RISK_MISSED"] = int(os.environ.get("ANALYTICS_AT_RISK_MISSED", 3))
+    app.config["ANALYTICS_MIN_ACTIVITIES"] = int(os.environ.get("ANALYTICS_MIN_ACTIVITIES", 3))
+    app.config["ANALYTICS_HEATMAP_ROWS"] = int(os.environ.get("ANALYTICS_HEATMAP_ROWS", 20))
+    
+    # Request/SQL metrics served on /metrics (admin session or "Authorization: Bearer METRICS_TOKEN"),
+    # optional Server-Timing header and the threshold for logging slow queries
+    app.config["METRICS_ENABLED"] = os.environ.get("METRICS_ENABLED", "1") == "1"
+    app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN")
+    app.config["METRICS_SERVER_TIMING"] = os.environ.get("METRICS_SERVER_TIMING", "0") == "1"
+    app.config["SLOW_QUERY_MS"] = float(os.environ.get("SLOW_QUERY_MS", 100))
+    app.config["SLOW_QUERY_LOG_SIZE"] = int(os.environ.get("SLOW_QUERY_LOG_SIZE", 50))
+    
+    # ASGI entry point (asgi:app): async scan endpoints use ASYNC_DATABASE_URL (by default the main
+    # database through aiosqlite/asyncpg) with a pool of ASYNC_POOL_SIZE connections; all other
+    # routes run in ASGI_WSGI_THREADS threads, each live feed stream holding one while it is open
+    app.config["ASYNC_DATABASE_URL"] = os.environ.get("ASYNC_DATABASE_URL")
+    app.config["ASYNC_POOL_SIZE"] = int(os.environ.get("ASYNC_POOL_SIZE", 20))
+    app.config["ASGI_WSGI_THREADS"] = int(os.environ.get("ASGI_WSGI_THREADS", 32))
+    
+    # Attendance archive: activities that ended more than ARCHIVE_AFTER_DAYS ago can be moved out of the
+    # hot table, into the main database or (SQLite only) the separate file ARCHIVE_DATABASE_FILE
+    app.config["ARCHIVE_AFTER_DAYS"] = int(os.environ.get("ARCHIVE_AFTER_DAYS", 180))
+    app.config["ARCHIVE_DATABASE_FILE"] = os.environ.get("ARCHIVE_DATABASE_FILE")
+    
+    # Cached pages and JSON responses, keyed by the students/activities/attendance data versions they read.
+    # RESPONSE_CACHE_BACKEND is "memory" (per-worker LRU of RESPONSE_CACHE_SIZE entries), "none", a redis://
+    # URL shared by all workers or a "module:factory" path; other workers' writes are noticed within
+    # RESPONSE_CACHE_CHECK_INTERVAL seconds, and entries live RESPONSE_CACHE_TTL seconds (keep it well
+    # under the CSRF token lifetime, since cached pages embed a token)
+    app.config["RESPONSE_CACHE_BACKEND"] = os.environ.get("RESPONSE_CACHE_BACKEND", "memory")
+    app.config["RESPONSE_CACHE_SIZE"] = int(os.environ.get("RESPONSE_CACHE_SIZE", 512))
+    app.config["RESPONSE_CACHE_CHECK_INTERVAL"] = float(os.environ.get("RESPONSE_CACHE_CHECK_INTERVAL", 1.0))
+    app.config["RESPONSE_CACHE_TTL"] = float(os.environ.get("RESPONSE_CACHE_TTL", 300))
+    
+    # Create the schema and default admin on the first request; on by default only for SQLite,
+    # other deployments run `flask init-db` and `flask seed-admin` once instead
+    auto_init = os.environ.get("AUTO_INIT_DB")
+    if auto_init is None:
+        auto_init = app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite")
+    else:
+        auto_init = auto_init == "1"
+    app.config["AUTO_INIT_DB"] = auto_init
+    
+    if test_config:
+        app.config.update(test_config)
+    
+    # The models' "archive" schema names the attached archive file, or the main database without one
+    if not app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        app.config["ARCHIVE_DATABASE_FILE"] = None
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = dict(
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"],
+        execution_options={"schema_translate_map": {"archive": "archive" if app.config["ARCHIVE_DATABASE_FILE"] else None}}
+    )
+    
+    # Initialize extensions
+    csrf.init_app(app)
+    db.init_app(app)
+    login_manager.init_app(app)
+    
+    # Registered on the Engine class so no engine has to be created at startup
+    if not event.contains(Engine, "connect", configure_sqlite):
+        event.listen(Engine, "connect", configure_sqlite)
+    
+    # Request ids and (in json mode) one record per request
+    register_request_logging(app)
+    
+    if app.config["METRICS_ENABLED"]:
+        from metrics import metrics
+        metrics.init_app(app)
+    
+    from response_cache import response_cache
+    response_cache.init_app(app)
+    
+    # Import and register routes (imported here to avoid circular imports)
     from routes import register_routes
     register_routes(app)
+    
+    # Register CLI commands
+    from commands import register_commands
+    register_commands(app)
+    
+    if app.config["AUTO_INIT_DB"]:
+        register_auto_init(app)
+    
+    return app
+
+def configure_sqlite(dbapi_connection, connection_record):
+    """Set the lock timeout and WAL mode on each new SQLite connection, and attach the archive"""
+    if not isinstance(dbapi_connection, sqlite3.Connection) or not has_app_context():
+        return
+    apply_sqlite_pragmas(dbapi_connection, current_app.config)
+
+def apply_sqlite_pragmas(dbapi_connection, config):
+    """Apply the SQLite connection settings (archive file, busy timeout, WAL) to a DB-API connection (sync or async adapted)"""
+    cursor = dbapi_connection.cursor()
+    if config["ARCHIVE_DATABASE_FILE"]:
+        cursor.execute("ATTACH DATABASE ? AS archive", (config["ARCHIVE_DATABASE_FILE"],))
+    
+    # Wait for a competing writer's lock instead of failing with "database is locked", in any journal mode
+    cursor.execute(f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT'])}")
+    if config["SQLITE_WAL"]:
+        # Without a schema name the journal mode also applies to the attached archive
+        cursor.execute("PRAGMA journal_mode=WAL")
+        # WAL keeps the database consistent with NORMAL; only the last commits can be lost on power failure
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+def register_auto_init(app):
+    """Initialize the database once per process, before the first request is handled"""
+    lock = threading.Lock()
+    state = {'done': False}
+    
+    @app.before_request
+    def auto_init_database():
+        if state['done']:
+            return
+        with lock:
+            if state['done']:
+                return
+            from models import init_database, seed_admin
+            init_database()
+            seed_admin()
+            state['done'] = True
 
 # Load user callback for Flask-Login
 @login_manager.user_loader
 def load_user(user_id):
-    from models import User
-    return User.query.get(int(user_id))
+    from cache import user_cache
+    return user_cache.get(int(user_id))
+
+# Module-level app used by main.py, api/index.py and gunicorn (main:app)
+app = create_app()
@@ -0,0 +1,117 @@
+import logging
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func
+
+from app import db
+from models import Activity, ActivitySummary, Attendance, AttendanceArchive, AttendanceDailyCount
+
+# Columns copied from the hot table to the archive, ids included
+ARCHIVE_COLUMNS = ('id', 'student_id', 'activity_id', 'timestamp', 'scanned_by')
+
+def attendance_rows(include_archive=False):
+    """Return the attendance rows to read: the hot table, or both tiers as one subquery with the same columns"""
+    if not include_archive:
+        return Attendance.__table__
+    return db.union_all(
+        db.select(*[getattr(Attendance, name) for name in ARCHIVE_COLUMNS]),
+        db.select(*[getattr(AttendanceArchive, name) for name in ARCHIVE_COLUMNS])
+    ).subquery('attendance_rows')
+
+def archive_horizon():
+    """Return the latest archived scan time, or None if nothing has been archived"""
+    return db.session.query(func.max(ActivitySummary.last_scan)).scalar()
+
+def reaches_archive(date_from=None, activity_id=None):
+    """Return True if attendance from date_from on (all time if None), or of one activity, may be archived"""
+    if activity_id:
+        return db.session.get(ActivitySummary, activity_id) is not None
+
+    horizon = archive_horizon()
+    return horizon is not None and (date_from is None or date_from <= horizon.date())
+
+def archive_activity(activity_id):
+    """Move one activity's attendance to the archive and fold it into its summary, without committing"""
+    hot = Attendance.activity_id == activity_id
+    same_student = db.and_(
+        AttendanceArchive.activity_id == Attendance.activity_id,
+        AttendanceArchive.student_id == Attendance.student_id
+    )
+    # Left behind by an interrupted run (the archive may be a separate file, committed on its own)
+    copied = db.exists().where(
+        same_student, AttendanceArchive.id == Attendance.id, AttendanceArchive.timestamp == Attendance.timestamp
+    )
+    # A scan that raced an earlier run repeats a student already archived; it is dropped, not counted twice
+    duplicate = db.and_(db.exists().where(same_student), ~copied)
+    # SQLite reuses the ids of rows already moved, so a new row may find its id taken in the archive
+    id_taken = db.exists().where(AttendanceArchive.id == Attendance.id)
+
+    duplicates = db.session.query(Attendance.activity_id, Attendance.timestamp).filter(hot, duplicate).all()
+    count, first_scan, last_scan = db.session.query(
+        func.count(Attendance.id), func.min(Attendance.timestamp), func.max(Attendance.timestamp)
+    ).filter(hot, ~duplicate).one()
+    if not count and not duplicates:
+        return 0
+
+    new_rows = db.select(*[getattr(Attendance, name) for name in ARCHIVE_COLUMNS])\
+        .where(hot, ~db.exists().where(same_student))
+    db.session.execute(db.insert(AttendanceArchive).from_select(ARCHIVE_COLUMNS, new_rows.where(~id_taken)))
+
+    renumbered = db.session.execute(new_rows.where(id_taken)).all()
+    if renumbered:
+        next_id = db.session.query(func.max(AttendanceArchive.id)).scalar() + 1
+        next_id = max(next_id, db.session.query(func.max(Attendance.id)).scalar() + 1)
+        db.session.add_all([
+            AttendanceArchive(**dict(row._mapping, id=next_id + offset)) for offset, row in enumerate(renumbered)
+        ])
+
+    if count:
+        # Late scans archived in a later run are added to the existing summary
+        summary = db.session.get(ActivitySummary, activity_id)
+        if summary is None:
+            summary = ActivitySummary(activity_id=activity_id, attendance_count=0, first_scan=first_scan, last_scan=last_scan)
+            db.session.add(summary)
+        summary.attendance_count += count
+        summary.first_scan = min(summary.first_scan or first_scan, first_scan)
+        summary.last_scan = max(summary.last_scan or last_scan, last_scan)
+        summary.archived_at = datetime.utcnow()
+
+    # The daily rollups cover both tiers, so only the dropped duplicates leave them
+    if duplicates:
+        AttendanceDailyCount.record(duplicates, sign=-1)
+    Attendance.query.filter_by(activity_id=activity_id).delete(synchronize_session=False)
+    return count
+
+def archive_attendance(days=None, max_activities=None):
+    """Archive the attendance of activities that ended more than days ago, one transaction per activity
+
+    Returns a dict with the cutoff time and the number of activities and rows moved.
+    """
+    days = current_app.config['ARCHIVE_AFTER_DAYS'] if days is None else days
+    if days < 1:
+        raise ValueError('Only activities that ended at least a day ago can be archived')
+    cutoff = datetime.utcnow() - timedelta(days=days)
+
+    query = db.session.query(Activity.id)\
+        .filter(Activity.end_time < cutoff, db.exists().where(Attendance.activity_id == Activity.id))\
+        .order_by(Activity.end_time, Activity.id)
+    if max_activities:
+        query = query.limit(max_activities)
+    activity_ids = [row.id for row in query]
+
+    result = {'cutoff': cutoff, 'activities': 0, 'rows': 0}
+    for activity_id in activity_ids:
+        try:
+            moved = archive_activity(activity_id)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error archiving attendance for activity {activity_id}: {str(e)}")
+            raise
+        result['activities'] += 1
+        result['rows'] += moved
+
+    if result['activities']:
+        logging.info(f"Archived {result['rows']} attendance records of {result['activities']} activities")
+    return result
@@ -0,0 +1,624 @@
+import asyncio
+import json
+import logging
+import re
+import time
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+from flask import request
+from flask_login import current_user
+from flask_wtf.csrf import validate_csrf
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from wtforms.validators import ValidationError
+
+from app import app as flask_app, apply_sqlite_pragmas, db
+from cache import RosterEntry
+from live_feed import live_feed
+from logging_config import begin_request, log_event, log_request
+from metrics import metrics
+from models import (
+    Activity, ActivitySummary, Attendance, AttendanceArchive, AttendanceDailyCount, DataVersion, ScanReceipt,
+    StatCounter, Student, dialect_insert, increment_statement
+)
+from routes import (
+    earliest_captures, parse_capture_time, parse_scans, pending_sync_scans, scan_results, sync_error, sync_results
+)
+from utils import parse_qr_payload
+
+# Drivers used for the async engine, by database backend
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'postgres': 'postgresql+asyncpg'
+}
+
+# Scan requests are a few hundred bytes; anything much larger is rejected unread
+MAX_BODY_SIZE = 16 * 1024
+# Take pages follow this path as an event stream when the ASGI app serves them (and poll it otherwise)
+FEED_PATH = re.compile(r'/attendance/feed/(\d+)')
+
+# Offline syncs are allowed this much per scan they may carry (a key, a QR token and a capture time)
+MAX_SYNC_SCAN_SIZE = 1024
+
+def async_database_url(url):
+    """Return the asyncio-driver equivalent of a SQLAlchemy database URL"""
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f'No async driver for {url.get_backend_name()} databases, set ASYNC_DATABASE_URL')
+    return url.set(drivername=driver)
+
+class RequestError(Exception):
+    """A request rejected before reaching the database, answered with a JSON error"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+class AsgiApp:
+    """ASGI entry point serving the scan API natively and everything else through the Flask app
+
+    POST /attendance/scan, POST /attendance/scan/sync and GET /api/activities/stats
+    are answered on the event loop with the async engine, so a scan waiting on the
+    database holds neither a thread nor a worker; one process can keep hundreds of
+    scanners connected.
+    The live attendance feed is streamed from here too, so an open take page
+    costs a queued subscription rather than a thread for the whole stream.
+    All other paths go to the Flask app, which runs in a thread pool.
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.config = flask_app.config
+        self.wsgi = WSGIMiddleware(flask_app, workers=self.config['ASGI_WSGI_THREADS'])
+        self.routes = {
+            ('POST', '/attendance/scan'): ('async_scan_attendance', self.scan_attendance),
+            ('POST', '/attendance/scan/sync'): ('async_sync_attendance_scans', self.sync_attendance_scans),
+            ('GET', '/api/activities/stats'): ('async_activity_stats', self.activity_stats)
+        }
+        self.engine = None
+        self.dialect = None
+        # Scans waiting for the next group commit, as (row, future) pairs
+        self.pending = []
+        self.write_lock = asyncio.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+
+        if scope['type'] == 'http' and scope['method'] == 'GET' and accepts_event_stream(scope):
+            match = FEED_PATH.fullmatch(scope['path'])
+            if match is not None:
+                await self.attendance_stream(scope, receive, send, int(match[1]))
+                return
+
+        route = self.routes.get((scope.get('method'), scope.get('path'))) if scope['type'] == 'http' else None
+        if route is None:
+            await self.wsgi(scope, receive, send)
+            return
+
+        endpoint, handler = route
+        started = time.perf_counter()
+        # Each ASGI request runs in its own task, so this context is only seen by its records
+        request_id = begin_request(header_value(scope, b'x-request-id'), endpoint, scope['method'])
+        try:
+            status, payload = await handler(scope, receive)
+        except RequestError as e:
+            status, payload = e.status, {'success': False, 'message': e.message}
+        except Exception as e:
+            logging.error(f"Error handling {endpoint}: {str(e)}")
+            status, payload = 500, {'success': False, 'message': f'Error: {str(e)}'}
+        await send_json(send, status, payload, request_id)
+        log_request(status, scope['path'])
+
+        if self.config['METRICS_ENABLED']:
+            metrics.observe_request(endpoint, scope['method'], status, time.perf_counter() - started)
+
+    async def attendance_stream(self, scope, receive, send, activity_id):
+        """Server-Sent Events stream of new attendance for an activity, fed by the shared live feed poller"""
+        started = time.perf_counter()
+        request_id = begin_request(header_value(scope, b'x-request-id'), 'async_attendance_stream', 'GET')
+        try:
+            await self.authenticate(scope)
+            async with self.get_engine().connect() as conn:
+                if await conn.scalar(select(Activity.id).where(Activity.id == activity_id)) is None:
+                    raise RequestError(404, 'Activity not found')
+
+            # EventSource sends Last-Event-ID when it reconnects; the first connection passes ?after=
+            cursor = header_value(scope, b'last-event-id')
+            if cursor is None:
+                cursor = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('after', ['0'])[0]
+            try:
+                cursor = int(cursor)
+            except ValueError:
+                cursor = 0
+
+            subscription, backlog = await live_feed.subscribe(
+                self.get_engine(), activity_id, cursor,
+                self.config['LIVE_FEED_POLL_INTERVAL'], self.config['LIVE_FEED_BATCH_SIZE']
+            )
+        except RequestError as e:
+            await send_json(send, e.status, {'success': False, 'message': e.message}, request_id)
+            log_request(e.status, scope['path'])
+            return
+        except Exception as e:
+            logging.error(f"Error handling async_attendance_stream: {str(e)}")
+            await send_json(send, 500, {'success': False, 'message': f'Error: {str(e)}'}, request_id)
+            log_request(500, scope['path'])
+            return
+
+        disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+        try:
+            headers = [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+                (b'x-request-id', request_id.encode())
+            ]
+            await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+            await send_event(send, 'retry: 3000\n\n')
+            for event in backlog:
+                await send_event(send, format_event(event))
+
+            # Streams still close periodically, so clients reconnect through any proxy timeouts
+            deadline = time.monotonic() + self.config['LIVE_FEED_MAX_DURATION']
+            while time.monotonic() < deadline:
+                events = asyncio.ensure_future(subscription.get(self.config['LIVE_FEED_KEEPALIVE']))
+                await asyncio.wait({events, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if disconnected.done():
+                    events.cancel()
+                    break
+                if not events.result():
+                    await send_event(send, ': keep-alive\n\n')
+                for event in events.result():
+                    await send_event(send, format_event(event))
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            live_feed.unsubscribe(subscription)
+
+        log_request(200, scope['path'])
+        if self.config['METRICS_ENABLED']:
+            metrics.observe_request('async_attendance_stream', 'GET', 200, time.perf_counter() - started)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.engine is not None:
+                    await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def get_engine(self):
+        """Create the async engine on first use, pointing at the same database as the Flask app"""
+        if self.engine is not None:
+            return self.engine
+
+        url = self.config['ASYNC_DATABASE_URL']
+        if url is None:
+            # Flask-SQLAlchemy resolves relative SQLite paths against the instance folder
+            with self.flask_app.app_context():
+                url = async_database_url(db.engine.url)
+
+        url = make_url(url)
+        options = {}
+        if url.get_backend_name() != 'sqlite':
+            options['pool_size'] = self.config['ASYNC_POOL_SIZE']
+            options['pool_pre_ping'] = True
+        elif url.database not in (None, '', ':memory:'):
+            # aiosqlite defaults to no pooling, which costs a new connection and thread per request
+            options['poolclass'] = AsyncAdaptedQueuePool
+            options['pool_size'] = self.config['ASYNC_POOL_SIZE']
+        # The archive schema is translated like the Flask engine's (the attached file, or the main database)
+        options['execution_options'] = self.config['SQLALCHEMY_ENGINE_OPTIONS']['execution_options']
+        engine = create_async_engine(url, **options)
+
+        if url.get_backend_name() == 'sqlite':
+            @event.listens_for(engine.sync_engine, 'connect')
+            def configure_connection(dbapi_connection, connection_record):
+                apply_sqlite_pragmas(dbapi_connection, self.config)
+
+        self.dialect = engine.dialect.name
+        self.engine = engine
+        return engine
+
+    async def authenticate(self, scope, form=None):
+        """Return the logged-in user's id, checking the CSRF token too when a form is given
+
+        The request's headers are replayed into a Flask request context, so the
+        session cookie, Flask-Login (remember cookie and user cache) and
+        Flask-WTF decide exactly as they would for the WSGI routes. It runs in a
+        thread because a user cache miss queries the database synchronously.
+        """
+        return await asyncio.to_thread(self.check_request, scope, form)
+
+    def check_request(self, scope, form):
+        headers = [(key.decode('latin-1'), value.decode('latin-1')) for key, value in scope.get('headers', [])]
+        with self.flask_app.test_request_context(
+            scope['path'],
+            method=scope['method'],
+            headers=headers,
+            query_string=scope.get('query_string', b'').decode('latin-1')
+        ):
+            if not current_user.is_authenticated:
+                raise RequestError(401, 'Login required')
+
+            if form is not None and self.config.get('WTF_CSRF_ENABLED', True):
+                token = form.get(self.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token'))
+                for header in self.config.get('WTF_CSRF_HEADERS', ['X-CSRFToken', 'X-CSRF-Token']):
+                    token = token or request.headers.get(header)
+                try:
+                    validate_csrf(token)
+                except ValidationError as e:
+                    raise RequestError(400, e.args[0])
+
+            return current_user.id
+
+    async def scan_attendance(self, scope, receive):
+        """Async equivalent of the Flask scan endpoint, answering with the same JSON"""
+        form = await read_form(scope, receive)
+        user_id = await self.authenticate(scope, form)
+
+        try:
+            activity_id = int(form.get('activity_id'))
+            scanned_data = form['scanned_data']
+        except (KeyError, TypeError, ValueError):
+            return 200, {'success': False, 'message': 'Invalid form submission'}
+
+        # Verify the QR data before running any query, so forged codes cost nothing
+        try:
+            with self.flask_app.app_context():
+                student_id = parse_qr_payload(scanned_data)
+        except ValueError as e:
+            return 200, {'success': False, 'message': str(e)}
+
+        try:
+            async with self.get_engine().connect() as conn:
+                # Reads run outside the write lock, concurrently with the current batch being written
+                activity = await conn.scalar(select(Activity.id).where(Activity.id == activity_id))
+                if activity is None:
+                    raise RequestError(404, 'Activity not found')
+
+                student = (await conn.execute(
+                    select(Student.id, Student.student_id, Student.first_name, Student.last_name)
+                        .where(Student.id == student_id)
+                )).first()
+                if student is None:
+                    return 200, {'success': False, 'message': 'Student not found'}
+
+            name = f'{student.first_name} {student.last_name}'
+            recorded = await self.record_attendance(student.id, activity, user_id)
+        except RequestError:
+            raise
+        except Exception as e:
+            logging.error(f"Error recording attendance: {str(e)}")
+            return 200, {'success': False, 'message': f'Error: {str(e)}'}
+
+        status = 'recorded' if recorded else 'duplicate'
+        log_event('scan', 'Scan for activity %s: %s', activity, status,
+                  activity_id=activity, status=status, student_id=student.id)
+        if not recorded:
+            return 200, {'success': False, 'message': f'Attendance already recorded for {name}'}
+        return 200, {
+            'success': True,
+            'message': f'Attendance recorded for {name}',
+            'student': {
+                'id': student.id,
+                'name': name,
+                'student_id': student.student_id
+            }
+        }
+
+    async def sync_attendance_scans(self, scope, receive):
+        """Async equivalent of the Flask offline sync endpoint, answering with the same JSON
+
+        New scans join the group commit, so their attendance is committed just
+        before their receipts (as with buffered writes in the Flask endpoint).
+        """
+        limit = self.config['SCAN_BATCH_LIMIT']
+        payload = await read_json(scope, receive, limit * MAX_SYNC_SCAN_SIZE)
+        user_id = await self.authenticate(scope, payload if isinstance(payload, dict) else {})
+
+        error = sync_error(payload, limit)
+        if error is not None:
+            raise RequestError(400, error)
+        scans = payload['scans']
+
+        try:
+            activity_id = int(payload['activity_id'])
+        except (TypeError, ValueError):
+            raise RequestError(404, 'Activity not found')
+
+        async with self.get_engine().connect() as conn:
+            activity = (await conn.execute(
+                select(Activity.id, Activity.start_time).where(Activity.id == activity_id)
+            )).first()
+            if activity is None:
+                raise RequestError(404, 'Activity not found')
+
+            # Keys seen before (e.g. a retry after a lost response) are answered from their receipts
+            receipts = await find_receipts(conn, {scan['key'] for scan in scans})
+
+            # Verify the QR data before looking anyone up, so forged codes cost nothing
+            pending_scans = pending_sync_scans(scans, receipts)
+            with self.flask_app.app_context():
+                parsed = parse_scans(scan.get('data') for scan in pending_scans)
+            students = await roster_entries(conn, {item for item in parsed if isinstance(item, int)} | {
+                receipt.student_id for receipt in receipts.values() if receipt.student_id is not None
+            })
+
+        earliest = activity.start_time - timedelta(seconds=self.config['SCAN_CAPTURE_SLACK'])
+        capture_times = earliest_captures(
+            parsed, students, [parse_capture_time(scan.get('captured_at'), earliest) for scan in pending_scans]
+        )
+        recorded = await asyncio.gather(*(
+            self.record_attendance(student_id, activity.id, user_id, captured)
+            for student_id, captured in capture_times.items()
+        ))
+        recorded_ids = {student_id for student_id, new in zip(capture_times, recorded) if new}
+
+        results = scan_results(activity.id, parsed, students, recorded_ids)
+        new_results = {scan['key']: result for scan, result in zip(pending_scans, results)}
+        async with self.get_engine().connect() as conn:
+            stored = await self.insert_receipts(conn, activity.id, new_results)
+            await conn.commit()
+
+            # A retry that raced its original answers with the receipt the original stored
+            raced = set(new_results) - stored
+            if raced:
+                receipts.update(await find_receipts(conn, raced))
+                students.update(await roster_entries(conn, {
+                    receipts[key].student_id for key in raced
+                    if receipts[key].student_id is not None and receipts[key].student_id not in students
+                }))
+
+        return 200, {
+            'success': True,
+            'activity_id': activity.id,
+            'recorded': len(recorded_ids),
+            'results': sync_results(scans, receipts, new_results, students)
+        }
+
+    async def insert_receipts(self, conn, activity_id, results):
+        """Insert-or-ignore the receipts for results indexed by scan key, returning the keys stored"""
+        rows = ScanReceipt.rows(activity_id, results)
+        if not rows:
+            return set()
+
+        stmt = dialect_insert(ScanReceipt, self.dialect).on_conflict_do_nothing(index_elements=['key'])
+        if self.engine.dialect.insert_returning:
+            return set((await conn.scalars(stmt.values(rows).returning(ScanReceipt.key))).all())
+
+        stored = set()
+        for row in rows:
+            if (await conn.execute(stmt.values(**row))).rowcount == 1:
+                stored.add(row['key'])
+        return stored
+
+    async def record_attendance(self, student_id, activity_id, user_id, timestamp=None):
+        """Record a scan (taken now unless timestamp is given), returning False if already recorded
+
+        Scans arriving while a transaction is being written wait for it and are then
+        written together by whichever of them gets the lock next, so under load each
+        commit carries a whole batch of scans (group commit).
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append(({
+            'student_id': student_id,
+            'activity_id': activity_id,
+            'scanned_by': user_id,
+            'timestamp': timestamp or datetime.utcnow()
+        }, future))
+
+        async with self.write_lock:
+            if not future.done():
+                # Batches are capped at ATTENDANCE_FLUSH_ROWS; the rest go with the next holder
+                limit = self.config['ATTENDANCE_FLUSH_ROWS']
+                batch, self.pending = self.pending[:limit], self.pending[limit:]
+                try:
+                    recorded = await self.insert_attendance(rows for rows, _ in batch)
+                except Exception as e:
+                    for _, waiting in batch:
+                        waiting.set_exception(e)
+                else:
+                    # Only the first scan of a student in the batch counts as new; repeats are duplicates
+                    for row, waiting in batch:
+                        key = (row['activity_id'], row['student_id'])
+                        waiting.set_result(key in recorded)
+                        recorded.discard(key)
+        return await future
+
+    async def insert_attendance(self, rows):
+        """Insert-or-ignore attendance rows and update the rollups in one transaction
+
+        Returns the (activity_id, student_id) pairs that were newly recorded.
+        """
+        rows = list({(row['activity_id'], row['student_id']): row for row in reversed(list(rows))}.values())
+        stmt = dialect_insert(Attendance, self.dialect).on_conflict_do_nothing(
+            index_elements=['activity_id', 'student_id']
+        )
+
+        async with self.get_engine().connect() as conn:
+            # Students already in the archive of an archived activity are duplicates, as in Attendance.record_many
+            archived_activities = set((await conn.scalars(
+                select(ActivitySummary.activity_id)
+                    .where(ActivitySummary.activity_id.in_({row['activity_id'] for row in rows}))
+            )).all())
+            if archived_activities:
+                archived = {tuple(pair) for pair in await conn.execute(
+                    select(AttendanceArchive.activity_id, AttendanceArchive.student_id).where(
+                        AttendanceArchive.activity_id.in_(archived_activities),
+                        AttendanceArchive.student_id.in_({row['student_id'] for row in rows})
+                    )
+                )}
+                rows = [row for row in rows if (row['activity_id'], row['student_id']) not in archived]
+                if not rows:
+                    return set()
+
+            if self.engine.dialect.insert_returning:
+                result = await conn.execute(stmt.values(rows).returning(Attendance.activity_id, Attendance.student_id))
+                recorded = {tuple(row) for row in result}
+            else:
+                recorded = set()
+                for row in rows:
+                    if (await conn.execute(stmt.values(**row))).rowcount == 1:
+                        recorded.add((row['activity_id'], row['student_id']))
+
+            deltas = {}
+            for row in rows:
+                if (row['activity_id'], row['student_id']) in recorded:
+                    key = (row['timestamp'].date(), row['activity_id'])
+                    deltas[key] = deltas.get(key, 0) + 1
+            for (day, activity_id), delta in deltas.items():
+                await conn.execute(increment_statement(
+                    AttendanceDailyCount, {'day': day, 'activity_id': activity_id}, 'count', delta, self.dialect
+                ))
+            await conn.commit()
+        if recorded:
+            # New rows raise the attendance version's total (the rollups above); only this process's caches need telling
+            DataVersion.mark_changed()
+        return recorded
+
+    async def activity_stats(self, scope, receive):
+        """Async equivalent of /api/activities/stats, used by dashboards polling live counts"""
+        await self.authenticate(scope)
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        try:
+            activity_ids = {int(value) for value in query.get('id', [])}
+        except ValueError:
+            activity_ids = set()
+
+        limit = self.config['MAX_PAGE_SIZE']
+        if len(activity_ids) > limit:
+            raise RequestError(400, f'At most {limit} activities per request')
+
+        stats = {activity_id: {'count': 0, 'rate': 0} for activity_id in activity_ids}
+        if activity_ids:
+            async with self.get_engine().connect() as conn:
+                total_students = await conn.scalar(
+                    select(StatCounter.value).where(StatCounter.name == StatCounter.STUDENTS)
+                ) or 0
+                counts = dict((await conn.execute(
+                    select(Attendance.activity_id, func.count(Attendance.id))
+                        .where(Attendance.activity_id.in_(activity_ids))
+                        .group_by(Attendance.activity_id)
+                )).all())
+                # Archived activities are counted from their summaries, as in Activity.attendance_stats
+                summaries = await conn.execute(
+                    select(ActivitySummary.activity_id, ActivitySummary.attendance_count)
+                        .where(ActivitySummary.activity_id.in_(activity_ids))
+                )
+                for activity_id, count in summaries:
+                    counts[activity_id] = counts.get(activity_id, 0) + count
+                for activity_id, count in counts.items():
+                    stats[activity_id] = {
+                        'count': count,
+                        'rate': (count / total_students * 100) if total_students > 0 else 0
+                    }
+
+        return 200, {
+            'success': True,
+            'stats': {str(activity_id): value for activity_id, value in stats.items()}
+        }
+
+async def find_receipts(conn, keys):
+    """Return the stored receipts for the given scan keys, indexed by key"""
+    if not keys:
+        return {}
+    rows = await conn.execute(select(*ScanReceipt.__table__.columns).where(ScanReceipt.key.in_(keys)))
+    return {row.key: ScanReceipt(**row._mapping) for row in rows}
+
+async def roster_entries(conn, student_ids):
+    """Return roster entries for the given student primary keys, indexed by primary key"""
+    if not student_ids:
+        return {}
+    rows = await conn.execute(
+        select(Student.id, Student.student_id, Student.first_name, Student.last_name).where(Student.id.in_(student_ids))
+    )
+    return {row.id: RosterEntry(row.id, row.student_id, f"{row.first_name} {row.last_name}") for row in rows}
+
+def accepts_event_stream(scope):
+    return 'text/event-stream' in (header_value(scope, b'accept') or '')
+
+def format_event(event):
+    return f"id: {event['id']}\nevent: attendance\ndata: {json.dumps(event)}\n\n"
+
+async def send_event(send, text):
+    await send({'type': 'http.response.body', 'body': text.encode(), 'more_body': True})
+
+async def wait_for_disconnect(receive):
+    """Return once the client has gone away"""
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+def header_value(scope, name):
+    for key, value in scope.get('headers', []):
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+async def read_body(receive, max_size):
+    """Read a request body, rejecting it once it grows past max_size bytes"""
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise RequestError(400, 'Client disconnected')
+        body += message.get('body', b'')
+        if len(body) > max_size:
+            raise RequestError(413, 'Request body too large')
+        if not message.get('more_body'):
+            return body
+
+async def read_json(scope, receive, max_size):
+    """Read a JSON request body, or None if it is not JSON (like Flask's get_json(silent=True))"""
+    body = await read_body(receive, max_size)
+    if (header_value(scope, b'content-type') or '').split(';')[0].strip() != 'application/json':
+        return None
+    try:
+        return json.loads(body)
+    except (UnicodeDecodeError, ValueError):
+        return None
+
+async def read_form(scope, receive):
+    """Read a urlencoded or JSON request body into a flat dict"""
+    body = await read_body(receive, MAX_BODY_SIZE)
+
+    content_type = (header_value(scope, b'content-type') or '').split(';')[0].strip()
+    try:
+        if content_type == 'application/json':
+            data = json.loads(body or b'{}')
+            return data if isinstance(data, dict) else {}
+        return {key: values[0] for key, values in parse_qs(body.decode('utf-8')).items()}
+    except (UnicodeDecodeError, ValueError):
+        raise RequestError(400, 'Malformed request body')
+
+async def send_json(send, status, payload, request_id=None):
+    body = json.dumps(payload).encode()
+    headers = [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode()),
+        (b'cache-control', b'no-store')
+    ]
+    if request_id:
+        headers.append((b'x-request-id', request_id.encode()))
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': headers
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+# Served with `uvicorn asgi:app`
+app = AsgiApp(flask_app)
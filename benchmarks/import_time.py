@@ -0,0 +1,88 @@
+"""Measure the cold-start cost of `from app import app`
+
+Each run imports the app in a fresh interpreter (as a serverless cold start
+does) and reports the import time and the SQL statements executed during
+import, both against a brand new database and an existing one.
+
+    python benchmarks/import_time.py --runs 10
+    python benchmarks/import_time.py --repo /path/to/other/checkout   # compare revisions
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CHILD = '''
+import json, sys, time
+sys.path.insert(0, {repo!r})
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+statements = []
+event.listen(Engine, 'before_cursor_execute', lambda conn, cursor, statement, *args: statements.append(statement))
+
+start = time.perf_counter()
+from app import app
+elapsed = time.perf_counter() - start
+
+writes = [s for s in statements if s.lstrip().split(None, 1)[0].upper() in ('CREATE', 'INSERT', 'UPDATE', 'DELETE')]
+print(json.dumps({{'seconds': elapsed, 'statements': len(statements), 'writes': len(writes)}}))
+'''
+
+def run_once(repo, database_url):
+    env = dict(os.environ, DATABASE_URL=database_url)
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD.format(repo=repo)],
+        cwd=repo, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def summarize(samples):
+    seconds = [sample['seconds'] * 1000 for sample in samples]
+    return {
+        'runs': len(samples),
+        'median_ms': round(statistics.median(seconds), 1),
+        'min_ms': round(min(seconds), 1),
+        'max_ms': round(max(seconds), 1),
+        'statements': samples[-1]['statements'],
+        'writes': samples[-1]['writes']
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repo', default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+
+    fresh, existing = [], []
+    with tempfile.TemporaryDirectory() as directory:
+        for run in range(args.runs):
+            # A new database file per run, then a second import against the same file
+            database_url = f'sqlite:///{os.path.join(directory, f"cold_{run}.db")}'
+            fresh.append(run_once(args.repo, database_url))
+            existing.append(run_once(args.repo, database_url))
+
+    results = {
+        'repo': os.path.abspath(args.repo),
+        'fresh_database': summarize(fresh),
+        'existing_database': summarize(existing)
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"Import benchmark for {results['repo']}")
+    for name in ('fresh_database', 'existing_database'):
+        result = results[name]
+        print(
+            f"  {name:<18} median {result['median_ms']:>7} ms  (min {result['min_ms']}, max {result['max_ms']})  "
+            f"{result['statements']} SQL statements, {result['writes']} writes"
+        )
+
+if __name__ == '__main__':
+    main()
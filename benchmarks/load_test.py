@@ -0,0 +1,295 @@
+"""Load test the scan, offline sync and reporting endpoints against a seeded SQLite database
+
+Drives concurrent simulated clients (each logged in with its own session)
+through the Flask test client, or through a local threaded WSGI server with
+--server, and reports latency percentiles, throughput and SQL queries per
+request for each endpoint. Queries run while a streamed response (the export)
+is being sent are not counted. Results can be written as JSON and compared
+with a previous run:
+
+    python benchmarks/load_test.py --students 5000 --attendance 100000 --output before.json
+    python benchmarks/load_test.py --students 5000 --attendance 100000 --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+from http.cookiejar import CookieJar
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from seed import seed
+
+def build_scenarios(tokens, live_activity_id, busiest_activity_id):
+    """Return endpoint name -> function(rng) producing (method, path, form data, json body)"""
+    def scan(rng):
+        return 'POST', '/attendance/scan', {'activity_id': live_activity_id, 'scanned_data': rng.choice(tokens)}, None
+
+    def scan_batch(rng):
+        scans = [rng.choice(tokens) for _ in range(25)]
+        return 'POST', '/attendance/scan/batch', None, {'activity_id': live_activity_id, 'scans': scans}
+
+    # Keys already synced, replayed now and then as a scanner would after a lost response
+    synced_keys = []
+
+    def scan_sync(rng):
+        captured_at = datetime.utcnow().isoformat()
+        scans = []
+        for _ in range(25):
+            if synced_keys and rng.random() < 0.1:
+                key, token = rng.choice(synced_keys)
+            else:
+                key, token = f'{rng.getrandbits(128):032x}', rng.choice(tokens)
+                synced_keys.append((key, token))
+            scans.append({'key': key, 'data': token, 'captured_at': captured_at})
+        return 'POST', '/attendance/scan/sync', None, {'activity_id': live_activity_id, 'scans': scans}
+
+    def report_export(rng):
+        return 'GET', '/attendance/report/export?format=csv', None, None
+
+    return {
+        'scan': scan,
+        'scan_batch': scan_batch,
+        'scan_sync': scan_sync,
+        'dashboard': lambda rng: ('GET', '/dashboard', None, None),
+        'students': lambda rng: ('GET', '/students', None, None),
+        'view_attendance': lambda rng: ('GET', f'/attendance/view/{busiest_activity_id}', None, None),
+        'attendance_report': lambda rng: ('GET', '/attendance/report', None, None),
+        'report_export': report_export
+    }
+
+# Full exports stream every attendance row, so they get a fraction of the request budget
+REQUEST_SHARE = {'report_export': 0.02}
+
+def instrument(app, db):
+    """Report the SQL statements run by each request in an X-Query-Count response header"""
+    from sqlalchemy import event
+
+    state = threading.local()
+
+    with app.app_context():
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count_query(*args):
+            state.count = getattr(state, 'count', 0) + 1
+
+    @app.before_request
+    def reset_query_count():
+        state.count = 0
+
+    @app.after_request
+    def add_query_count(response):
+        response.headers['X-Query-Count'] = str(getattr(state, 'count', 0))
+        return response
+
+class TestClientSession:
+    """A logged-in client that calls the app in-process through the Flask test client"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+        self.client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+
+    def request(self, method, path, data, json_body):
+        response = self.client.open(path, method=method, data=data, json=json_body)
+        response.get_data()
+        return response.status_code, int(response.headers.get('X-Query-Count', 0))
+
+class HTTPSession:
+    """A logged-in client that calls a local WSGI server over HTTP"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+        self.request('POST', '/login', {'username': 'admin', 'password': 'admin123'}, None)
+
+    def request(self, method, path, data, json_body):
+        headers = {}
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        elif data is not None:
+            body = urllib.parse.urlencode(data).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                return response.status, int(response.headers.get('X-Query-Count', 0))
+        except urllib.error.HTTPError as e:
+            return e.code, int(e.headers.get('X-Query-Count', 0))
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def run_endpoint(sessions, scenario, total_requests, random_seed):
+    """Send total_requests requests spread over one thread per session and summarize them"""
+    latencies = []
+    queries = []
+    errors = 0
+    lock = threading.Lock()
+    remaining = [total_requests]
+
+    def worker(index, session):
+        nonlocal errors
+        rng = random.Random(random_seed + index)
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+
+            method, path, data, json_body = scenario(rng)
+            start = time.perf_counter()
+            try:
+                status, query_count = session.request(method, path, data, json_body)
+            except Exception:
+                status, query_count = 599, 0
+            elapsed = time.perf_counter() - start
+
+            with lock:
+                latencies.append(elapsed * 1000)
+                queries.append(query_count)
+                if status >= 400:
+                    errors += 1
+
+    threads = [threading.Thread(target=worker, args=(index, session)) for index, session in enumerate(sessions)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / duration, 1) if duration else 0.0,
+        'mean_ms': round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else 0.0
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_results(results, baseline=None):
+    print(f"Load test at {results['revision']} ({results['transport']}, concurrency {results['concurrency']})")
+    print(f"{'endpoint':<18} {'req':>6} {'err':>4} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'q/req':>6}")
+    for name, result in results['endpoints'].items():
+        line = (
+            f"{name:<18} {result['requests']:>6} {result['errors']:>4} {result['throughput_rps']:>8} "
+            f"{result['p50_ms']:>8} {result['p95_ms']:>8} {result['p99_ms']:>8} {result['queries_per_request']:>6}"
+        )
+        previous = (baseline or {}).get('endpoints', {}).get(name)
+        if previous and previous['p50_ms']:
+            change = (result['p50_ms'] - previous['p50_ms']) / previous['p50_ms'] * 100
+            line += f"   p50 {change:+.0f}% vs {baseline.get('revision')}"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--activities', type=int, default=50)
+    parser.add_argument('--attendance', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=8, help='Simulated clients')
+    parser.add_argument('--endpoints', help='Comma-separated endpoints to run (default: all)')
+    parser.add_argument('--server', action='store_true', help='Go through a local threaded WSGI server instead of the test client')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', help='Show changes against a previous JSON result')
+    args = parser.parse_args()
+
+    # Keep the app quiet so logging does not dominate the timings
+    import logging
+    logging.disable(logging.INFO)
+
+    from app import create_app, db
+    from qr_tokens import encode_token
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(directory, 'bench.db')}",
+            'WTF_CSRF_ENABLED': False,
+            'AUTO_INIT_DB': False
+        })
+        instrument(app, db)
+
+        print(f'Seeding {args.students} students, {args.activities} activities, {args.attendance} attendance rows...')
+        with app.app_context():
+            seeded = seed(args.students, args.activities, args.attendance, args.seed)
+            tokens = [encode_token(pk) for pk in range(1, args.students + 1)]
+
+        scenarios = build_scenarios(tokens, seeded['live_activity_id'], seeded['busiest_activity_id'])
+        if args.endpoints:
+            names = [name.strip() for name in args.endpoints.split(',')]
+            unknown = set(names) - set(scenarios)
+            if unknown:
+                parser.error(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+            scenarios = {name: scenarios[name] for name in names}
+
+        server = None
+        if args.server:
+            from werkzeug.serving import make_server
+            server = make_server('127.0.0.1', 0, app, threaded=True)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base_url = f'http://127.0.0.1:{server.server_port}'
+            sessions = [HTTPSession(base_url) for _ in range(args.concurrency)]
+        else:
+            sessions = [TestClientSession(app) for _ in range(args.concurrency)]
+
+        endpoints = {}
+        try:
+            for name, scenario in scenarios.items():
+                total_requests = max(args.concurrency, int(args.requests * REQUEST_SHARE.get(name, 1)))
+                endpoints[name] = run_endpoint(sessions, scenario, total_requests, args.seed)
+        finally:
+            if server is not None:
+                server.shutdown()
+
+    results = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'transport': 'wsgi-server' if args.server else 'test-client',
+        'concurrency': args.concurrency,
+        'dataset': {'students': args.students, 'activities': args.activities, 'attendance': args.attendance},
+        'endpoints': endpoints
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Results written to {args.output}')
+
+if __name__ == '__main__':
+    main()
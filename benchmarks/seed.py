@@ -0,0 +1,117 @@
+"""Seed a database with synthetic students, activities and attendance for benchmarking
+
+    python benchmarks/seed.py --database /tmp/bench.db --students 5000 --activities 50 --attendance 100000
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIRST_NAMES = ['An', 'Binh', 'Chi', 'Dung', 'Giang', 'Ha', 'Hoa', 'Khanh', 'Lan', 'Linh', 'Minh', 'Nam', 'Phuong', 'Quang', 'Thao', 'Tuan']
+LAST_NAMES = ['Nguyen', 'Tran', 'Le', 'Pham', 'Hoang', 'Vu', 'Vo', 'Dang', 'Bui', 'Do', 'Ho', 'Ngo', 'Duong', 'Ly']
+
+def seed(students=5000, activities=50, attendance=100000, random_seed=42, batch_size=5000):
+    """Fill an empty database (inside an app context), returning the ids the load test needs
+
+    The last activity is ongoing and has no attendance yet, so scans against it
+    exercise the insert path; the other activities are in the past and share
+    the attendance rows between them.
+    """
+    from app import db
+    from models import Activity, Attendance, AttendanceDailyCount, Student, User, init_database, seed_admin
+    from qr_tokens import encode_token
+    from search import fts_available, rebuild_search_index
+
+    rng = random.Random(random_seed)
+    init_database()
+    seed_admin()
+    admin_id = db.session.query(User.id).filter_by(username='admin').scalar()
+
+    now = datetime.utcnow()
+    student_rows = [
+        {
+            'id': pk,
+            'student_id': f'BM{pk:07d}',
+            'first_name': rng.choice(FIRST_NAMES),
+            'last_name': rng.choice(LAST_NAMES),
+            'email': f'bm{pk}@example.com',
+            'created_at': now,
+            'qr_data': encode_token(pk)
+        }
+        for pk in range(1, students + 1)
+    ]
+    for start in range(0, len(student_rows), batch_size):
+        db.session.execute(db.insert(Student), student_rows[start:start + batch_size])
+
+    activity_rows = []
+    for pk in range(1, activities + 1):
+        if pk == activities:
+            start_time = now - timedelta(hours=1)
+        else:
+            start_time = now - timedelta(days=2 * (activities - pk), hours=rng.randint(2, 10))
+        activity_rows.append({
+            'id': pk,
+            'name': f'Benchmark activity {pk}',
+            'start_time': start_time,
+            'end_time': start_time + timedelta(hours=4),
+            'is_active': True,
+            'created_by': admin_id,
+            'created_at': now
+        })
+    db.session.execute(db.insert(Activity), activity_rows)
+
+    # Spread attendance over the past activities; each student at most once per activity
+    past_activities = activity_rows[:-1]
+    per_activity = min(students, attendance // max(1, len(past_activities)))
+    batch = []
+    for activity in past_activities:
+        for student_pk in rng.sample(range(1, students + 1), per_activity):
+            batch.append({
+                'student_id': student_pk,
+                'activity_id': activity['id'],
+                'scanned_by': admin_id,
+                'timestamp': activity['start_time'] + timedelta(minutes=rng.randint(0, 239))
+            })
+            if len(batch) >= batch_size:
+                db.session.execute(db.insert(Attendance), batch)
+                batch = []
+    if batch:
+        db.session.execute(db.insert(Attendance), batch)
+    db.session.commit()
+
+    counts = AttendanceDailyCount.rebuild()
+    if fts_available(db.session.connection()):
+        rebuild_search_index()
+    return {
+        'students': students,
+        'live_activity_id': activity_rows[-1]['id'],
+        'busiest_activity_id': past_activities[0]['id'] if past_activities else activity_rows[-1]['id'],
+        'counts': counts
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed a benchmark database')
+    parser.add_argument('--database', required=True, help='SQLite file to create')
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--activities', type=int, default=50)
+    parser.add_argument('--attendance', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if os.path.exists(args.database):
+        parser.error(f'{args.database} already exists')
+
+    from app import create_app
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.abspath(args.database)}',
+        'AUTO_INIT_DB': False
+    })
+    with app.app_context():
+        result = seed(args.students, args.activities, args.attendance, args.seed)
+    print(f"Seeded {args.database}: {result['counts']}")
+
+if __name__ == '__main__':
+    main()
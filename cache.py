@@ -0,0 +1,234 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import current_app
+from flask_login import UserMixin
+
+from app import db
+from models import DataVersion, Student, User
+
+class LRUCache:
+    """Thread-safe bounded mapping that evicts the least recently used entries"""
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            return self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / lookups) if lookups else 0.0
+        }
+
+# Lightweight student record kept in the roster cache
+RosterEntry = namedtuple('RosterEntry', ['id', 'student_id', 'name'])
+
+class RosterCache:
+    """Per-worker cache of the student roster used by the attendance scan path
+
+    Every transaction writing students bumps the 'students' DataVersion
+    counter, which is checked at most once per ROSTER_VERSION_CHECK_INTERVAL.
+    """
+
+    VERSION_KEY = DataVersion.STUDENTS
+
+    def __init__(self):
+        self._entries = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.warmups = 0
+        self.invalidations = 0
+
+    def get(self, student_pk):
+        """Return the RosterEntry for a student primary key, or None if no such student"""
+        return self.get_many([student_pk]).get(student_pk)
+
+    def get_many(self, student_pks):
+        """Return a dict of primary key to RosterEntry for the students that exist"""
+        entries = self._fresh_entries()
+
+        found = {}
+        missing = []
+        for pk in set(student_pks):
+            entry = entries.get(pk)
+            if entry is None:
+                missing.append(pk)
+            else:
+                found[pk] = entry
+
+        if missing:
+            for entry in self._load(Student.id.in_(missing)):
+                entries.set(entry.id, entry)
+                found[entry.id] = entry
+
+        return found
+
+    def invalidate(self, student_pk=None):
+        """Drop one student (or the whole roster) from this worker's cache"""
+        self.invalidations += 1
+        if self._entries is None:
+            return
+        if student_pk is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(student_pk)
+
+    def stats(self):
+        stats = self._entries.stats() if self._entries is not None else {'size': 0, 'hits': 0, 'misses': 0, 'hit_rate': 0.0}
+        stats.update({
+            'version': self._version,
+            'warmups': self.warmups,
+            'invalidations': self.invalidations
+        })
+        return stats
+
+    def _fresh_entries(self):
+        """Return the cached entries, re-warming them if another worker changed the roster"""
+        now = time.monotonic()
+        interval = current_app.config['ROSTER_VERSION_CHECK_INTERVAL']
+        if self._entries is not None and now - self._checked_at < interval:
+            return self._entries
+
+        with self._lock:
+            if self._entries is not None and now - self._checked_at < interval:
+                return self._entries
+
+            version = DataVersion.get(self.VERSION_KEY)
+            if self._entries is None or version != self._version:
+                self._warm(version)
+            self._checked_at = now
+            return self._entries
+
+    def _warm(self, version):
+        max_size = current_app.config['ROSTER_CACHE_SIZE']
+        entries = LRUCache(max_size)
+        for entry in self._load(limit=max_size):
+            entries.set(entry.id, entry)
+
+        if self._entries is not None:
+            # Keep the lifetime counters across re-warms
+            entries.hits = self._entries.hits
+            entries.misses = self._entries.misses
+
+        self._entries = entries
+        self._version = version
+        self.warmups += 1
+
+    def _load(self, condition=None, limit=None):
+        query = db.session.query(Student.id, Student.student_id, Student.first_name, Student.last_name)
+        if condition is not None:
+            query = query.filter(condition)
+        if limit is not None:
+            query = query.order_by(Student.id).limit(limit)
+        return [
+            RosterEntry(row.id, row.student_id, f"{row.first_name} {row.last_name}")
+            for row in query
+        ]
+
+roster_cache = RosterCache()
+
+class CachedUser(UserMixin):
+    """Lightweight user record returned by the Flask-Login user loader"""
+
+    def __init__(self, id, username, is_admin):
+        self.id = id
+        self.username = username
+        self.is_admin = bool(is_admin)
+
+    def __repr__(self):
+        return f'<CachedUser {self.username}>'
+
+class UserCache:
+    """Per-worker TTL cache of logged-in users, so authenticated requests skip the User query
+
+    Entries expire after USER_CACHE_TTL seconds, which bounds how long another
+    worker can serve a changed user; this worker drops them as soon as they change.
+    """
+
+    def __init__(self):
+        self._entries = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        """Return a CachedUser for the id, or None if there is no such user"""
+        entries = self._cache()
+        now = time.monotonic()
+
+        cached = entries.get(user_id)
+        if cached is not None and cached[0] > now:
+            self.hits += 1
+            return cached[1]
+
+        self.misses += 1
+        row = db.session.query(User.id, User.username, User.is_admin).filter(User.id == user_id).first()
+        if row is None:
+            return None
+
+        user = CachedUser(row.id, row.username, row.is_admin)
+        entries.set(user_id, (now + current_app.config['USER_CACHE_TTL'], user))
+        return user
+
+    def invalidate(self, user_id=None):
+        """Drop one user (or every user) from this worker's cache"""
+        if self._entries is None:
+            return
+        if user_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(user_id)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries) if self._entries is not None else 0,
+            'ttl': current_app.config['USER_CACHE_TTL'],
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / lookups) if lookups else 0.0
+        }
+
+    def _cache(self):
+        if self._entries is None:
+            self._entries = LRUCache(current_app.config['USER_CACHE_SIZE'])
+        return self._entries
+
+user_cache = UserCache()
@@ -0,0 +1,151 @@
+import csv
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+
+from app import db
+from archive import archive_attendance, archive_horizon
+from imports import import_students, read_student_csv
+from models import (
+    ActivitySummary, Attendance, AttendanceArchive, AttendanceDailyCount, Student, init_database, seed_admin
+)
+from qr_render import iter_badge_pdf, iter_badges
+from qr_tokens import is_token
+from search import ensure_search_index, rebuild_search_index
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create the database tables and indexes and backfill the rollups"""
+    init_database()
+    click.echo('Database initialized.')
+
+@click.command('seed-admin')
+@click.option('--username', default='admin', show_default=True)
+@click.option('--email', default='admin@example.com', show_default=True)
+@click.password_option()
+@with_appcontext
+def seed_admin_command(username, email, password):
+    """Create the admin user if it does not exist"""
+    if seed_admin(username, email, password):
+        click.echo(f'Created admin user {username}.')
+    else:
+        click.echo(f'User {username} already exists.')
+
+rollup_cli = AppGroup('rollup', help='Manage the attendance rollup tables.')
+
+@rollup_cli.command('rebuild')
+def rebuild_rollups():
+    """Recompute attendance rollups and global counters from the base tables"""
+    counts = AttendanceDailyCount.rebuild()
+    for name, value in counts.items():
+        click.echo(f'{name}: {value}')
+    click.echo('Rollups rebuilt.')
+
+qr_cli = AppGroup('qr', help='Manage student QR codes.')
+
+@qr_cli.command('reissue')
+@click.option('--all', 'reissue_all', is_flag=True, help='Also re-sign students that already have a token.')
+@click.option('--batch-size', default=1000, show_default=True)
+def reissue_qr_codes(reissue_all, batch_size):
+    """Replace stored legacy JSON QR payloads with signed tokens"""
+    updated = 0
+    last_id = 0
+    while True:
+        students = Student.query\
+            .filter(Student.id > last_id)\
+            .order_by(Student.id)\
+            .limit(batch_size)\
+            .all()
+        if not students:
+            break
+        
+        for student in students:
+            if reissue_all or not is_token(student.qr_data):
+                student.save_qr_data()
+                updated += 1
+        db.session.commit()
+        last_id = students[-1].id
+    
+    click.echo(f'Reissued {updated} QR codes.')
+
+@qr_cli.command('badges')
+@click.argument('output', type=click.File('wb'))
+@click.option('--prefix', help='Only students whose student ID starts with this prefix.')
+@click.option('--since', type=click.DateTime(['%Y-%m-%d']), help='Only students registered on or after this date.')
+@click.option('--workers', type=int, help='Worker processes used to compute QR codes.')
+def print_badges(output, prefix, since, workers):
+    """Write printable QR badge sheets (PDF) for the selected students"""
+    from routes import badge_query
+    
+    workers = workers or current_app.config['BADGE_WORKERS']
+    rows = badge_query(prefix, since).yield_per(current_app.config['EXPORT_BATCH_SIZE'])
+    for chunk in iter_badge_pdf(iter_badges(rows), workers=workers):
+        output.write(chunk)
+    click.echo(f'Badge sheets written to {output.name}.')
+
+students_cli = AppGroup('students', help='Manage student records.')
+
+@students_cli.command('import')
+@click.argument('source', type=click.File('rb'))
+@click.option('--chunk-size', type=int, help='Rows inserted per transaction.')
+@click.option('--report', type=click.File('w'), help='Write rejected rows to this CSV file.')
+def import_students_command(source, chunk_size, report):
+    """Bulk import students from a CSV file"""
+    try:
+        result = import_students(read_student_csv(source), chunk_size=chunk_size)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    
+    if report is not None:
+        writer = csv.DictWriter(report, fieldnames=['line', 'student_id', 'message'])
+        writer.writeheader()
+        writer.writerows(result.errors)
+    else:
+        for error in result.errors:
+            click.echo(f"Line {error['line']} ({error['student_id']}): {error['message']}", err=True)
+    
+    click.echo(f'Imported {result.imported} students, {result.rejected} rows rejected.')
+
+@students_cli.command('reindex')
+def reindex_students_command():
+    """Rebuild the full-text student search index"""
+    if not ensure_search_index():
+        raise click.ClickException('This database has no FTS5 search index; search uses the in-memory index.')
+    click.echo(f'Indexed {rebuild_search_index()} students.')
+
+archive_cli = AppGroup('archive', help='Manage the attendance archive.')
+
+@archive_cli.command('run')
+@click.option('--days', type=int, help='Archive activities that ended more than this many days ago (default: ARCHIVE_AFTER_DAYS).')
+@click.option('--limit', type=int, help='Archive at most this many activities.')
+def archive_run(days, limit):
+    """Move the attendance of long-finished activities to the archive"""
+    try:
+        result = archive_attendance(days=days, max_activities=limit)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Archived {result['rows']} attendance records of {result['activities']} activities "
+               f"that ended before {result['cutoff']:%Y-%m-%d %H:%M}.")
+
+@archive_cli.command('status')
+def archive_status():
+    """Show how much attendance is in each tier"""
+    counts = {
+        'hot': Attendance.query.count(),
+        'archived': AttendanceArchive.query.count(),
+        'archived_activities': ActivitySummary.query.count()
+    }
+    for name, value in counts.items():
+        click.echo(f'{name}: {value}')
+    horizon = archive_horizon()
+    click.echo(f"latest archived scan: {horizon:%Y-%m-%d %H:%M}" if horizon else 'latest archived scan: none')
+
+def register_commands(app):
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(seed_admin_command)
+    app.cli.add_command(rollup_cli)
+    app.cli.add_command(qr_cli)
+    app.cli.add_command(students_cli)
+    app.cli.add_command(archive_cli)
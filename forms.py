@@ -1,6 +1,7 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileAllowed, FileField, FileRequired
 from wtforms import StringField, PasswordField, SubmitField, BooleanField, TextAreaField, DateField, DateTimeField, HiddenField
-from wtforms.validators import DataRequired, Email, Length, EqualTo, ValidationError
+from wtforms.validators import DataRequired, Email, Length, EqualTo, Optional, ValidationError
 from models import User, Student, Activity
 
 class LoginForm(FlaskForm):
@@ -51,6 +52,10 @@ class StudentForm(FlaskForm):
         if student and (not self.original_student_id or student.student_id != self.original_student_id):
             raise ValidationError('This email is already registered.')
 
+class StudentImportForm(FlaskForm):
+    file = FileField('CSV File', validators=[FileRequired(), FileAllowed(['csv'], 'Please upload a CSV file.')])
+    submit = SubmitField('Import')
+
 class ActivityForm(FlaskForm):
     name = StringField('Activity Name', validators=[DataRequired(), Length(max=100)])
     description = TextAreaField('Description')
@@ -67,8 +72,8 @@ class ActivityForm(FlaskForm):
 class AttendanceSearchForm(FlaskForm):
     activity_id = HiddenField()
     student_id = StringField('Student ID')
-    date_from = DateField('From Date', format='%Y-%m-%d')
-    date_to = DateField('To Date', format='%Y-%m-%d')
+    date_from = DateField('From Date', format='%Y-%m-%d', validators=[Optional()])
+    date_to = DateField('To Date', format='%Y-%m-%d', validators=[Optional()])
     submit = SubmitField('Search')
 
 class AttendanceScanForm(FlaskForm):
@@ -0,0 +1,171 @@
+import csv
+import io
+import logging
+import re
+from datetime import datetime
+from itertools import islice
+
+from flask import current_app
+
+from app import db
+from cache import roster_cache
+from models import StatCounter, Student
+from qr_tokens import encode_token
+from search import index_student_ids, prefix_index
+
+# Column names accepted in an import file (header matching ignores case and spaces)
+REQUIRED_COLUMNS = ('student_id', 'first_name', 'last_name', 'email')
+OPTIONAL_COLUMNS = ('phone', 'date_of_birth')
+
+# Syntax-only email check; full email_validator parsing costs more than the insert itself
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s.]+$')
+
+class ImportReport:
+    """Outcome of a bulk import: the number of students created and one error per rejected row"""
+
+    def __init__(self):
+        self.imported = 0
+        self.errors = []
+
+    @property
+    def rejected(self):
+        return len(self.errors)
+
+    def reject(self, line, student_id, message):
+        self.errors.append({'line': line, 'student_id': student_id, 'message': message})
+
+    def to_dict(self):
+        return {'imported': self.imported, 'rejected': self.rejected, 'errors': self.errors}
+
+def read_student_csv(stream):
+    """Yield (line number, row dict) from a binary CSV stream, one row at a time"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text)
+
+    header = next(reader, None)
+    if header is None:
+        raise ValueError('The CSV file is empty')
+
+    columns = [name.strip().lower().replace(' ', '_') for name in header]
+    missing = [name for name in REQUIRED_COLUMNS if name not in columns]
+    if missing:
+        raise ValueError(f"The CSV file is missing columns: {', '.join(missing)}")
+
+    for values in reader:
+        if not any(value.strip() for value in values):
+            continue
+        yield reader.line_num, {name: value.strip() for name, value in zip(columns, values)}
+
+def _clean_row(row):
+    """Validate one CSV row like StudentForm does, returning column values or raising ValueError"""
+    values = {name: row.get(name) or None for name in REQUIRED_COLUMNS + OPTIONAL_COLUMNS}
+
+    for name in REQUIRED_COLUMNS:
+        if not values[name]:
+            raise ValueError(f'{name} is required')
+
+    if not 4 <= len(values['student_id']) <= 20:
+        raise ValueError('student_id must be between 4 and 20 characters long')
+    if len(values['first_name']) > 64 or len(values['last_name']) > 64:
+        raise ValueError('Names cannot be longer than 64 characters')
+    if values['phone'] and len(values['phone']) > 20:
+        raise ValueError('phone cannot be longer than 20 characters')
+
+    if not EMAIL_PATTERN.match(values['email']):
+        raise ValueError('Invalid email address')
+    if len(values['email']) > 120:
+        raise ValueError('email cannot be longer than 120 characters')
+
+    if values['date_of_birth']:
+        try:
+            values['date_of_birth'] = datetime.strptime(values['date_of_birth'], '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError('date_of_birth must be formatted as YYYY-MM-DD')
+
+    return values
+
+def _insert_chunk(rows):
+    """Insert validated student rows with executemany and give each its signed QR token"""
+    now = datetime.utcnow()
+    for row in rows:
+        row['created_at'] = now
+
+    if db.session.get_bind().dialect.insert_executemany_returning:
+        inserted = db.session.execute(db.insert(Student).returning(Student.id), rows).scalars().all()
+    else:
+        db.session.execute(db.insert(Student), rows)
+        inserted = db.session.query(Student.id)\
+            .filter(Student.student_id.in_([row['student_id'] for row in rows]))\
+            .all()
+        inserted = [row.id for row in inserted]
+
+    # Tokens are derived from the new primary keys, so they are set in one bulk UPDATE
+    db.session.execute(db.update(Student), [{'id': pk, 'qr_data': encode_token(pk)} for pk in inserted])
+
+    # Core inserts skip the ORM events that maintain the search index
+    index_student_ids(inserted)
+    return len(inserted)
+
+def import_students(rows, chunk_size=None):
+    """Import (line number, row dict) pairs in chunks, committing one transaction per chunk"""
+    chunk_size = chunk_size or current_app.config['IMPORT_CHUNK_SIZE']
+    report = ImportReport()
+
+    # Keys already committed earlier in this file
+    seen_ids = set()
+    seen_emails = set()
+
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+
+        candidates = []
+        for line, row in chunk:
+            try:
+                values = _clean_row(row)
+            except ValueError as e:
+                report.reject(line, row.get('student_id'), str(e))
+                continue
+            candidates.append((line, values))
+
+        # One query per unique key for the whole chunk
+        student_ids = {values['student_id'] for _, values in candidates}
+        emails = {values['email'] for _, values in candidates}
+        taken_ids = {row.student_id for row in db.session.query(Student.student_id).filter(Student.student_id.in_(student_ids))}
+        taken_emails = {row.email for row in db.session.query(Student.email).filter(Student.email.in_(emails))}
+
+        # Keys claimed by this chunk only count as taken once the chunk commits
+        chunk_ids = set()
+        chunk_emails = set()
+        valid = []
+        for line, values in candidates:
+            if values['student_id'] in taken_ids or values['student_id'] in seen_ids or values['student_id'] in chunk_ids:
+                report.reject(line, values['student_id'], 'This student ID is already registered.')
+            elif values['email'] in taken_emails or values['email'] in seen_emails or values['email'] in chunk_emails:
+                report.reject(line, values['student_id'], 'This email is already registered.')
+            else:
+                chunk_ids.add(values['student_id'])
+                chunk_emails.add(values['email'])
+                valid.append((line, values))
+
+        if not valid:
+            continue
+
+        try:
+            imported = _insert_chunk([values for _, values in valid])
+            StatCounter.add(StatCounter.STUDENTS, imported)
+            db.session.commit()
+            report.imported += imported
+            seen_ids |= chunk_ids
+            seen_emails |= chunk_emails
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error importing students: {str(e)}")
+            for line, values in valid:
+                report.reject(line, values['student_id'], 'Could not be saved, the chunk was rolled back')
+
+    roster_cache.invalidate()
+    prefix_index.invalidate()
+    return report
@@ -0,0 +1,197 @@
+import asyncio
+import logging
+
+from sqlalchemy import func, select
+
+from app import db
+from models import Attendance, Student
+
+def _events_query(activity_id, after_id, limit):
+    """Select attendance events for an activity with ids above after_id, oldest first"""
+    return select(
+        Attendance.id.label('id'),
+        Attendance.timestamp.label('timestamp'),
+        Student.id.label('student_pk'),
+        Student.student_id.label('student_number'),
+        Student.first_name.label('first_name'),
+        Student.last_name.label('last_name')
+    ).join(Student, Attendance.student_id == Student.id)\
+        .where(Attendance.activity_id == activity_id, Attendance.id > after_id)\
+        .order_by(Attendance.id)\
+        .limit(limit)
+
+def _position_query(activity_id, up_to_id=None):
+    """Select (last attendance id, number of records up to it) for an activity"""
+    query = select(func.coalesce(func.max(Attendance.id), 0), func.count(Attendance.id))\
+        .where(Attendance.activity_id == activity_id)
+    if up_to_id is not None:
+        query = query.where(Attendance.id <= up_to_id)
+    return query
+
+def _event(row):
+    return {
+        'id': row.id,
+        'timestamp': row.timestamp.isoformat(),
+        'student': {
+            'id': row.student_pk,
+            'name': f"{row.first_name} {row.last_name}",
+            'student_id': row.student_number
+        }
+    }
+
+def _number(events, last_id, count):
+    """Number events with the running attendance count, given the count at last_id (which may lie inside them)"""
+    seen = sum(1 for event in events if event['id'] <= last_id)
+    for index, event in enumerate(events, 1):
+        event['count'] = count - seen + index
+    return events
+
+def feed_events(activity_id, after_id, limit):
+    """Return up to limit attendance events after after_id, each carrying the activity's count up to it
+
+    Used by take pages that poll instead of streaming; the (activity_id, id)
+    index makes an empty poll a single index probe.
+    """
+    events = [_event(row) for row in db.session.execute(_events_query(activity_id, after_id, limit))]
+    if not events:
+        return events
+    last_id, count = db.session.execute(_position_query(activity_id, events[-1]['id'])).one()
+    return _number(events, last_id, count)
+
+class Subscription:
+    """One client's view of an activity feed, delivering events after its cursor exactly once"""
+
+    def __init__(self, activity_id, cursor):
+        self.activity_id = activity_id
+        self.cursor = cursor
+        self._queue = asyncio.Queue()
+
+    def publish(self, events):
+        self._queue.put_nowait(events)
+
+    async def get(self, timeout):
+        """Wait up to timeout seconds and return the new events (possibly none)"""
+        try:
+            batches = [await asyncio.wait_for(self._queue.get(), timeout)]
+        except asyncio.TimeoutError:
+            return []
+        while not self._queue.empty():
+            batches.append(self._queue.get_nowait())
+
+        events = []
+        for batch in batches:
+            for event in batch:
+                # Events already delivered by the catch-up query are skipped
+                if event['id'] > self.cursor:
+                    events.append(event)
+                    self.cursor = event['id']
+        return events
+
+class ActivityPoller:
+    """Task polling one activity for new attendance and fanning it out to subscribers
+
+    However many viewers an activity has, it costs one indexed range query on
+    (activity_id, id) per poll interval, run on the event loop with the async engine.
+    """
+
+    def __init__(self, engine, activity_id, interval, batch_size):
+        self.engine = engine
+        self.activity_id = activity_id
+        self.interval = interval
+        self.batch_size = batch_size
+        self.subscribers = set()
+        # (last attendance id seen, number of records up to it), replaced together so readers see a matching pair
+        self.position = (0, 0)
+        self.ready = asyncio.Event()
+        self._task = None
+
+    async def start(self):
+        try:
+            async with self.engine.connect() as conn:
+                self.position = tuple((await conn.execute(_position_query(self.activity_id))).one())
+        finally:
+            self.ready.set()
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                async with self.engine.connect() as conn:
+                    rows = await conn.execute(_events_query(self.activity_id, self.position[0], self.batch_size))
+                    events = [_event(row) for row in rows]
+            except Exception as e:
+                logging.error(f"Error polling attendance feed: {str(e)}")
+                continue
+            if not events:
+                continue
+
+            self.position = (events[-1]['id'], self.position[1] + len(events))
+            _number(events, *self.position)
+            for subscriber in list(self.subscribers):
+                subscriber.publish(events)
+
+class LiveFeedHub:
+    """Per-process registry of activity pollers for the ASGI event stream, started on first subscriber and stopped after the last"""
+
+    def __init__(self):
+        self._pollers = {}
+
+    async def subscribe(self, engine, activity_id, cursor, interval, batch_size):
+        """Subscribe to new attendance for an activity, returning the subscription and any missed events"""
+        subscription = Subscription(activity_id, cursor)
+
+        # Registered before the first await, so concurrent subscribers share one poller
+        poller = self._pollers.get(activity_id)
+        if poller is None:
+            poller = ActivityPoller(engine, activity_id, interval, batch_size)
+            self._pollers[activity_id] = poller
+            poller.subscribers.add(subscription)
+            try:
+                await poller.start()
+            except Exception:
+                self.unsubscribe(subscription)
+                raise
+        else:
+            poller.subscribers.add(subscription)
+            await poller.ready.wait()
+            if self._pollers.get(activity_id) is not poller:
+                raise RuntimeError('The live feed could not be started')
+
+        # Catch up on anything recorded after the client's cursor; later duplicates from
+        # the poller are dropped by the subscription cursor
+        last_id, count = poller.position
+        backlog = []
+        async with engine.connect() as conn:
+            while subscription.cursor < last_id:
+                rows = await conn.execute(_events_query(activity_id, subscription.cursor, batch_size))
+                events = [_event(row) for row in rows]
+                if not events:
+                    break
+                backlog.extend(events)
+                subscription.cursor = events[-1]['id']
+
+        # Number the backlog as the poller numbers events: the count at last_id, running up to it and on past it
+        return subscription, _number(backlog, last_id, count)
+
+    def unsubscribe(self, subscription):
+        poller = self._pollers.get(subscription.activity_id)
+        if poller is None:
+            return
+        poller.subscribers.discard(subscription)
+        if not poller.subscribers:
+            poller.stop()
+            del self._pollers[subscription.activity_id]
+
+    def stats(self):
+        # Read from Flask threads while the event loop updates it
+        return {
+            activity_id: len(poller.subscribers)
+            for activity_id, poller in list(self._pollers.items())
+        }
+
+live_feed = LiveFeedHub()
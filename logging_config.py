@@ -0,0 +1,191 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import g, request
+
+# Default LOG_SAMPLE_RATES: every scan would otherwise log twice (the scan and its request)
+DEFAULT_SAMPLE_RATES = 'scan=0.01,scan_attendance=0.01,async_scan_attendance=0.01'
+
+# (request id, endpoint, method, start time) of the request being handled, stamped on every record it logs
+request_context = contextvars.ContextVar('request_context', default=None)
+
+# Attributes every LogRecord has; anything else was passed with extra= and goes into the JSON object
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+# Incoming X-Request-ID values are kept only if they look like ids
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+# Event (or endpoint) name -> fraction of its records kept
+_sample_rates = {}
+_settings = {'mode': 'text'}
+
+def parse_sample_rates(value):
+    """Parse "scan=0.01,request=0.5" into {'scan': 0.01, 'request': 0.5}"""
+    rates = {}
+    for item in (value or '').split(','):
+        name, sep, rate = item.partition('=')
+        if sep and name.strip():
+            rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+def sample_rate(event, default=1.0):
+    return _sample_rates.get(event, default)
+
+def sampled(rate):
+    """Return True for the given fraction of calls"""
+    return rate >= 1.0 or random.random() < rate
+
+class ContextFilter(logging.Filter):
+    """Stamp records with the current request's id, endpoint and elapsed time, in the thread that logged them"""
+
+    def filter(self, record):
+        context = request_context.get()
+        if context is not None:
+            record.request_id, record.endpoint, record.method, started = context
+            record.elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with the extra= fields as keys"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """Queue handler leaving all formatting to the listener thread
+
+    The stdlib version formats the whole record (traceback included) in the
+    logging thread; here only the message arguments are merged, since they
+    may be mutated once the call returns.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+def configure_logging():
+    """Set up the root logger from the environment, unless something already did
+
+    LOG_MODE=text (default) writes plain lines synchronously, as in development;
+    LOG_MODE=json writes one JSON object per record from a background
+    QueueListener thread, so logging threads only pay for a queue put.
+    LOG_LEVEL defaults to DEBUG in text mode and INFO in json mode,
+    LOG_SAMPLE_RATES lists "event=fraction" pairs for high-volume records
+    and LOG_SQL=1 logs every SQL statement.
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return
+
+    mode = os.environ.get('LOG_MODE', 'text')
+    level = os.environ.get('LOG_LEVEL', 'DEBUG' if mode == 'text' else 'INFO').upper()
+    _settings['mode'] = mode
+    _sample_rates.clear()
+    _sample_rates.update(parse_sample_rates(os.environ.get('LOG_SAMPLE_RATES', DEFAULT_SAMPLE_RATES)))
+
+    stream = logging.StreamHandler(sys.stderr)
+    if mode == 'json':
+        stream.setFormatter(JsonFormatter())
+        log_queue = queue.SimpleQueue()
+        handler = QueueHandler(log_queue)
+        listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+        listener.start()
+        # Drain the queue on exit so the last records are written
+        atexit.register(listener.stop)
+        # The request records below replace the development server's access lines
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    else:
+        stream.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+        handler = stream
+    handler.addFilter(ContextFilter())
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    # SQLAlchemy logs every statement when its loggers inherit DEBUG
+    logging.getLogger('sqlalchemy.engine').setLevel(
+        logging.INFO if os.environ.get('LOG_SQL', '0') == '1' else logging.WARNING
+    )
+
+def log_event(event, message, *args, level=logging.INFO, **fields):
+    """Log one high-volume event, such as a scan, keeping the LOG_SAMPLE_RATES fraction of them
+
+    The message is %-formatted only for kept records, and each carries its
+    sample_rate so counts can be scaled back up.
+    """
+    if not logging.root.isEnabledFor(level):
+        return
+    rate = sample_rate(event)
+    if sampled(rate):
+        logging.log(level, message, *args, extra=dict(fields, event=event, sample_rate=rate))
+
+def begin_request(request_id, endpoint, method):
+    """Bind a request to the records logged while handling it, returning its id"""
+    if not request_id or not _REQUEST_ID.match(request_id):
+        request_id = uuid.uuid4().hex[:16]
+    request_context.set((request_id, endpoint, method, time.perf_counter()))
+    return request_id
+
+def log_request(status, path):
+    """Log the request being handled as one JSON record with its status and duration (json mode only)
+
+    Server errors are always kept; other requests are sampled by endpoint, then by "request".
+    """
+    context = request_context.get()
+    if context is None or _settings['mode'] != 'json' or not logging.root.isEnabledFor(logging.INFO):
+        return
+    request_id, endpoint, method, started = context
+    rate = 1.0 if status >= 500 else sample_rate(endpoint or 'unmatched', sample_rate('request'))
+    if sampled(rate):
+        logging.info('%s %s %s', method, path, status, extra={
+            'event': 'request',
+            'status': status,
+            'path': path,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+            'sample_rate': rate
+        })
+
+def register_request_logging(app):
+    """Give each Flask request an id (X-Request-ID, echoed back) and log it on completion"""
+    @app.before_request
+    def start_request_log():
+        g.request_id = begin_request(request.headers.get('X-Request-ID'), request.endpoint, request.method)
+
+    @app.after_request
+    def finish_request_log(response):
+        request_id = g.get('request_id')
+        if request_id:
+            response.headers['X-Request-ID'] = request_id
+            log_request(response.status_code, request.path)
+        return response
+
+    @app.teardown_request
+    def clear_request_log(exc=None):
+        # Worker threads are reused, so the next request must not inherit this one's context
+        request_context.set(None)
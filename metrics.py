@@ -0,0 +1,183 @@
+import logging
+import os
+import threading
+import time
+import traceback
+from bisect import bisect_left
+from collections import defaultdict, deque
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Frames from these directories are skipped when looking for the code that issued a query
+_APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+_LIBRARY_MARKERS = ('site-packages', 'dist-packages', os.sep + 'lib' + os.sep + 'python')
+
+class Histogram:
+    """Cumulative Prometheus-style histogram with fixed buckets"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def samples(self):
+        """Yield (le label, cumulative count) pairs including +Inf"""
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{bound:g}', cumulative
+        yield '+Inf', cumulative + self.counts[-1]
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _query_caller():
+    """Return 'file:line in function' for the innermost application frame issuing a query"""
+    for frame in reversed(traceback.extract_stack()[:-3]):
+        filename = frame.filename
+        if filename.startswith(_APP_ROOT) and not any(marker in filename for marker in _LIBRARY_MARKERS):
+            return f'{os.path.relpath(filename, _APP_ROOT)}:{frame.lineno} in {frame.name}'
+    return 'unknown'
+
+class Metrics:
+    """Per-worker request and SQL metrics, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)  # (endpoint, method, status) -> count
+        self.latency = {}                 # endpoint -> Histogram of seconds
+        self.queries = {}                 # endpoint -> Histogram of queries per request
+        self.query_time = defaultdict(float)  # endpoint -> SQL seconds
+        self.slow_queries = deque(maxlen=50)
+        self.slow_query_count = 0
+        self.slow_query_seconds = 0.1
+        self.server_timing = False
+
+    def init_app(self, app):
+        """Install the request hooks and SQL listeners on an app"""
+        self.slow_query_seconds = app.config['SLOW_QUERY_MS'] / 1000
+        self.slow_queries = deque(maxlen=app.config['SLOW_QUERY_LOG_SIZE'])
+        self.server_timing = app.config['METRICS_SERVER_TIMING']
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    def _start_request(self):
+        g.metrics_started = time.perf_counter()
+        g.sql_count = 0
+        g.sql_time = 0.0
+
+    def _finish_request(self, response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+
+        # Unrouted requests (404s) share one label so scanners cannot inflate the series
+        endpoint = request.endpoint or 'unmatched'
+        elapsed = time.perf_counter() - started
+        sql_count = g.get('sql_count', 0)
+        sql_time = g.get('sql_time', 0.0)
+        self.observe_request(endpoint, request.method, response.status_code, elapsed, sql_count, sql_time)
+
+        if self.server_timing:
+            response.headers['Server-Timing'] = (
+                f'app;dur={elapsed * 1000:.1f}, db;dur={sql_time * 1000:.1f};desc="{sql_count} queries"'
+            )
+        return response
+
+    def observe_request(self, endpoint, method, status, elapsed, sql_count=0, sql_time=0.0):
+        """Record one handled request; also used by the ASGI endpoints, which bypass Flask"""
+        with self._lock:
+            self.requests[(endpoint, method, status)] += 1
+            self.latency.setdefault(endpoint, Histogram(LATENCY_BUCKETS)).observe(elapsed)
+            self.queries.setdefault(endpoint, Histogram(QUERY_COUNT_BUCKETS)).observe(sql_count)
+            self.query_time[endpoint] += sql_time
+
+    def record_query(self, statement, duration):
+        if has_request_context():
+            g.sql_count = g.get('sql_count', 0) + 1
+            g.sql_time = g.get('sql_time', 0.0) + duration
+
+        if duration >= self.slow_query_seconds:
+            caller = _query_caller()
+            entry = {
+                'statement': ' '.join(statement.split())[:2000],
+                'duration_ms': round(duration * 1000, 2),
+                'caller': caller,
+                'endpoint': request.endpoint if has_request_context() else None,
+                'at': time.time()
+            }
+            with self._lock:
+                self.slow_queries.append(entry)
+                self.slow_query_count += 1
+            logging.warning(f"Slow query ({entry['duration_ms']} ms) from {caller}: {entry['statement'][:200]}")
+
+    def render(self, gauges=None):
+        """Return all metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            lines.append('# HELP http_requests_total Requests handled, by endpoint, method and status.')
+            lines.append('# TYPE http_requests_total counter')
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{endpoint="{_escape(endpoint)}",method="{method}",status="{status}"}} {count}')
+
+            for name, help_text, histograms in (
+                ('http_request_duration_seconds', 'Time spent handling requests (until the response is returned).', self.latency),
+                ('db_queries_per_request', 'SQL statements executed per request.', self.queries)
+            ):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for endpoint, histogram in sorted(histograms.items()):
+                    label = f'endpoint="{_escape(endpoint)}"'
+                    for le, count in histogram.samples():
+                        lines.append(f'{name}_bucket{{{label},le="{le}"}} {count}')
+                    lines.append(f'{name}_sum{{{label}}} {histogram.total:.6f}')
+                    lines.append(f'{name}_count{{{label}}} {histogram.count}')
+
+            lines.append('# HELP db_query_seconds_total Time spent executing SQL, by endpoint.')
+            lines.append('# TYPE db_query_seconds_total counter')
+            for endpoint, seconds in sorted(self.query_time.items()):
+                lines.append(f'db_query_seconds_total{{endpoint="{_escape(endpoint)}"}} {seconds:.6f}')
+
+            lines.append('# HELP db_slow_queries_total SQL statements slower than SLOW_QUERY_MS.')
+            lines.append('# TYPE db_slow_queries_total counter')
+            lines.append(f'db_slow_queries_total {self.slow_query_count}')
+
+        for name, (help_text, samples) in (gauges or {}).items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                lines.append(f'{name}{{{label_text}}} {value}' if label_text else f'{name} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+    def recent_slow_queries(self):
+        with self._lock:
+            return list(reversed(self.slow_queries))
+
+metrics = Metrics()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start')
+    if starts:
+        metrics.record_query(statement, time.perf_counter() - starts.pop())
@@ -1,7 +1,100 @@
 from datetime import datetime
+import itertools
 from app import db
 from flask_login import UserMixin
-import json
+from sqlalchemy import event, func, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from werkzeug.security import generate_password_hash
+import logging
+
+from qr_tokens import encode_token
+
+# Schema of the attendance archive; mapped to the main database unless ARCHIVE_DATABASE_FILE attaches one
+ARCHIVE_SCHEMA = 'archive'
+
+def dialect_insert(model, dialect=None):
+    """Return an INSERT construct supporting ON CONFLICT for the bound (or named) dialect, or None if unsupported"""
+    if dialect is None:
+        dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(model)
+    if dialect == 'sqlite':
+        return sqlite.insert(model)
+    return None
+
+def increment_statement(model, keys, column, delta, dialect=None):
+    """Return an upsert adding delta to a counter column, or None if the dialect has no ON CONFLICT"""
+    stmt = dialect_insert(model, dialect)
+    if stmt is None:
+        return None
+    return stmt.values(**keys, **{column: delta}).on_conflict_do_update(
+        index_elements=list(keys),
+        set_={column: getattr(model, column) + delta}
+    )
+
+def upsert_increment(model, keys, column, delta):
+    """Add delta to a counter column as part of the current transaction, creating the row if needed"""
+    stmt = increment_statement(model, keys, column, delta)
+    if stmt is not None:
+        db.session.execute(stmt)
+        return
+    
+    column_attr = getattr(model, column)
+    updated = model.query.filter_by(**keys).update({column_attr: column_attr + delta})
+    if not updated:
+        db.session.add(model(**keys, **{column: delta}))
+
+def ensure_indexes():
+    """Create indexes that were declared after their tables already existed"""
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            if table is Attendance.__table__ and index.unique:
+                # Older databases may hold duplicates recorded by concurrent scans
+                removed = Attendance.remove_duplicates()
+                if removed:
+                    logging.warning(f"Removed {removed} duplicate attendance records")
+            index.create(db.engine)
+            logging.info(f"Created index {index.name}")
+
+def init_database():
+    """Create missing tables and indexes and backfill the rollups of a new database"""
+    db.create_all()
+    
+    # Add indexes missing from databases created by earlier versions
+    ensure_indexes()
+    
+    # Backfill the dashboard rollups the first time they appear
+    if not StatCounter.query.first():
+        AttendanceDailyCount.rebuild()
+        logging.info("Built attendance rollups")
+    
+    # Full-text index behind the student search (SQLite only)
+    from search import ensure_search_index
+    ensure_search_index()
+
+def seed_admin(username='admin', email='admin@example.com', password='admin123'):
+    """Create the admin user if it does not exist yet, returning True if it was created"""
+    if User.query.filter_by(username=username).first():
+        return False
+    
+    admin = User(
+        username=username,
+        email=email,
+        password_hash=generate_password_hash(password),
+        is_admin=True
+    )
+    db.session.add(admin)
+    db.session.commit()
+    logging.info(f"Created admin user {username}")
+    return True
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -23,11 +116,17 @@ class Student(db.Model):
     phone = db.Column(db.String(20))
     date_of_birth = db.Column(db.Date)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    qr_data = db.Column(db.String(512), nullable=False)
+    # Set from the primary key once the row is flushed (see save_qr_data)
+    qr_data = db.Column(db.String(512), nullable=False, default='')
     
     # Define relationship with attendance records
     attendance_records = db.relationship('Attendance', backref='student', lazy=True)
     
+    # Backs keyset pagination of the student list
+    __table_args__ = (
+        db.Index('ix_student_name', 'last_name', 'first_name', 'id'),
+    )
+    
     def __repr__(self):
         return f'<Student {self.student_id} - {self.first_name} {self.last_name}>'
     
@@ -35,17 +134,13 @@ class Student(db.Model):
         return f"{self.first_name} {self.last_name}"
     
     def generate_qr_data(self):
-        """Generate QR code data containing student information"""
-        data = {
-            "id": self.id,
-            "student_id": self.student_id,
-            "name": self.full_name(),
-            "timestamp": datetime.utcnow().isoformat()
-        }
-        return json.dumps(data)
+        """Generate the signed QR token identifying this student"""
+        return encode_token(self.id)
     
     def save_qr_data(self):
-        """Generate and save QR data to the student record"""
+        """Generate and save QR data to the student record (requires a primary key)"""
+        if self.id is None:
+            db.session.flush()
         self.qr_data = self.generate_qr_data()
         
 class Activity(db.Model):
@@ -64,6 +159,11 @@ class Activity(db.Model):
     # Define relationship with user who created the activity
     creator = db.relationship('User', backref='activities_created')
     
+    # Backs keyset pagination of the activity list
+    __table_args__ = (
+        db.Index('ix_activity_start_time', 'start_time', 'id'),
+    )
+    
     def __repr__(self):
         return f'<Activity {self.name}>'
     
@@ -74,12 +174,32 @@ class Activity(db.Model):
     
     def get_attendance_rate(self):
         """Calculate the attendance rate for this activity"""
-        total_students = Student.query.count()
-        if total_students == 0:
-            return 0
+        return Activity.attendance_stats([self.id])[self.id]['rate']
+    
+    @classmethod
+    def attendance_stats(cls, activity_ids):
+        """Return attendance counts and rates for several activities using one grouped query"""
+        activity_ids = set(activity_ids)
+        stats = {activity_id: {'count': 0, 'rate': 0} for activity_id in activity_ids}
+        if not activity_ids:
+            return stats
+        
+        counts = dict(db.session.query(Attendance.activity_id, func.count(Attendance.id))\
+            .filter(Attendance.activity_id.in_(activity_ids))\
+            .group_by(Attendance.activity_id))
         
-        attended_students = Attendance.query.filter_by(activity_id=self.id).count()
-        return (attended_students / total_students) * 100
+        # Archived activities are counted from their summaries
+        for activity_id, count in db.session.query(ActivitySummary.activity_id, ActivitySummary.attendance_count)\
+                .filter(ActivitySummary.activity_id.in_(activity_ids)):
+            counts[activity_id] = counts.get(activity_id, 0) + count
+        
+        total_students = StatCounter.get_many(StatCounter.STUDENTS)[StatCounter.STUDENTS]
+        for activity_id, count in counts.items():
+            stats[activity_id] = {
+                'count': count,
+                'rate': (count / total_students * 100) if total_students > 0 else 0
+            }
+        return stats
 
 class Attendance(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -88,6 +208,15 @@ class Attendance(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     scanned_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
+    # A student can only be recorded once per activity; the unique index also backs duplicate checks
+    __table_args__ = (
+        db.Index('ix_attendance_activity_student', 'activity_id', 'student_id', unique=True),
+        db.Index('ix_attendance_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_attendance_activity_timestamp', 'activity_id', 'timestamp', 'id'),
+        db.Index('ix_attendance_activity_id', 'activity_id', 'id'),
+        db.Index('ix_attendance_scanned_by', 'scanned_by'),
+    )
+    
     # Define relationship with the user who scanned
     scanner = db.relationship('User', backref='scans')
     
@@ -96,23 +225,455 @@ class Attendance(db.Model):
     
     @classmethod
     def record_attendance(cls, student_id, activity_id, user_id):
-        """Record attendance for a student in an activity"""
-        # Check if attendance already recorded
-        existing = cls.query.filter_by(
-            student_id=student_id,
-            activity_id=activity_id
-        ).first()
-        
-        if existing:
-            # Already recorded
+        """Record attendance for a student in an activity, returning False if already recorded (in either tier)"""
+        if AttendanceArchive.recorded_students(activity_id, [student_id]):
             return False
         
-        # Record new attendance
-        attendance = cls(
-            student_id=student_id,
-            activity_id=activity_id,
-            scanned_by=user_id
+        values = {
+            'student_id': student_id,
+            'activity_id': activity_id,
+            'scanned_by': user_id,
+            'timestamp': datetime.utcnow()
+        }
+        
+        stmt = dialect_insert(cls)
+        if stmt is None:
+            # Fall back to letting the unique index reject duplicates
+            try:
+                db.session.execute(db.insert(cls).values(**values))
+                AttendanceDailyCount.record([values])
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                return False
+            return True
+        
+        # Single atomic insert-or-ignore, safe across concurrent workers
+        stmt = stmt.values(**values).on_conflict_do_nothing(
+            index_elements=['activity_id', 'student_id']
         )
-        db.session.add(attendance)
+        result = db.session.execute(stmt)
+        recorded = result.rowcount == 1
+        if recorded:
+            AttendanceDailyCount.record([values])
+        db.session.commit()
+        return recorded
+    
+    @classmethod
+    def record_many(cls, student_ids, activity_id, user_id, timestamps=None, commit=True):
+        """Record attendance for several students in one transaction, returning the newly recorded ids"""
+        student_ids = set(student_ids)
+        student_ids -= AttendanceArchive.recorded_students(activity_id, student_ids)
+        if not student_ids:
+            return set()
+        
+        now = datetime.utcnow()
+        rows = [
+            {
+                'student_id': student_id,
+                'activity_id': activity_id,
+                'scanned_by': user_id,
+                'timestamp': timestamps.get(student_id, now) if timestamps else now
+            }
+            for student_id in student_ids
+        ]
+        
+        stmt = dialect_insert(cls)
+        if stmt is not None and db.session.get_bind().dialect.insert_returning:
+            # Insert-or-ignore reports exactly which rows were new, even under concurrent scans
+            stmt = stmt.values(rows).on_conflict_do_nothing(
+                index_elements=['activity_id', 'student_id']
+            ).returning(cls.student_id)
+            new_ids = set(db.session.execute(stmt).scalars())
+        else:
+            # One query to find which students are already recorded
+            existing = {
+                row.student_id for row in db.session.query(cls.student_id).filter(
+                    cls.activity_id == activity_id,
+                    cls.student_id.in_(student_ids)
+                )
+            }
+            new_ids = student_ids - existing
+            db.session.add_all([cls(**row) for row in rows if row['student_id'] in new_ids])
+        
+        AttendanceDailyCount.record([row for row in rows if row['student_id'] in new_ids])
+        if commit:
+            db.session.commit()
+        return new_ids
+    
+    @classmethod
+    def delete_for_student(cls, student_id):
+        """Delete a student's attendance records from both tiers and remove them from the rollups"""
+        rows = db.session.query(cls.activity_id, cls.timestamp).filter_by(student_id=student_id).all()
+        AttendanceDailyCount.record(rows, sign=-1)
+        deleted = cls.query.filter_by(student_id=student_id).delete(synchronize_session=False)
+        return deleted + AttendanceArchive.delete_for_student(student_id)
+    
+    @classmethod
+    def delete_for_activity(cls, activity_id):
+        """Delete an activity's attendance records from both tiers and remove them from the rollups"""
+        AttendanceDailyCount.remove_activity(activity_id)
+        deleted = cls.query.filter_by(activity_id=activity_id).delete(synchronize_session=False)
+        ActivitySummary.query.filter_by(activity_id=activity_id).delete(synchronize_session=False)
+        return deleted + AttendanceArchive.query.filter_by(activity_id=activity_id).delete(synchronize_session=False)
+    
+    @classmethod
+    def remove_duplicates(cls):
+        """Delete repeated attendance rows for the same student and activity, keeping the earliest"""
+        keep = db.select(func.min(cls.id)).group_by(cls.activity_id, cls.student_id)
+        removed = cls.query.filter(cls.id.not_in(keep)).delete(synchronize_session=False)
+        db.session.commit()
+        return removed
+
+class AttendanceArchive(db.Model):
+    """Attendance of long-finished activities, moved out of the hot table by archive.py
+    
+    Rows keep their original ids unless SQLite has since reused one (see
+    archive_activity). The table has no foreign keys because it may live in a
+    separate SQLite file (ARCHIVE_DATABASE_FILE), attached to every connection
+    as the archive schema.
+    """
+    __tablename__ = 'attendance_archive'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    student_id = db.Column(db.Integer, nullable=False)
+    activity_id = db.Column(db.Integer, nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False)
+    scanned_by = db.Column(db.Integer, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_attendance_archive_activity_id', 'activity_id', 'id'),
+        db.Index('ix_attendance_archive_activity_student', 'activity_id', 'student_id'),
+        db.Index('ix_attendance_archive_student_id', 'student_id', 'timestamp'),
+        db.Index('ix_attendance_archive_timestamp_id', 'timestamp', 'id'),
+        {'schema': ARCHIVE_SCHEMA}
+    )
+    
+    def __repr__(self):
+        return f'<AttendanceArchive {self.student_id} for Activity {self.activity_id}>'
+    
+    @classmethod
+    def recorded_students(cls, activity_id, student_ids):
+        """Return which of the students have archived attendance for the activity
+        
+        Rescans of an archived activity must not record them again in the hot table;
+        for activities that were never archived this costs one primary key lookup.
+        """
+        if not student_ids or db.session.get(ActivitySummary, activity_id) is None:
+            return set()
+        return set(db.session.scalars(db.select(cls.student_id).where(
+            cls.activity_id == activity_id,
+            cls.student_id.in_(student_ids)
+        )))
+    
+    @classmethod
+    def delete_for_student(cls, student_id):
+        """Delete a student's archived records, keeping the rollups and activity summaries in step"""
+        rows = db.session.query(cls.activity_id, cls.timestamp).filter_by(student_id=student_id).all()
+        if not rows:
+            return 0
+        
+        AttendanceDailyCount.record(rows, sign=-1)
+        per_activity = {}
+        for row in rows:
+            per_activity[row.activity_id] = per_activity.get(row.activity_id, 0) + 1
+        for activity_id, count in per_activity.items():
+            ActivitySummary.query.filter_by(activity_id=activity_id).update(
+                {ActivitySummary.attendance_count: ActivitySummary.attendance_count - count},
+                synchronize_session=False
+            )
+        return cls.query.filter_by(student_id=student_id).delete(synchronize_session=False)
+
+class ActivitySummary(db.Model):
+    """Attendance totals of an archived activity, kept in the hot database in place of its rows"""
+    activity_id = db.Column(db.Integer, db.ForeignKey('activity.id'), primary_key=True)
+    attendance_count = db.Column(db.Integer, nullable=False, default=0)
+    first_scan = db.Column(db.DateTime)
+    last_scan = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ActivitySummary activity={self.activity_id} count={self.attendance_count}>'
+
+class DataVersion(db.Model):
+    """Per-table change counters, bumped once by every transaction that writes the table (see the session events below)
+    
+    Attendance inserts, one per scan, skip the bump: the attendance version also
+    carries the sum of the daily rollups, which every insert raises in its own
+    transaction, so scanners never queue on the counter row and only updates,
+    deletes and archiving write it. Unlike max(attendance.id) the sum cannot miss
+    a commit whose sequence id is lower than one already visible.
+    """
+    STUDENTS = 'students'
+    ACTIVITIES = 'activities'
+    ATTENDANCE = 'attendance'
+    
+    # Stamp that changes whenever this process commits a bump, so its own caches need not wait for their next check
+    local_changes = 0
+    _change_stamps = itertools.count(1)
+    
+    name = db.Column(db.String(32), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DataVersion {self.name}={self.version}>'
+    
+    @classmethod
+    def get(cls, name):
+        """Return the current version for a named data set"""
+        return cls.get_many(name)[name]
+    
+    @classmethod
+    def get_many(cls, *names):
+        """Return the versions of several data sets with a single query
+        
+        The attendance version is a (counter, attendance total) pair; the others are plain counters.
+        """
+        query = db.select(cls.name, cls.version).where(cls.name.in_(names))
+        if cls.ATTENDANCE in names:
+            query = query.union_all(db.select(
+                db.literal('attendance_total'), func.coalesce(func.sum(AttendanceDailyCount.count), 0)
+            ))
+        versions = dict(db.session.execute(query).all())
+        if 'attendance_total' in versions:
+            versions[cls.ATTENDANCE] = (versions.get(cls.ATTENDANCE, 0), versions.pop('attendance_total'))
+        return {name: versions.get(name, 0) for name in names}
+    
+    @classmethod
+    def bump(cls, name):
+        """Increment a version counter as part of the current transaction"""
+        upsert_increment(cls, {'name': name}, 'version', 1)
+    
+    @classmethod
+    def mark_changed(cls):
+        """Record that this process committed new versions"""
+        cls.local_changes = next(cls._change_stamps)
+
+class ScanReceipt(db.Model):
+    """Outcome of an offline scan, stored so retried idempotency keys are only processed once"""
+    KEY_LENGTH = 64
+    
+    key = db.Column(db.String(KEY_LENGTH), primary_key=True)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activity.id'), nullable=False)
+    student_id = db.Column(db.Integer)
+    status = db.Column(db.String(16), nullable=False)
+    message = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<ScanReceipt {self.key} {self.status}>'
+    
+    def to_result(self, student=None):
+        """Return the receipt in the same shape as a freshly processed scan result
+        
+        student is the scanned student's roster entry (id, student_id, name), or None if they no longer exist.
+        """
+        result = {
+            'success': self.status == 'recorded',
+            'status': self.status,
+            'message': self.message
+        }
+        if student is not None:
+            result['student'] = {
+                'id': student.id,
+                'name': student.name,
+                'student_id': student.student_id
+            }
+        elif self.student_id is not None:
+            result['student'] = {'id': self.student_id}
+        return result
+    
+    @classmethod
+    def find(cls, keys):
+        """Return existing receipts for the given keys, indexed by key"""
+        keys = set(keys)
+        if not keys:
+            return {}
+        return {receipt.key: receipt for receipt in cls.query.filter(cls.key.in_(keys))}
+    
+    @classmethod
+    def rows(cls, activity_id, results):
+        """Return the receipt rows for results of processing scan keys, given indexed by key"""
+        return [
+            {
+                'key': key,
+                'activity_id': activity_id,
+                'student_id': (result.get('student') or {}).get('id'),
+                'status': result['status'],
+                'message': result['message'][:200]
+            }
+            for key, result in results.items()
+        ]
+    
+    @classmethod
+    def add_many(cls, activity_id, results):
+        """Store the results of processing scan keys as part of the current transaction, returning the keys stored
+        
+        A key stored first by another request (a retry racing its original) is left as it is.
+        """
+        rows = cls.rows(activity_id, results)
+        if not rows:
+            return set()
+        
+        stmt = dialect_insert(cls)
+        if stmt is not None and db.session.get_bind().dialect.insert_returning:
+            stmt = stmt.values(rows).on_conflict_do_nothing(index_elements=['key']).returning(cls.key)
+            return set(db.session.execute(stmt).scalars())
+        
+        db.session.add_all([cls(**row) for row in rows])
+        return set(results)
+
+class StatCounter(db.Model):
+    """Global row counters kept in step with inserts and deletes so the dashboard never counts tables
+    
+    Attendance has no counter row, which every scan would have to update; its
+    total is summed from the per-day rollups (see AttendanceDailyCount.total).
+    """
+    STUDENTS = 'students'
+    ACTIVITIES = 'activities'
+    
+    name = db.Column(db.String(32), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<StatCounter {self.name}={self.value}>'
+    
+    @classmethod
+    def add(cls, name, delta):
+        """Adjust a counter as part of the current transaction"""
+        if delta:
+            upsert_increment(cls, {'name': name}, 'value', delta)
+    
+    @classmethod
+    def get_many(cls, *names):
+        """Return the values of several counters with a single query"""
+        values = dict(db.session.query(cls.name, cls.value).filter(cls.name.in_(names)))
+        return {name: values.get(name, 0) for name in names}
+
+class AttendanceDailyCount(db.Model):
+    """Per-day, per-activity attendance totals maintained in the same transaction as Attendance writes"""
+    day = db.Column(db.Date, primary_key=True)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activity.id'), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<AttendanceDailyCount {self.day} activity={self.activity_id} count={self.count}>'
+    
+    @classmethod
+    def record(cls, rows, sign=1):
+        """Add (or with sign=-1 remove) attendance rows carrying activity_id and timestamp"""
+        deltas = {}
+        for row in rows:
+            if isinstance(row, dict):
+                key = (row['timestamp'].date(), row['activity_id'])
+            else:
+                key = (row.timestamp.date(), row.activity_id)
+            deltas[key] = deltas.get(key, 0) + sign
+        
+        for (day, activity_id), delta in deltas.items():
+            upsert_increment(cls, {'day': day, 'activity_id': activity_id}, 'count', delta)
+        
+        if sign < 0 and deltas:
+            cls.query.filter(cls.count <= 0).delete(synchronize_session=False)
+    
+    @classmethod
+    def remove_activity(cls, activity_id):
+        """Drop an activity's rollup rows"""
+        cls.query.filter_by(activity_id=activity_id).delete(synchronize_session=False)
+    
+    @classmethod
+    def total(cls):
+        """Return the number of attendance records in both tiers"""
+        return db.session.query(func.coalesce(func.sum(cls.count), 0)).scalar()
+    
+    @classmethod
+    def rebuild(cls):
+        """Recompute all rollups and global counters from the base tables"""
+        cls.query.delete(synchronize_session=False)
+        
+        # Both tiers count; archiving moves rows without changing the totals
+        rows = db.union_all(
+            db.select(Attendance.activity_id, Attendance.timestamp),
+            db.select(AttendanceArchive.activity_id, AttendanceArchive.timestamp)
+        ).subquery()
+        db.session.execute(db.insert(cls).from_select(
+            ['day', 'activity_id', 'count'],
+            db.select(
+                func.date(rows.c.timestamp),
+                rows.c.activity_id,
+                func.count()
+            ).group_by(func.date(rows.c.timestamp), rows.c.activity_id)
+        ))
+        
+        # Archived activities' summaries are recounted from the archive
+        summaries = dict(db.session.query(AttendanceArchive.activity_id, func.count(AttendanceArchive.id))\
+            .group_by(AttendanceArchive.activity_id))
+        for summary in ActivitySummary.query:
+            summary.attendance_count = summaries.get(summary.activity_id, 0)
+        
+        StatCounter.query.delete(synchronize_session=False)
+        counts = {
+            StatCounter.STUDENTS: Student.query.count(),
+            StatCounter.ACTIVITIES: Activity.query.count()
+        }
+        db.session.add_all([StatCounter(name=name, value=value) for name, value in counts.items()])
+        
+        # Cached pages may show the counts that were just corrected
+        bump_versions(db.session, [DataVersion.ATTENDANCE])
         db.session.commit()
-        return True
+        return dict(counts, attendance=cls.total())
+
+# Tables whose writes bump a DataVersion counter; the archive changes with the attendance it holds,
+# and the rollups only change alongside the attendance rows they count
+VERSIONED_MODELS = {
+    Student: DataVersion.STUDENTS,
+    Activity: DataVersion.ACTIVITIES,
+    Attendance: DataVersion.ATTENDANCE,
+    AttendanceArchive: DataVersion.ATTENDANCE,
+    ActivitySummary: DataVersion.ATTENDANCE
+}
+
+# Tables whose inserts show up in their version's rollup total instead of bumping the counter (see DataVersion)
+APPEND_VERSIONED_MODELS = {Attendance}
+
+def bump_versions(session, names):
+    """Bump each named DataVersion once per transaction, however many statements write its tables"""
+    bumped = session.info.setdefault('bumped_versions', set())
+    for name in sorted(set(names) - bumped):
+        bumped.add(name)
+        DataVersion.bump(name)
+
+def track_writes(session, models, inserted=False):
+    """Bump the versions of the written models, or for appended rows just note that the commit changes them"""
+    names = set()
+    for model in models:
+        if inserted and model in APPEND_VERSIONED_MODELS:
+            session.info['appended_rows'] = True
+        elif model in VERSIONED_MODELS:
+            names.add(VERSIONED_MODELS[model])
+    bump_versions(session, names)
+
+# Unit-of-work writes: objects added, changed or deleted in the session
+@event.listens_for(Session, 'before_flush')
+def _bump_flushed_versions(session, flush_context, instances):
+    track_writes(session, {type(obj) for obj in session.new}, inserted=True)
+    track_writes(session, {type(obj) for obj in [*session.dirty, *session.deleted]})
+
+# Bulk writes: insert()/update()/delete() statements and Query.update()/delete() on a mapped table
+@event.listens_for(Session, 'do_orm_execute')
+def _bump_executed_versions(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None:
+            track_writes(orm_execute_state.session, [mapper.class_], inserted=orm_execute_state.is_insert)
+
+@event.listens_for(Session, 'after_commit')
+def _versions_committed(session):
+    if session.info.get('bumped_versions') or session.info.get('appended_rows'):
+        DataVersion.mark_changed()
+
+@event.listens_for(Session, 'after_transaction_end')
+def _versions_transaction_end(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('bumped_versions', None)
+        session.info.pop('appended_rows', None)
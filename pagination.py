@@ -0,0 +1,88 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from flask import current_app, request
+from sqlalchemy import tuple_
+
+class KeysetPage:
+    """One page of results from a keyset (cursor) paginated query"""
+
+    def __init__(self, items, next_cursor, per_page):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.per_page = per_page
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+def encode_cursor(values):
+    """Encode the sort-key values of the last row on a page into an opaque URL-safe cursor"""
+    encoded = []
+    for value in values:
+        if isinstance(value, datetime):
+            encoded.append(['dt', value.isoformat()])
+        elif isinstance(value, date):
+            encoded.append(['d', value.isoformat()])
+        else:
+            encoded.append(['v', value])
+    raw = json.dumps(encoded, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor, length=None):
+    """Decode a cursor created by encode_cursor, returning None if it is missing or malformed
+
+    A cursor is malformed unless it holds length values (when given), each a
+    string, number, date or datetime, so a tampered one restarts the listing
+    instead of reaching the query.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        items = json.loads(raw)
+        if not isinstance(items, list) or (length is not None and len(items) != length):
+            return None
+        values = []
+        for kind, value in items:
+            if kind == 'dt':
+                value = datetime.fromisoformat(value)
+            elif kind == 'd':
+                value = date.fromisoformat(value)
+            elif kind != 'v' or isinstance(value, bool) or not isinstance(value, (str, int, float)):
+                return None
+            values.append(value)
+        return values
+    except (binascii.Error, ValueError, TypeError, RecursionError):
+        return None
+
+def get_per_page():
+    """Return the requested page size, clamped to the configured limits"""
+    per_page = request.args.get('per_page', type=int) or current_app.config['PAGE_SIZE']
+    return max(1, min(per_page, current_app.config['MAX_PAGE_SIZE']))
+
+def keyset_paginate(query, order_columns, cursor=None, per_page=None, descending=False):
+    """Return a KeysetPage of query ordered by order_columns, starting after cursor
+
+    The order columns must form a unique key (end with the primary key) and
+    should be backed by an index so each page is a bounded index range scan.
+    """
+    per_page = per_page or get_per_page()
+
+    values = decode_cursor(cursor, len(order_columns))
+    if values is not None:
+        key = tuple_(*order_columns)
+        query = query.filter(key < tuple_(*values) if descending else key > tuple_(*values))
+
+    ordering = [column.desc() if descending else column.asc() for column in order_columns]
+    rows = query.order_by(*ordering).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, column.key) for column in order_columns])
+
+    return KeysetPage(rows, next_cursor, per_page)
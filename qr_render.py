@@ -0,0 +1,240 @@
+import hashlib
+import multiprocessing
+import os
+import struct
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from flask import current_app
+
+from qr_tokens import encode_token
+from utils import ascii_fold
+
+# Bump when the rendered output changes so stale cache files are not served
+RENDERER_VERSION = 1
+
+IMAGE_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml'
+}
+
+def qr_matrix(data, border=4):
+    """Return the QR module matrix for data (including the quiet zone) as rows of booleans
+
+    Runs in badge worker processes, so it must not depend on the app context.
+    """
+    try:
+        import qrcode
+    except ImportError:
+        raise RuntimeError('Server-side QR rendering requires the qrcode package')
+
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, border=border)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return tuple(tuple(row) for row in qr.get_matrix())
+
+def _dark_runs(row):
+    """Yield (start, length) for each run of dark modules in a matrix row"""
+    start = None
+    for x, dark in enumerate(row):
+        if dark and start is None:
+            start = x
+        elif not dark and start is not None:
+            yield start, x - start
+            start = None
+    if start is not None:
+        yield start, len(row) - start
+
+def render_svg(matrix, scale=8):
+    """Render a QR matrix as a compact SVG document (one path, one rectangle per dark run)"""
+    size = len(matrix)
+    path = ''.join(
+        f'M{x},{y}h{length}v1h-{length}z'
+        for y, row in enumerate(matrix)
+        for x, length in _dark_runs(row)
+    )
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size * scale}" height="{size * scale}" '
+        f'viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/>'
+        f'<path d="{path}" fill="#000"/></svg>'
+    ).encode()
+
+def _png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+def render_png(matrix, scale=8):
+    """Render a QR matrix as a 1-bit grayscale PNG"""
+    size = len(matrix) * scale
+    row_bytes = (size + 7) // 8
+
+    lines = []
+    for row in matrix:
+        # 1 is white in a grayscale PNG; each scanline starts with filter type 0
+        bits = ''.join('0' if dark else '1' for dark in row for _ in range(scale))
+        line = b'\x00' + int(bits.ljust(row_bytes * 8, '1'), 2).to_bytes(row_bytes, 'big')
+        lines.extend([line] * scale)
+
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        _png_chunk(b'IHDR', struct.pack('>IIBBBBB', size, size, 1, 0, 0, 0, 0)),
+        _png_chunk(b'IDAT', zlib.compress(b''.join(lines), 9)),
+        _png_chunk(b'IEND', b'')
+    ])
+
+def cached_qr_image(data, image_format, scale=None):
+    """Return (digest, image bytes) for data, rendering it only if it is not in the disk cache
+
+    Files are content-addressed by a hash of the payload and render options, so
+    identical payloads share one file and a changed payload never hits a stale one.
+    """
+    scale = scale or current_app.config['QR_IMAGE_SCALE']
+    digest = hashlib.sha256(f'{RENDERER_VERSION}:{image_format}:{scale}:{data}'.encode()).hexdigest()
+    directory = os.path.join(current_app.config['QR_CACHE_DIR'], digest[:2])
+    path = os.path.join(directory, f'{digest}.{image_format}')
+
+    try:
+        with open(path, 'rb') as cached:
+            return digest, cached.read()
+    except FileNotFoundError:
+        pass
+
+    matrix = qr_matrix(data)
+    image = render_png(matrix, scale) if image_format == 'png' else render_svg(matrix, scale)
+
+    # Write to a temporary file and rename so concurrent readers never see a partial image
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as temp:
+        temp.write(image)
+    os.replace(temp_path, path)
+
+    return digest, image
+
+# Badge sheet layout in PDF points (A4 portrait, 2 x 4 badges per page)
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+PAGE_MARGIN = 36
+BADGE_COLUMNS, BADGE_ROWS = 2, 4
+BADGE_QR_SIZE = 130
+BADGES_PER_PAGE = BADGE_COLUMNS * BADGE_ROWS
+
+def _pdf_text(text):
+    return ascii_fold(text).replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def _badge_content(index, name, number, matrix):
+    """Return the PDF drawing operators for one badge in slot index of a page"""
+    width = (PAGE_WIDTH - 2 * PAGE_MARGIN) / BADGE_COLUMNS
+    height = (PAGE_HEIGHT - 2 * PAGE_MARGIN) / BADGE_ROWS
+    column, row = index % BADGE_COLUMNS, index // BADGE_COLUMNS
+    left = PAGE_MARGIN + column * width
+    bottom = PAGE_HEIGHT - PAGE_MARGIN - (row + 1) * height
+
+    # Cut guide around the badge
+    ops = [f'0.6 G 0.5 w {left:.2f} {bottom:.2f} {width:.2f} {height:.2f} re S 0 g']
+
+    # QR modules as filled rectangles, one per dark run
+    module = BADGE_QR_SIZE / len(matrix)
+    qr_left = left + (width - BADGE_QR_SIZE) / 2
+    qr_top = bottom + height - 8
+    for y, matrix_row in enumerate(matrix):
+        for x, length in _dark_runs(matrix_row):
+            ops.append(
+                f'{qr_left + x * module:.2f} {qr_top - (y + 1) * module:.2f} '
+                f'{length * module:.2f} {module:.2f} re'
+            )
+    ops.append('f')
+
+    # Name and student number, roughly centred (Helvetica averages about half an em per glyph)
+    name = _pdf_text(name)[:40]
+    number = _pdf_text(number)
+    ops.append(f'BT /F1 12 Tf {left + (width - len(name) * 6) / 2:.2f} {bottom + 30:.2f} Td ({name}) Tj ET')
+    ops.append(f'BT /F1 10 Tf {left + (width - len(number) * 5) / 2:.2f} {bottom + 14:.2f} Td ({number}) Tj ET')
+    return '\n'.join(ops)
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def iter_badges(rows):
+    """Turn (id, student_id, first_name, last_name) rows into (name, number, qr payload) badges"""
+    for row in rows:
+        yield f'{row.first_name} {row.last_name}', row.student_id, encode_token(row.id)
+
+def iter_badge_pdf(badges, workers=1, pages_per_batch=8):
+    """Yield a PDF of printable badge sheets for (name, number, qr payload) tuples
+
+    With workers > 1 (the flask qr badges command), QR matrices for each batch
+    of pages are computed across a pool of spawned processes while earlier
+    pages are already being written; web requests render in their own thread,
+    since forking a threaded server is unsafe. Objects are written in stream
+    order and the page tree, catalog and xref table come last, so memory use
+    does not grow with the number of students.
+    """
+    offset = 0
+    offsets = {}
+    page_ids = []
+    next_id = 4  # 1 = catalog, 2 = page tree, 3 = font
+
+    def pdf_object(number, body):
+        nonlocal offset
+        offsets[number] = offset
+        chunk = f'{number} 0 obj\n'.encode() + body + b'\nendobj\n'
+        offset += len(chunk)
+        return chunk
+
+    header = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+    offset = len(header)
+    yield header + pdf_object(3, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+
+    pool = None
+    if workers > 1:
+        # Spawned workers start clean instead of inheriting the caller's threads and locks
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        for batch in _batched(badges, BADGES_PER_PAGE * pages_per_batch):
+            payloads = [payload for _, _, payload in batch]
+            if pool is not None:
+                matrices = list(pool.map(qr_matrix, payloads, chunksize=max(1, len(payloads) // (workers * 4))))
+            else:
+                matrices = [qr_matrix(payload) for payload in payloads]
+
+            chunks = []
+            for start in range(0, len(batch), BADGES_PER_PAGE):
+                content = '\n'.join(
+                    _badge_content(index, name, number, matrices[start + index])
+                    for index, (name, number, _) in enumerate(batch[start:start + BADGES_PER_PAGE])
+                ).encode()
+                stream = zlib.compress(content)
+
+                content_id, page_id = next_id, next_id + 1
+                next_id += 2
+                chunks.append(pdf_object(
+                    content_id,
+                    f'<< /Length {len(stream)} /Filter /FlateDecode >>\nstream\n'.encode() + stream + b'\nendstream'
+                ))
+                chunks.append(pdf_object(page_id, (
+                    f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+                    f'/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>'
+                ).encode()))
+                page_ids.append(page_id)
+            yield b''.join(chunks)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    kids = ' '.join(f'{page_id} 0 R' for page_id in page_ids)
+    tail = [
+        pdf_object(2, f'<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>'.encode()),
+        pdf_object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+    ]
+
+    xref = [f'xref\n0 {next_id}\n', '0000000000 65535 f \n']
+    xref.extend(f'{offsets[number]:010d} 00000 n \n' for number in range(1, next_id))
+    xref.append(f'trailer\n<< /Size {next_id} /Root 1 0 R >>\nstartxref\n{offset}\n%%EOF\n')
+    yield b''.join(tail) + ''.join(xref).encode()
@@ -0,0 +1,63 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import struct
+from functools import lru_cache
+
+from flask import current_app
+
+# Scanned codes starting with this prefix are signed tokens; anything else is a legacy JSON payload
+TOKEN_PREFIX = 'SQ'
+
+# Packed token body: format version (1 byte) + student primary key (4 bytes)
+_BODY = struct.Struct('>BI')
+
+# Bytes of the truncated HMAC-SHA256 signature appended to the body
+SIGNATURE_LENGTH = 8
+
+@lru_cache(maxsize=4)
+def _signing_key(secret_key):
+    """Derive the QR signing key from the app secret so it is never used directly"""
+    return hmac.new(secret_key.encode(), b'student-qr-token', hashlib.sha256).digest()
+
+def _sign(body):
+    key = _signing_key(str(current_app.secret_key))
+    return hmac.new(key, body, hashlib.sha256).digest()[:SIGNATURE_LENGTH]
+
+def encode_token(student_pk, version=None):
+    """Return the signed QR token for a student primary key
+
+    Tokens are 23 characters from the QR alphanumeric set (uppercase base32),
+    so they render as small, sparse codes that phone cameras decode quickly.
+    """
+    if version is None:
+        version = current_app.config['QR_TOKEN_VERSION']
+    body = _BODY.pack(version, student_pk)
+    encoded = base64.b32encode(body + _sign(body)).decode().rstrip('=')
+    return TOKEN_PREFIX + encoded
+
+def is_token(scanned_data):
+    return isinstance(scanned_data, str) and scanned_data.startswith(TOKEN_PREFIX)
+
+def decode_token(token):
+    """Verify a signed QR token and return the student primary key, raising ValueError if invalid"""
+    encoded = token[len(TOKEN_PREFIX):].strip().upper()
+    try:
+        raw = base64.b32decode(encoded + '=' * (-len(encoded) % 8))
+    except (binascii.Error, ValueError):
+        raise ValueError('Invalid QR code data')
+
+    if len(raw) != _BODY.size + SIGNATURE_LENGTH:
+        raise ValueError('Invalid QR code format')
+
+    body, signature = raw[:_BODY.size], raw[_BODY.size:]
+    if not hmac.compare_digest(signature, _sign(body)):
+        raise ValueError('QR code signature is not valid')
+
+    version, student_pk = _BODY.unpack(body)
+    if version != current_app.config['QR_TOKEN_VERSION']:
+        # Bumping QR_TOKEN_VERSION revokes every previously issued code
+        raise ValueError('QR code has expired, please reissue it')
+
+    return student_pk
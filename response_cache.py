@@ -0,0 +1,230 @@
+import hashlib
+import importlib
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+from flask_wtf.csrf import generate_csrf
+from sqlalchemy import func
+
+from app import db
+from cache import LRUCache
+from models import Activity, DataVersion
+
+# Every counter a cached response may depend on, read together with one query
+VERSIONED_TABLES = (DataVersion.STUDENTS, DataVersion.ACTIVITIES, DataVersion.ATTENDANCE)
+
+class MemoryBackend:
+    """Per-worker LRU of cached responses"""
+
+    def __init__(self, max_size):
+        self._entries = LRUCache(max_size)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self._entries.pop(key)
+            return None
+        return entry[1]
+
+    def set(self, key, value, ttl):
+        self._entries.set(key, (time.monotonic() + ttl, value))
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return {'size': len(self._entries), 'max_size': self._entries.max_size}
+
+class RedisBackend:
+    """Responses shared by all workers through Redis (needs the redis package)
+
+    Errors are logged and treated as misses, so an unreachable Redis only costs the cache.
+    """
+
+    def __init__(self, url, prefix='response:'):
+        import redis
+
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5)
+        self._prefix = prefix
+
+    def get(self, key):
+        try:
+            data = self._client.get(self._prefix + key)
+        except Exception as e:
+            logging.warning(f"Response cache read failed: {str(e)}")
+            return None
+        if data is None:
+            return None
+        content_type, _, body = data.partition(b'\n')
+        return content_type.decode(), body
+
+    def set(self, key, value, ttl):
+        content_type, body = value
+        try:
+            self._client.set(self._prefix + key, content_type.encode() + b'\n' + body, ex=max(int(ttl), 1))
+        except Exception as e:
+            logging.warning(f"Response cache write failed: {str(e)}")
+
+    def clear(self):
+        try:
+            for key in self._client.scan_iter(self._prefix + '*'):
+                self._client.delete(key)
+        except Exception as e:
+            logging.warning(f"Response cache clear failed: {str(e)}")
+
+    def stats(self):
+        return {'size': None, 'max_size': None}
+
+def create_backend(app):
+    """Return the backend named by RESPONSE_CACHE_BACKEND, or None if caching is off
+
+    "memory" keeps a per-worker LRU, a redis:// URL shares entries between workers
+    and "module:factory" calls factory(app) for any object with get/set/clear/stats.
+    """
+    spec = app.config['RESPONSE_CACHE_BACKEND']
+    if not spec or spec == 'none':
+        return None
+    if spec == 'memory':
+        return MemoryBackend(app.config['RESPONSE_CACHE_SIZE'])
+    if spec.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(spec)
+
+    module, _, name = spec.partition(':')
+    return getattr(importlib.import_module(module), name)(app)
+
+class ResponseCache:
+    """Cache of rendered pages and JSON responses, keyed by the data versions of the tables they read
+
+    The versions are read with one query at most once per RESPONSE_CACHE_CHECK_INTERVAL
+    (immediately after this worker commits a change), so a repeat load is answered
+    from the backend, or with 304 Not Modified, without touching the database.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self._versions = None
+        self._checked_at = 0.0
+        self._local_changes = None
+        self._next_change = None  # (activities version, next activity start or end time)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def init_app(self, app):
+        self.backend = create_backend(app)
+
+    def versions(self, tables=VERSIONED_TABLES):
+        """Return the current versions of the given tables, re-read if stale"""
+        now = time.monotonic()
+        interval = current_app.config['RESPONSE_CACHE_CHECK_INTERVAL']
+        if self._versions is None or now - self._checked_at >= interval or self._local_changes != DataVersion.local_changes:
+            with self._lock:
+                if self._versions is None or now - self._checked_at >= interval or self._local_changes != DataVersion.local_changes:
+                    # Taken before the read, so a commit landing during it triggers another
+                    local_changes = DataVersion.local_changes
+                    self._versions = DataVersion.get_many(*VERSIONED_TABLES)
+                    self._checked_at = now
+                    self._local_changes = local_changes
+        versions = self._versions
+        return tuple(versions[table] for table in tables)
+
+    def next_activity_change(self):
+        """Return the next time an activity starts or ends (None if none will), until which activity statuses hold"""
+        now = datetime.utcnow()
+        version = self.versions((DataVersion.ACTIVITIES,))
+        cached = self._next_change
+        if cached is not None and cached[0] == version and (cached[1] is None or now < cached[1]):
+            return cached[1]
+
+        # An activity is ongoing while start_time <= now <= end_time
+        next_start, next_end = db.session.query(
+            db.select(func.min(Activity.start_time)).where(Activity.start_time > now).scalar_subquery(),
+            db.select(func.min(Activity.end_time)).where(Activity.end_time >= now).scalar_subquery()
+        ).one()
+        changes = [moment for moment in (next_start, next_end) if moment is not None]
+        next_change = min(changes) if changes else None
+        self._next_change = (version, next_change)
+        return next_change
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        stats = self.backend.stats() if self.backend is not None else {'size': 0, 'max_size': 0}
+        stats.update({
+            'backend': type(self.backend).__name__ if self.backend is not None else None,
+            'versions': dict(self._versions) if self._versions is not None else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'not_modified': self.not_modified,
+            'hit_rate': (self.hits / lookups) if lookups else 0.0
+        })
+        return stats
+
+    def serve(self, view, args, kwargs, tables, per_user, vary):
+        """Answer a GET request from the cache, calling the view only on a miss"""
+        # Pages carrying flashed messages are one-offs
+        if self.backend is None or request.method != 'GET' or session.get('_flashes'):
+            return view(*args, **kwargs)
+
+        parts = [request.endpoint, request.full_path, self.versions(tables)]
+        if per_user:
+            # HTML pages show the user's name and embed this session's CSRF token
+            generate_csrf()
+            parts += [current_user.get_id(), session.get('csrf_token')]
+        if vary is not None:
+            parts.append(vary())
+        key = hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+
+        # An ETag only stays valid while its entry does, so RESPONSE_CACHE_TTL bounds 304s too
+        entry = self.backend.get(key)
+        if entry is not None and key in request.if_none_match:
+            self.not_modified += 1
+            response = current_app.response_class(status=304)
+            return self._finish(response, key, 'revalidated')
+
+        if entry is not None:
+            self.hits += 1
+            content_type, body = entry
+            return self._finish(current_app.response_class(body, content_type=content_type), key, 'hit')
+
+        self.misses += 1
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200 or response.is_streamed:
+            return response
+        self.backend.set(key, (response.content_type, response.get_data()), current_app.config['RESPONSE_CACHE_TTL'])
+        return self._finish(response, key, 'miss')
+
+    def _finish(self, response, key, outcome):
+        response.set_etag(key)
+        # Browsers may keep the page but must revalidate it, which costs a 304 at most
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.headers['X-Cache'] = outcome
+        return response
+
+response_cache = ResponseCache()
+
+def cached_response(*tables, per_user=True, vary=None):
+    """Serve a GET view from the response cache while the versions of the given tables are unchanged
+
+    per_user keys HTML pages by user and session; vary() returns anything else the
+    response depends on, such as the time the activity statuses it shows next change.
+    Place it under @login_required so access checks still run on every request.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            return response_cache.serve(view, args, kwargs, tables, per_user, vary)
+        return wrapper
+    return decorator
@@ -1,18 +1,289 @@
+import hmac
 import json
 import logging
-from datetime import datetime, timedelta
-from flask import render_template, url_for, flash, redirect, request, jsonify, abort
+from datetime import datetime, timedelta, timezone
+from flask import render_template, url_for, flash, redirect, request, jsonify, abort, Response, stream_with_context
 from flask_login import login_user, logout_user, current_user, login_required
 from werkzeug.security import check_password_hash, generate_password_hash
 from sqlalchemy import func
 
 from app import db
-from models import User, Student, Activity, Attendance
+from models import (
+    User, Student, Activity, Attendance, DataVersion, ScanReceipt,
+    StatCounter, AttendanceDailyCount
+)
 from forms import (
-    LoginForm, RegistrationForm, StudentForm, 
+    LoginForm, RegistrationForm, StudentForm, StudentImportForm,
     ActivityForm, AttendanceSearchForm, AttendanceScanForm
 )
-from utils import admin_required, generate_qr_code_data
+from analytics import analytics_cache
+from archive import archive_attendance, attendance_rows, reaches_archive
+from cache import roster_cache, user_cache
+from exports import iter_csv, iter_xlsx
+from imports import import_students, read_student_csv
+from live_feed import feed_events, live_feed
+from logging_config import log_event
+from metrics import metrics
+from pagination import keyset_paginate
+from qr_render import IMAGE_TYPES, cached_qr_image, iter_badge_pdf, iter_badges
+from response_cache import cached_response, response_cache
+from search import MAX_SEARCH_LIMIT, prefix_index, search_students
+from write_buffer import attendance_writer, record_attendance, record_attendance_many
+from utils import admin_required, generate_qr_code_data, parse_qr_payload
+
+def parse_capture_time(value, earliest):
+    """Parse a client capture timestamp into naive UTC, defaulting to now outside [earliest, now]"""
+    now = datetime.utcnow()
+    if not isinstance(value, str):
+        return now
+    
+    try:
+        captured = datetime.fromisoformat(value)
+    except ValueError:
+        return now
+    
+    if captured.tzinfo is not None:
+        captured = captured.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    # Never trust a client clock that runs ahead of the server or predates the activity
+    if not earliest <= captured <= now:
+        return now
+    return captured
+
+def parse_scans(payloads):
+    """Parse scanned payloads into student primary keys, or the ValueError saying why each is invalid"""
+    parsed = []
+    for scanned_data in payloads:
+        try:
+            parsed.append(parse_qr_payload(scanned_data))
+        except ValueError as e:
+            parsed.append(e)
+    return parsed
+
+def earliest_captures(parsed, students, timestamps):
+    """Return the earliest capture time of each scanned student, which is the one that gets recorded"""
+    capture_times = {}
+    for item, captured in zip(parsed, timestamps):
+        if item in students and (item not in capture_times or captured < capture_times[item]):
+            capture_times[item] = captured
+    return capture_times
+
+def scan_results(activity_id, parsed, students, recorded_ids):
+    """Build per-item results in submission order; repeats within the batch count as duplicates"""
+    results = []
+    reported = set()
+    for item in parsed:
+        if isinstance(item, ValueError):
+            results.append({'success': False, 'status': 'invalid', 'message': str(item)})
+            continue
+        
+        student = students.get(item)
+        if student is None:
+            results.append({'success': False, 'status': 'not_found', 'message': 'Student not found'})
+            continue
+        
+        student_info = {
+            'id': student.id,
+            'name': student.name,
+            'student_id': student.student_id
+        }
+        if item in recorded_ids and item not in reported:
+            reported.add(item)
+            results.append({
+                'success': True,
+                'status': 'recorded',
+                'message': f'Attendance recorded for {student.name}',
+                'student': student_info
+            })
+        else:
+            results.append({
+                'success': False,
+                'status': 'duplicate',
+                'message': f'Attendance already recorded for {student.name}',
+                'student': student_info
+            })
+    
+    for result in results:
+        log_event('scan', 'Scan for activity %s: %s', activity_id, result['status'],
+                  activity_id=activity_id, status=result['status'], student_id=result.get('student', {}).get('id'))
+    return results
+
+def record_scans(activity, payloads, timestamps=None):
+    """Record attendance for scanned payloads (in the request's transaction unless writes are buffered), returning per-item results and the new count"""
+    # Parse every payload up front so invalid codes never reach the database
+    parsed = parse_scans(payloads)
+    
+    # Resolve all scanned students from the cached roster
+    students = roster_cache.get_many(item for item in parsed if isinstance(item, int))
+    
+    recorded_ids = record_attendance_many(
+        student_ids=students.keys(),
+        activity_id=activity.id,
+        user_id=current_user.id,
+        timestamps=earliest_captures(parsed, students, timestamps) if timestamps is not None else None
+    )
+    
+    return scan_results(activity.id, parsed, students, recorded_ids), len(recorded_ids)
+
+def sync_error(payload, limit):
+    """Return why an offline sync submission is malformed, or None if it can be processed"""
+    if not isinstance(payload, dict) or not payload.get('activity_id') or not isinstance(payload.get('scans'), list):
+        return 'Invalid sync submission'
+    if len(payload['scans']) > limit:
+        return f'Sync exceeds the limit of {limit} scans'
+    for scan in payload['scans']:
+        key = scan.get('key') if isinstance(scan, dict) else None
+        if not isinstance(key, str) or not 0 < len(key) <= ScanReceipt.KEY_LENGTH:
+            return 'Every scan needs an idempotency key'
+    return None
+
+def pending_sync_scans(scans, receipts):
+    """Return the scans of a sync still to be processed: the first of each key without a receipt"""
+    pending = {}
+    for scan in scans:
+        if scan['key'] not in receipts and scan['key'] not in pending:
+            pending[scan['key']] = scan
+    return list(pending.values())
+
+def sync_results(scans, receipts, new_results, students):
+    """Answer every scan of a sync in order, replaying receipts with their student's roster entry from students"""
+    response = []
+    for scan in scans:
+        key = scan['key']
+        if key in receipts:
+            receipt = receipts[key]
+            result = dict(receipt.to_result(students.get(receipt.student_id)), replayed=True)
+        else:
+            result = dict(new_results[key], replayed=False)
+        result['key'] = key
+        response.append(result)
+    return response
+
+def student_page():
+    """Return the requested page of students, keyset paginated by name"""
+    return keyset_paginate(
+        Student.query,
+        [Student.last_name, Student.first_name, Student.id],
+        cursor=request.args.get('cursor')
+    )
+
+def badge_query(prefix=None, since=None):
+    """Return the students to print badges for, optionally filtered by student ID prefix and registration date"""
+    query = db.session.query(Student.id, Student.student_id, Student.first_name, Student.last_name)
+    if prefix:
+        query = query.filter(Student.student_id.startswith(prefix, autoescape=True))
+    if since:
+        query = query.filter(Student.created_at >= since)
+    return query.order_by(Student.last_name, Student.first_name, Student.id)
+
+def activity_page():
+    """Return the requested page of activities, newest first"""
+    return keyset_paginate(
+        Activity.query,
+        [Activity.start_time, Activity.id],
+        cursor=request.args.get('cursor'),
+        descending=True
+    )
+
+def attendance_search_form():
+    """Bind the attendance search form to the query string (GET) or the posted form (POST)"""
+    if request.method == 'POST':
+        form = AttendanceSearchForm()
+    else:
+        form = AttendanceSearchForm(formdata=request.args, meta={'csrf': False})
+    
+    if not form.validate():
+        # Ignore invalid filters rather than failing the whole report
+        form.activity_id.data = form.student_id.data = None
+        form.date_from.data = form.date_to.data = None
+    return form
+
+def report_rows(form):
+    """Return the attendance rows a report reads: the archive is only included when the filters reach it"""
+    return attendance_rows(reaches_archive(form.date_from.data, form.activity_id.data))
+
+def filter_attendance(query, form, rows):
+    """Apply the attendance search form's filters to a query over attendance rows (see report_rows)"""
+    if form.activity_id.data:
+        query = query.filter(rows.c.activity_id == form.activity_id.data)
+    
+    if form.student_id.data:
+        query = query.filter(rows.c.student_id.in_(
+            db.select(Student.id).where(Student.student_id == form.student_id.data)
+        ))
+    
+    if form.date_from.data:
+        query = query.filter(rows.c.timestamp >= form.date_from.data)
+    
+    if form.date_to.data:
+        # Add 1 day to include the end date fully
+        end_date = form.date_to.data + timedelta(days=1)
+        query = query.filter(rows.c.timestamp < end_date)
+    
+    return query
+
+def attendance_report_query(form, rows):
+    """Build the column-only attendance report query with the search form's filters applied"""
+    query = db.session.query(
+        rows.c.id.label('id'),
+        rows.c.timestamp.label('timestamp'),
+        Student.student_id.label('student_number'),
+        Student.first_name.label('first_name'),
+        Student.last_name.label('last_name'),
+        Activity.name.label('activity_name'),
+        User.username.label('scanned_by')
+    ).select_from(rows)\
+        .join(Student, rows.c.student_id == Student.id)\
+        .join(Activity, rows.c.activity_id == Activity.id)\
+        .join(User, rows.c.scanned_by == User.id)
+    return filter_attendance(query, form, rows)
+
+def attendance_report_page(form, rows):
+    """Return the requested page of the attendance report, newest first"""
+    return keyset_paginate(
+        attendance_report_query(form, rows),
+        [rows.c.timestamp, rows.c.id],
+        cursor=request.args.get('cursor'),
+        descending=True
+    )
+
+def dashboard_state():
+    """Return what the dashboard shows besides the data: activity statuses and the chart's last seven days"""
+    return response_cache.next_activity_change(), datetime.utcnow().date()
+
+# Data versions the cached pages and APIs depend on
+ALL_TABLES = (DataVersion.STUDENTS, DataVersion.ACTIVITIES, DataVersion.ATTENDANCE)
+
+def student_to_dict(student):
+    return {
+        'id': student.id,
+        'student_id': student.student_id,
+        'first_name': student.first_name,
+        'last_name': student.last_name,
+        'email': student.email,
+        'phone': student.phone
+    }
+
+def activity_to_dict(activity):
+    return {
+        'id': activity.id,
+        'name': activity.name,
+        'location': activity.location,
+        'start_time': activity.start_time.isoformat(),
+        'end_time': activity.end_time.isoformat(),
+        'is_active': activity.is_active,
+        'is_ongoing': activity.is_ongoing()
+    }
+
+def attendance_row_to_dict(row):
+    return {
+        'id': row.id,
+        'timestamp': row.timestamp.isoformat(),
+        'student_id': row.student_number,
+        'student_name': f"{row.first_name} {row.last_name}",
+        'activity': row.activity_name,
+        'scanned_by': row.scanned_by
+    }
 
 def register_routes(app):
     
@@ -61,6 +332,7 @@ def register_routes(app):
             )
             db.session.add(user)
             db.session.commit()
+            user_cache.invalidate(user.id)
             flash(f'Account created for {form.username.data}!', 'success')
             return redirect(url_for('dashboard'))
         
@@ -68,12 +340,14 @@ def register_routes(app):
     
     @app.route('/dashboard')
     @login_required
+    @cached_response(*ALL_TABLES, vary=dashboard_state)
     def dashboard():
         """Main dashboard with summary statistics"""
-        # Get counts for dashboard
-        student_count = Student.query.count()
-        activity_count = Activity.query.count()
-        attendance_count = Attendance.query.count()
+        # Get counts for dashboard from the maintained counters
+        counts = StatCounter.get_many(StatCounter.STUDENTS, StatCounter.ACTIVITIES)
+        student_count = counts[StatCounter.STUDENTS]
+        activity_count = counts[StatCounter.ACTIVITIES]
+        attendance_count = AttendanceDailyCount.total()
         
         # Get recent activities
         recent_activities = Activity.query.order_by(Activity.start_time.desc()).limit(5).all()
@@ -86,14 +360,14 @@ def register_routes(app):
             Activity.is_active == True
         ).all()
         
-        # Get attendance data for chart (last 7 days)
-        last_week = now - timedelta(days=7)
+        # Get attendance data for chart (last 7 days) from the daily rollup
+        last_week = (now - timedelta(days=7)).date()
         daily_attendance = db.session.query(
-            func.date(Attendance.timestamp).label('date'),
-            func.count(Attendance.id).label('count')
-        ).filter(Attendance.timestamp >= last_week).group_by(
-            func.date(Attendance.timestamp)
-        ).all()
+            AttendanceDailyCount.day.label('date'),
+            func.sum(AttendanceDailyCount.count).label('count')
+        ).filter(AttendanceDailyCount.day >= last_week).group_by(
+            AttendanceDailyCount.day
+        ).order_by(AttendanceDailyCount.day).all()
         
         # Format for JS chart
         attendance_dates = [str(record.date) for record in daily_attendance]
@@ -105,6 +379,7 @@ def register_routes(app):
                               attendance_count=attendance_count,
                               recent_activities=recent_activities,
                               ongoing_activities=ongoing_activities,
+                              now=now,
                               attendance_dates=json.dumps(attendance_dates),
                               attendance_counts=json.dumps(attendance_counts))
     
@@ -112,9 +387,46 @@ def register_routes(app):
     @app.route('/students')
     @login_required
     def students_list():
-        """List all students"""
-        students = Student.query.order_by(Student.last_name, Student.first_name).all()
-        return render_template('students/index.html', students=students)
+        """List students one page at a time"""
+        page = student_page()
+        student_count = StatCounter.get_many(StatCounter.STUDENTS)[StatCounter.STUDENTS]
+        return render_template('students/index.html',
+                              students=page.items,
+                              page=page,
+                              student_count=student_count)
+    
+    @app.route('/api/students')
+    @login_required
+    def api_students_list():
+        """API endpoint listing students one page at a time"""
+        page = student_page()
+        return jsonify({
+            'success': True,
+            'students': [student_to_dict(student) for student in page.items],
+            'next_cursor': page.next_cursor
+        })
+    
+    @app.route('/api/students/search')
+    @login_required
+    def api_student_search():
+        """API endpoint for student typeahead: prefix and fuzzy matches on student ID, name and email"""
+        query = request.args.get('q', '').strip()
+        limit = min(request.args.get('limit', app.config['SEARCH_LIMIT'], type=int), MAX_SEARCH_LIMIT)
+        backend, students = search_students(query, max(limit, 1))
+        return jsonify({
+            'success': True,
+            'backend': backend,
+            'students': [
+                {
+                    'id': student.id,
+                    'student_id': student.student_id,
+                    'name': student.full_name(),
+                    'email': student.email,
+                    'url': url_for('view_student', id=student.id)
+                }
+                for student in students
+            ]
+        })
     
     @app.route('/students/add', methods=['GET', 'POST'])
     @login_required
@@ -130,16 +442,38 @@ def register_routes(app):
                 phone=form.phone.data,
                 date_of_birth=form.date_of_birth.data
             )
-            # Generate and store QR data
-            student.save_qr_data()
-            
             db.session.add(student)
+            
+            # Generate and store QR data (the token is derived from the new primary key)
+            student.save_qr_data()
+            StatCounter.add(StatCounter.STUDENTS, 1)
             db.session.commit()
+            roster_cache.invalidate(student.id)
+            prefix_index.invalidate()
             flash(f'Student {student.full_name()} has been added!', 'success')
             return redirect(url_for('students_list'))
         
         return render_template('students/add.html', form=form)
     
+    @app.route('/students/import', methods=['GET', 'POST'])
+    @login_required
+    @admin_required
+    def import_students_csv():
+        """Bulk import students from an uploaded CSV file (admin only)"""
+        form = StudentImportForm()
+        report = None
+        
+        if form.validate_on_submit():
+            try:
+                report = import_students(read_student_csv(form.file.data.stream))
+            except ValueError as e:
+                flash(str(e), 'danger')
+            else:
+                category = 'success' if not report.rejected else 'warning'
+                flash(f'Imported {report.imported} students, {report.rejected} rows rejected.', category)
+        
+        return render_template('students/import.html', form=form, report=report)
+    
     @app.route('/students/<int:id>/edit', methods=['GET', 'POST'])
     @login_required
     def edit_student(id):
@@ -155,10 +489,12 @@ def register_routes(app):
             student.phone = form.phone.data
             student.date_of_birth = form.date_of_birth.data
             
-            # Update QR data
+            # Upgrade legacy QR data to a signed token
             student.save_qr_data()
             
             db.session.commit()
+            roster_cache.invalidate(student.id)
+            prefix_index.invalidate()
             flash(f'Student {student.full_name()} has been updated!', 'success')
             return redirect(url_for('students_list'))
         
@@ -179,15 +515,20 @@ def register_routes(app):
         """View a student's profile and QR code"""
         student = Student.query.get_or_404(id)
         
-        # Get student's attendance history
-        attendance = Attendance.query\
-            .filter_by(student_id=student.id)\
-            .join(Activity, Attendance.activity_id == Activity.id)\
-            .order_by(Attendance.timestamp.desc())\
+        # Get student's attendance history from both tiers once anything has been archived
+        rows = attendance_rows(reaches_archive())
+        attendance = db.session.query(
+            rows.c.timestamp.label('timestamp'),
+            Activity.name.label('activity_name'),
+            Activity.location.label('activity_location')
+        ).select_from(rows)\
+            .join(Activity, rows.c.activity_id == Activity.id)\
+            .filter(rows.c.student_id == student.id)\
+            .order_by(rows.c.timestamp.desc(), rows.c.id.desc())\
             .all()
         
-        # Generate QR code data for display
-        qr_data = student.qr_data
+        # Signed tokens are derived from the primary key, so nothing has to be stored on view
+        qr_data = student.generate_qr_data()
         
         return render_template('students/view.html', 
                               student=student, 
@@ -203,10 +544,13 @@ def register_routes(app):
         
         try:
             # Delete associated attendance records first
-            Attendance.query.filter_by(student_id=student.id).delete()
+            Attendance.delete_for_student(student.id)
             
             db.session.delete(student)
+            StatCounter.add(StatCounter.STUDENTS, -1)
             db.session.commit()
+            roster_cache.invalidate(id)
+            prefix_index.invalidate()
             flash(f'Student {student.full_name()} has been deleted.', 'success')
         except Exception as e:
             db.session.rollback()
@@ -218,10 +562,50 @@ def register_routes(app):
     # Activity routes
     @app.route('/activities')
     @login_required
+    @cached_response(*ALL_TABLES, vary=response_cache.next_activity_change)
     def activities_list():
-        """List all activities"""
-        activities = Activity.query.order_by(Activity.start_time.desc()).all()
-        return render_template('activities/index.html', activities=activities)
+        """List activities one page at a time, newest first"""
+        page = activity_page()
+        activity_count = StatCounter.get_many(StatCounter.ACTIVITIES)[StatCounter.ACTIVITIES]
+        stats = Activity.attendance_stats(activity.id for activity in page.items)
+        return render_template('activities/index.html',
+                              activities=page.items,
+                              page=page,
+                              stats=stats,
+                              activity_count=activity_count,
+                              now=datetime.utcnow())
+    
+    @app.route('/api/activities')
+    @login_required
+    @cached_response(*ALL_TABLES, per_user=False, vary=response_cache.next_activity_change)
+    def api_activities_list():
+        """API endpoint listing activities one page at a time"""
+        page = activity_page()
+        stats = Activity.attendance_stats(activity.id for activity in page.items)
+        return jsonify({
+            'success': True,
+            'activities': [
+                dict(activity_to_dict(activity), attendance=stats[activity.id])
+                for activity in page.items
+            ],
+            'next_cursor': page.next_cursor
+        })
+    
+    @app.route('/api/activities/stats')
+    @login_required
+    @cached_response(DataVersion.STUDENTS, DataVersion.ATTENDANCE, per_user=False)
+    def api_activity_stats():
+        """API endpoint returning attendance counts and rates for the given activity ids"""
+        activity_ids = request.args.getlist('id', type=int)
+        limit = app.config['MAX_PAGE_SIZE']
+        if len(activity_ids) > limit:
+            return jsonify({'success': False, 'message': f'At most {limit} activities per request'}), 400
+        
+        stats = Activity.attendance_stats(activity_ids)
+        return jsonify({
+            'success': True,
+            'stats': {str(activity_id): value for activity_id, value in stats.items()}
+        })
     
     @app.route('/activities/add', methods=['GET', 'POST'])
     @login_required
@@ -239,6 +623,7 @@ def register_routes(app):
                 created_by=current_user.id
             )
             db.session.add(activity)
+            StatCounter.add(StatCounter.ACTIVITIES, 1)
             db.session.commit()
             flash(f'Activity "{activity.name}" has been added!', 'success')
             return redirect(url_for('activities_list'))
@@ -284,9 +669,11 @@ def register_routes(app):
         
         try:
             # Delete associated attendance records first
-            Attendance.query.filter_by(activity_id=activity.id).delete()
+            Attendance.delete_for_activity(activity.id)
+            ScanReceipt.query.filter_by(activity_id=activity.id).delete()
             
             db.session.delete(activity)
+            StatCounter.add(StatCounter.ACTIVITIES, -1)
             db.session.commit()
             flash(f'Activity "{activity.name}" has been deleted.', 'success')
         except Exception as e:
@@ -296,6 +683,22 @@ def register_routes(app):
         
         return redirect(url_for('activities_list'))
     
+    @app.route('/activities/archive', methods=['POST'])
+    @login_required
+    @admin_required
+    def archive_activities():
+        """Move the attendance of long-finished activities to the archive (admin only)"""
+        try:
+            result = archive_attendance()
+            flash(f"Archived {result['rows']} attendance records of {result['activities']} activities "
+                  f"that ended before {result['cutoff']:%d %b, %Y}.", 'success')
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error archiving attendance: {str(e)}', 'danger')
+            logging.error(f"Error archiving attendance: {str(e)}")
+        
+        return redirect(url_for('activities_list'))
+    
     # Attendance routes
     @app.route('/attendance/take/<int:activity_id>')
     @login_required
@@ -311,7 +714,46 @@ def register_routes(app):
         form = AttendanceScanForm()
         form.activity_id.data = activity_id
         
-        return render_template('attendance/take.html', activity=activity, form=form)
+        # Only the most recent scans are listed; the total comes from the grouped stats query
+        stats = Activity.attendance_stats([activity.id])[activity.id]
+        recent_records = db.session.query(
+            Attendance.id.label('id'),
+            Student.id.label('student_pk'),
+            Student.student_id.label('student_number'),
+            Student.first_name.label('first_name'),
+            Student.last_name.label('last_name')
+        ).join(Student, Attendance.student_id == Student.id)\
+            .filter(Attendance.activity_id == activity.id)\
+            .order_by(Attendance.id.desc())\
+            .limit(app.config['PAGE_SIZE'])\
+            .all()
+        
+        # The live feed continues from the newest record rendered here; it is streamed when the
+        # ASGI app serves the page (holding no thread while idle) and polled otherwise
+        last_id = recent_records[0].id if recent_records else 0
+        live_stream = 'asgi.scope' in request.environ
+        
+        return render_template('attendance/take.html',
+                             activity=activity,
+                             form=form,
+                             stats=stats,
+                             recent_records=recent_records,
+                             last_id=last_id,
+                             live_stream=live_stream)
+    
+    @app.route('/attendance/feed/<int:activity_id>')
+    @login_required
+    def attendance_feed(activity_id):
+        """New attendance for an activity after the ?after= cursor, polled by take pages (the ASGI app streams it instead)"""
+        activity = Activity.query.get_or_404(activity_id)
+        after = request.args.get('after', 0, type=int)
+        
+        events = feed_events(activity.id, after, app.config['LIVE_FEED_BATCH_SIZE'])
+        return jsonify({
+            'success': True,
+            'events': events,
+            'cursor': events[-1]['id'] if events else after
+        })
     
     @app.route('/attendance/scan', methods=['POST'])
     @login_required
@@ -323,133 +765,465 @@ def register_routes(app):
             activity_id = form.activity_id.data
             scanned_data = form.scanned_data.data
             
+            # Verify the QR data before running any query, so forged codes cost nothing
+            try:
+                student_id = parse_qr_payload(scanned_data)
+            except ValueError as e:
+                return jsonify({'success': False, 'message': str(e)})
+            
             # Verify the activity exists
             activity = Activity.query.get_or_404(activity_id)
             
-            # Parse the QR data
             try:
-                data = json.loads(scanned_data)
-                # Đảm bảo data là một dictionary và có khóa 'id'
-                if not isinstance(data, dict) or 'id' not in data:
-                    return jsonify({'success': False, 'message': 'Invalid QR code format'})
-                
-                student_id = data.get('id')
-                if student_id is None:
-                    return jsonify({'success': False, 'message': 'Student ID missing in QR code'})
-                
-                # Verify the student exists
-                student = Student.query.get(student_id)
+                # Verify the student exists using the cached roster
+                student = roster_cache.get(student_id)
                 if not student:
                     return jsonify({'success': False, 'message': 'Student not found'})
                 
-                # Record attendance
-                success = Attendance.record_attendance(
+                # Record attendance (directly, or through the group-commit writer)
+                success = record_attendance(
                     student_id=student.id,
                     activity_id=activity.id,
                     user_id=current_user.id
                 )
+                status = 'recorded' if success else 'duplicate'
+                log_event('scan', 'Scan for activity %s: %s', activity.id, status,
+                          activity_id=activity.id, status=status, student_id=student.id)
                 
                 if success:
                     return jsonify({
                         'success': True, 
-                        'message': f'Attendance recorded for {student.full_name()}',
+                        'message': f'Attendance recorded for {student.name}',
                         'student': {
                             'id': student.id,
-                            'name': student.full_name(),
+                            'name': student.name,
                             'student_id': student.student_id
                         }
                     })
                 else:
                     return jsonify({
                         'success': False, 
-                        'message': f'Attendance already recorded for {student.full_name()}'
+                        'message': f'Attendance already recorded for {student.name}'
                     })
                 
-            except json.JSONDecodeError:
-                return jsonify({'success': False, 'message': 'Invalid QR code data'})
             except Exception as e:
                 logging.error(f"Error recording attendance: {str(e)}")
                 return jsonify({'success': False, 'message': f'Error: {str(e)}'})
         
         return jsonify({'success': False, 'message': 'Invalid form submission'})
     
+    @app.route('/attendance/scan/batch', methods=['POST'])
+    @login_required
+    def scan_attendance_batch():
+        """Record attendance for a batch of QR scans from one scanning station"""
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict):
+            return jsonify({'success': False, 'message': 'Invalid batch submission'}), 400
+        activity_id = payload.get('activity_id')
+        scans = payload.get('scans')
+        
+        if not activity_id or not isinstance(scans, list):
+            return jsonify({'success': False, 'message': 'Invalid batch submission'}), 400
+        
+        limit = app.config['SCAN_BATCH_LIMIT']
+        if len(scans) > limit:
+            return jsonify({'success': False, 'message': f'Batch exceeds the limit of {limit} scans'}), 400
+        
+        activity = Activity.query.get_or_404(activity_id)
+        
+        try:
+            results, recorded = record_scans(activity, scans)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error recording attendance batch: {str(e)}")
+            return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+        
+        for index, result in enumerate(results):
+            result['index'] = index
+        
+        return jsonify({
+            'success': True,
+            'activity_id': activity.id,
+            'recorded': recorded,
+            'results': results
+        })
+    
+    @app.route('/attendance/scan/sync', methods=['POST'])
+    @login_required
+    def sync_attendance_scans():
+        """Record scans buffered offline by a scanner, processing each idempotency key at most once"""
+        payload = request.get_json(silent=True)
+        error = sync_error(payload, app.config['SCAN_BATCH_LIMIT'])
+        if error is not None:
+            return jsonify({'success': False, 'message': error}), 400
+        scans = payload['scans']
+        
+        activity = Activity.query.get_or_404(payload['activity_id'])
+        
+        try:
+            # Keys seen before (e.g. a retry after a lost response) are answered from their receipts
+            receipts = ScanReceipt.find(scan['key'] for scan in scans)
+            
+            pending_scans = pending_sync_scans(scans, receipts)
+            earliest = activity.start_time - timedelta(seconds=app.config['SCAN_CAPTURE_SLACK'])
+            results, recorded = record_scans(
+                activity,
+                [scan.get('data') for scan in pending_scans],
+                timestamps=[parse_capture_time(scan.get('captured_at'), earliest) for scan in pending_scans]
+            )
+            
+            new_results = {scan['key']: result for scan, result in zip(pending_scans, results)}
+            stored = ScanReceipt.add_many(activity.id, new_results)
+            
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error syncing attendance scans: {str(e)}")
+            return jsonify({'success': False, 'message': f'Error: {str(e)}'}), 500
+        
+        # A retry that raced its original answers with the receipt the original stored
+        raced = set(new_results) - stored
+        if raced:
+            receipts.update(ScanReceipt.find(raced))
+        
+        # Replayed results show the student like fresh ones do
+        students = roster_cache.get_many(
+            receipt.student_id for receipt in receipts.values() if receipt.student_id is not None
+        )
+        
+        return jsonify({
+            'success': True,
+            'activity_id': activity.id,
+            'recorded': recorded,
+            'results': sync_results(scans, receipts, new_results, students)
+        })
+    
     @app.route('/attendance/view/<int:activity_id>')
     @login_required
+    @cached_response(*ALL_TABLES, vary=response_cache.next_activity_change)
     def view_attendance(activity_id):
         """View attendance for a specific activity"""
         activity = Activity.query.get_or_404(activity_id)
         
-        # Get attendance records
-        attendance_records = Attendance.query\
-            .filter_by(activity_id=activity_id)\
-            .join(Student, Attendance.student_id == Student.id)\
-            .order_by(Attendance.timestamp.asc())\
-            .all()
+        # An archived activity's attendance is read from both tiers
+        rows = attendance_rows(reaches_archive(activity_id=activity_id))
+        
+        # Present students, in recording order
+        present_page = keyset_paginate(
+            db.session.query(
+                rows.c.id.label('id'),
+                rows.c.timestamp.label('timestamp'),
+                Student.student_id.label('student_number'),
+                Student.first_name.label('first_name'),
+                Student.last_name.label('last_name'),
+                User.username.label('scanned_by')
+            ).select_from(rows)
+                .join(Student, rows.c.student_id == Student.id)
+                .join(User, rows.c.scanned_by == User.id)
+                .filter(rows.c.activity_id == activity_id),
+            [rows.c.timestamp, rows.c.id],
+            cursor=request.args.get('present_cursor')
+        )
+        
+        # Absent students via an anti-join, so the roster is never compared in Python
+        absent_page = keyset_paginate(
+            Student.query.filter(~db.exists().where(
+                rows.c.student_id == Student.id,
+                rows.c.activity_id == activity_id
+            )),
+            [Student.last_name, Student.first_name, Student.id],
+            cursor=request.args.get('absent_cursor')
+        )
         
-        # Calculate attendance statistics
-        total_students = Student.query.count()
-        attended_count = len(attendance_records)
+        # Calculate attendance statistics with aggregate queries
+        total_students = StatCounter.get_many(StatCounter.STUDENTS)[StatCounter.STUDENTS]
+        attended_count = db.session.query(func.count(rows.c.id))\
+            .filter(rows.c.activity_id == activity_id).scalar()
         attendance_rate = (attended_count / total_students * 100) if total_students > 0 else 0
         
         return render_template('attendance/view.html',
                              activity=activity,
-                             attendance_records=attendance_records,
+                             attendance_records=present_page.items,
+                             present_page=present_page,
+                             absent_students=absent_page.items,
+                             absent_page=absent_page,
                              total_students=total_students,
                              attended_count=attended_count,
+                             absent_count=max(total_students - attended_count, 0),
                              attendance_rate=attendance_rate)
     
     @app.route('/attendance/report', methods=['GET', 'POST'])
     @login_required
+    @cached_response(*ALL_TABLES)
     def attendance_report():
-        """Generate attendance reports with filters"""
-        form = AttendanceSearchForm()
-        
-        # Default to all attendance if no filters
-        query = Attendance.query\
-            .join(Student, Attendance.student_id == Student.id)\
-            .join(Activity, Attendance.activity_id == Activity.id)
+        """Generate attendance reports with filters, one page at a time"""
+        form = attendance_search_form()
+        rows = report_rows(form)
+        page = attendance_report_page(form, rows)
         
-        if form.validate_on_submit():
-            # Apply filters
+        # Chart of the whole filtered result by day; the daily rollup covers both tiers
+        # and answers it unless the report is for one student
+        if form.student_id.data:
+            day = func.date(rows.c.timestamp)
+            daily_counts = filter_attendance(
+                db.session.query(
+                    day.label('date'),
+                    func.count(rows.c.id).label('count')
+                ).select_from(rows),
+                form,
+                rows
+            ).group_by(day).order_by(day).all()
+        else:
+            daily_counts = db.session.query(
+                AttendanceDailyCount.day.label('date'),
+                func.sum(AttendanceDailyCount.count).label('count')
+            )
             if form.activity_id.data:
-                query = query.filter(Attendance.activity_id == form.activity_id.data)
-            
-            if form.student_id.data:
-                query = query.join(Student).filter(Student.student_id == form.student_id.data)
-            
+                daily_counts = daily_counts.filter(AttendanceDailyCount.activity_id == form.activity_id.data)
             if form.date_from.data:
-                query = query.filter(Attendance.timestamp >= form.date_from.data)
-            
+                daily_counts = daily_counts.filter(AttendanceDailyCount.day >= form.date_from.data)
             if form.date_to.data:
-                # Add 1 day to include the end date fully
-                end_date = form.date_to.data + timedelta(days=1)
-                query = query.filter(Attendance.timestamp < end_date)
-        
-        # Execute query with order
-        attendance_records = query.order_by(Attendance.timestamp.desc()).all()
+                daily_counts = daily_counts.filter(AttendanceDailyCount.day <= form.date_to.data)
+            daily_counts = daily_counts.group_by(AttendanceDailyCount.day).order_by(AttendanceDailyCount.day).all()
         
         # Get activities for filter dropdown
         activities = Activity.query.order_by(Activity.name).all()
         
         return render_template('attendance/report.html',
                              form=form,
-                             attendance_records=attendance_records,
+                             attendance_records=page.items,
+                             page=page,
+                             total_records=sum(record.count for record in daily_counts),
+                             attendance_dates=json.dumps([str(record.date) for record in daily_counts]),
+                             attendance_counts=json.dumps([record.count for record in daily_counts]),
                              activities=activities)
     
+    @app.route('/api/attendance/report')
+    @login_required
+    @cached_response(*ALL_TABLES, per_user=False)
+    def api_attendance_report():
+        """API endpoint returning one page of the filtered attendance report"""
+        form = attendance_search_form()
+        page = attendance_report_page(form, report_rows(form))
+        return jsonify({
+            'success': True,
+            'records': [attendance_row_to_dict(row) for row in page.items],
+            'next_cursor': page.next_cursor
+        })
+    
+    @app.route('/attendance/report/export')
+    @login_required
+    def export_attendance_report():
+        """Stream the filtered attendance report as CSV or XLSX"""
+        form = attendance_search_form()
+        export_format = request.args.get('format', 'csv')
+        if export_format not in ('csv', 'xlsx'):
+            abort(400)
+        attendance = report_rows(form)
+        
+        header = ['Date & Time', 'Student ID', 'Student Name', 'Activity', 'Recorded By']
+        
+        def rows():
+            # Stream plain column tuples from a server-side cursor instead of loading ORM objects
+            query = attendance_report_query(form, attendance)\
+                .order_by(attendance.c.timestamp.desc(), attendance.c.id.desc())\
+                .yield_per(app.config['EXPORT_BATCH_SIZE'])
+            for record in query:
+                yield (
+                    record.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                    record.student_number,
+                    f"{record.first_name} {record.last_name}",
+                    record.activity_name,
+                    record.scanned_by
+                )
+        
+        filename = f"attendance_report_{datetime.utcnow():%Y%m%d_%H%M%S}.{export_format}"
+        if export_format == 'xlsx':
+            body = iter_xlsx(header, rows(), sheet_name='Attendance')
+            mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        else:
+            body = iter_csv(header, rows())
+            mimetype = 'text/csv'
+        
+        return Response(
+            stream_with_context(body),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+    
     # API routes for QR code data
     @app.route('/api/students/<int:id>/qr-data')
     @login_required
     def get_student_qr_data(id):
         """API endpoint to get a student's QR data"""
-        student = Student.query.get_or_404(id)
+        student = roster_cache.get(id)
+        if not student:
+            abort(404)
+        
+        # Tokens are stable for a student, so clients can revalidate with If-None-Match
+        response = jsonify({
+            'success': True,
+            'student_id': student.id,
+            'student_name': student.name,
+            'qr_data': generate_qr_code_data(student)
+        })
+        response.add_etag()
+        response.cache_control.private = True
+        response.cache_control.max_age = app.config['QR_DATA_MAX_AGE']
+        return response.make_conditional(request)
+    
+    @app.route('/students/<int:id>/qr.<image_format>')
+    @login_required
+    def student_qr_image(id, image_format):
+        """Serve a student's QR code as a PNG or SVG image rendered on the server"""
+        if image_format not in IMAGE_TYPES:
+            abort(404)
+        
+        student = roster_cache.get(id)
+        if not student:
+            abort(404)
         
-        # Generate fresh QR data
-        student.save_qr_data()
-        db.session.commit()
+        digest, image = cached_qr_image(generate_qr_code_data(student), image_format)
         
+        response = Response(image, mimetype=IMAGE_TYPES[image_format])
+        response.set_etag(digest)
+        response.cache_control.private = True
+        response.cache_control.max_age = app.config['QR_DATA_MAX_AGE']
+        if request.args.get('download'):
+            response.headers['Content-Disposition'] = f'attachment; filename="qrcode_{student.student_id}.{image_format}"'
+        return response.make_conditional(request)
+    
+    @app.route('/students/badges.pdf')
+    @login_required
+    @admin_required
+    def student_badges():
+        """Stream printable QR badge sheets for the filtered students"""
+        try:
+            since = datetime.strptime(request.args['since'], '%Y-%m-%d') if request.args.get('since') else None
+        except ValueError:
+            abort(400)
+        
+        rows = badge_query(request.args.get('prefix'), since).yield_per(app.config['EXPORT_BATCH_SIZE'])
+        body = iter_badge_pdf(iter_badges(rows))
+        
+        filename = f"student_badges_{datetime.utcnow():%Y%m%d_%H%M%S}.pdf"
+        return Response(
+            stream_with_context(body),
+            mimetype='application/pdf',
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+    
+    @app.route('/analytics')
+    @login_required
+    @admin_required
+    def analytics():
+        """Participation analytics page; the charts load from the analytics API (admin only)"""
+        return render_template('analytics/index.html',
+                             weeks=app.config['ANALYTICS_WEEKS'],
+                             at_risk_rate=app.config['ANALYTICS_AT_RISK_RATE'],
+                             at_risk_missed=app.config['ANALYTICS_AT_RISK_MISSED'])
+    
+    @app.route('/api/analytics/summary')
+    @login_required
+    @admin_required
+    def api_analytics_summary():
+        """API endpoint returning the participation histogram and per-activity rates (admin only)"""
+        return jsonify(dict(analytics_cache.get().summary(), success=True))
+    
+    @app.route('/api/analytics/heatmap')
+    @login_required
+    @admin_required
+    def api_analytics_heatmap():
+        """API endpoint returning weekly attendance per recurring activity (admin only)"""
+        limit = min(request.args.get('limit', app.config['ANALYTICS_HEATMAP_ROWS'], type=int), app.config['MAX_PAGE_SIZE'])
+        return jsonify(dict(analytics_cache.get().heatmap(max(limit, 1)), success=True))
+    
+    @app.route('/api/analytics/participation')
+    @login_required
+    @admin_required
+    def api_analytics_participation():
+        """API endpoint listing students by participation rate, one page at a time (admin only)"""
+        limit = min(request.args.get('limit', app.config['PAGE_SIZE'], type=int), app.config['MAX_PAGE_SIZE'])
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        descending = request.args.get('order') == 'desc'
+        students = analytics_cache.get().participation_page(offset, max(limit, 1), descending)
+        return jsonify({'success': True, 'offset': offset, 'students': students})
+    
+    @app.route('/api/analytics/at-risk')
+    @login_required
+    @admin_required
+    def api_analytics_at_risk():
+        """API endpoint listing students with low or lapsing participation, worst first (admin only)"""
+        limit = min(request.args.get('limit', app.config['PAGE_SIZE'], type=int), app.config['MAX_PAGE_SIZE'])
+        students = analytics_cache.get().at_risk(
+            app.config['ANALYTICS_AT_RISK_RATE'], app.config['ANALYTICS_AT_RISK_MISSED'], max(limit, 1)
+        )
+        return jsonify({'success': True, 'students': students})
+    
+    @app.route('/api/cache/roster')
+    @login_required
+    @admin_required
+    def roster_cache_stats():
+        """API endpoint exposing roster cache hit/miss counters (admin only)"""
+        return jsonify({'success': True, 'roster_cache': roster_cache.stats()})
+    
+    @app.route('/metrics')
+    def metrics_endpoint():
+        """Prometheus metrics for this worker (admin session or METRICS_TOKEN bearer token)"""
+        token = app.config['METRICS_TOKEN']
+        authorization = request.headers.get('Authorization', '')
+        token_ok = bool(token) and hmac.compare_digest(authorization, f'Bearer {token}')
+        if not token_ok and not (current_user.is_authenticated and current_user.is_admin):
+            abort(403)
+        
+        roster = roster_cache.stats()
+        users = user_cache.stats()
+        responses = response_cache.stats()
+        gauges = {
+            'cache_entries': ('Entries held in the per-worker caches.', [
+                ({'cache': 'roster'}, roster['size']),
+                ({'cache': 'users'}, users['size']),
+                ({'cache': 'responses'}, responses['size'] or 0)
+            ]),
+            'cache_hit_ratio': ('Lifetime hit ratio of the per-worker caches.', [
+                ({'cache': 'roster'}, round(roster['hit_rate'], 4)),
+                ({'cache': 'users'}, round(users['hit_rate'], 4)),
+                ({'cache': 'responses'}, round(responses['hit_rate'], 4))
+            ]),
+            'response_cache_not_modified': ('Cached responses answered with 304 Not Modified.', [
+                ({}, responses['not_modified'])
+            ]),
+            'live_feed_subscribers': ('Open live attendance streams, by activity.', [
+                ({'activity_id': activity_id}, count) for activity_id, count in live_feed.stats().items()
+            ]),
+            'attendance_writer': ('Group-commit attendance writer counters (buffered write mode).', [
+                ({'stat': name}, value) for name, value in attendance_writer.stats().items()
+            ])
+        }
+        return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+    
+    @app.route('/api/metrics/slow-queries')
+    @login_required
+    @admin_required
+    def slow_queries():
+        """API endpoint listing the most recent slow SQL statements and their callers (admin only)"""
         return jsonify({
             'success': True,
-            'student_id': student.id,
-            'student_name': student.full_name(),
-            'qr_data': student.qr_data
+            'threshold_ms': app.config['SLOW_QUERY_MS'],
+            'slow_queries': metrics.recent_slow_queries()
         })
+    
+    @app.route('/api/cache/users')
+    @login_required
+    @admin_required
+    def user_cache_stats():
+        """API endpoint exposing user cache hit/miss counters (admin only)"""
+        return jsonify({'success': True, 'user_cache': user_cache.stats()})
+    
+    @app.route('/api/cache/responses')
+    @login_required
+    @admin_required
+    def response_cache_stats():
+        """API endpoint exposing response cache counters and the data versions it last read (admin only)"""
+        return jsonify({'success': True, 'response_cache': response_cache.stats()})
@@ -0,0 +1,287 @@
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from flask import current_app
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from cache import roster_cache
+from models import DataVersion, Student
+from utils import ascii_fold
+
+# SQLite FTS5 table holding the folded student_id, name and email of each student, keyed by rowid = Student.id
+SEARCH_TABLE = 'student_search'
+
+# The trigram tokenizer cannot match fewer than three characters
+MIN_TRIGRAM_LENGTH = 3
+
+# Upper bound on the limit a client may ask for
+MAX_SEARCH_LIMIT = 50
+
+# Engine URL -> whether the FTS5 table exists there
+_fts_tables = {}
+
+def fold(value):
+    """Return the lowercased ASCII form of a search key, so 'Đặng' and 'dang' match"""
+    value = value or ''
+    if not value.isascii():
+        value = ascii_fold(value)
+    return value.lower().strip()
+
+def search_fields(student_id, first_name, last_name, email):
+    """Return the folded (student_id, name, email) values indexed for a student"""
+    return fold(student_id), fold(f'{first_name} {last_name}'), fold(email)
+
+def fts_available(connection):
+    """Return True if the connection's database has the FTS5 student index"""
+    if connection.dialect.name != 'sqlite':
+        return False
+
+    key = str(connection.engine.url)
+    available = _fts_tables.get(key)
+    if available is None:
+        available = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': SEARCH_TABLE}
+        ).first() is not None
+        _fts_tables[key] = available
+    return available
+
+def ensure_search_index():
+    """Create the SQLite FTS5 trigram index of students if it is missing, returning True if it is usable"""
+    if db.engine.dialect.name != 'sqlite' or not current_app.config['SEARCH_FTS']:
+        return False
+
+    connection = db.session.connection()
+    if fts_available(connection):
+        return True
+
+    try:
+        db.session.execute(text(
+            f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(student_id, name, email, tokenize = 'trigram')"
+        ))
+    except OperationalError as e:
+        db.session.rollback()
+        logging.warning(f"SQLite has no FTS5 trigram tokenizer, student search uses the in-memory index: {str(e)}")
+        return False
+
+    _fts_tables.pop(str(db.engine.url), None)
+    count = rebuild_search_index()
+    logging.info(f"Built student search index ({count} students)")
+    return True
+
+def rebuild_search_index(batch_size=5000):
+    """Refill the FTS5 index from the student table, returning the number of students indexed"""
+    db.session.execute(text(f'DELETE FROM {SEARCH_TABLE}'))
+
+    count = 0
+    rows = db.session.execute(
+        db.select(Student.id, Student.student_id, Student.first_name, Student.last_name, Student.email)
+    ).all()
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        index_students(db.session.connection(), batch, replace=False)
+        count += len(batch)
+
+    db.session.commit()
+    return count
+
+def index_students(connection, rows, replace=True):
+    """Write (id, student_id, first_name, last_name, email) rows to the FTS5 index, if the database has one"""
+    if not rows or not fts_available(connection):
+        return
+
+    if replace:
+        connection.execute(
+            text(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = :id'), [{'id': row[0]} for row in rows]
+        )
+    params = []
+    for pk, student_id, first_name, last_name, email in rows:
+        student_id, name, email = search_fields(student_id, first_name, last_name, email)
+        params.append({'id': pk, 'student_id': student_id, 'name': name, 'email': email})
+    connection.execute(
+        text(f'INSERT INTO {SEARCH_TABLE} (rowid, student_id, name, email) VALUES (:id, :student_id, :name, :email)'),
+        params
+    )
+
+def index_student_ids(pks):
+    """Index students written with Core statements, which bypass the mapper events below"""
+    connection = db.session.connection()
+    if pks and fts_available(connection):
+        rows = connection.execute(
+            db.select(Student.id, Student.student_id, Student.first_name, Student.last_name, Student.email)
+                .where(Student.id.in_(pks))
+        ).all()
+        index_students(connection, rows, replace=False)
+
+# Keep the FTS5 index in the same transaction as ORM writes to students
+@event.listens_for(Student, 'after_insert')
+@event.listens_for(Student, 'after_update')
+def _index_student(mapper, connection, target):
+    index_students(connection, [(target.id, target.student_id, target.first_name, target.last_name, target.email)])
+
+@event.listens_for(Student, 'after_delete')
+def _unindex_student(mapper, connection, target):
+    if fts_available(connection):
+        connection.execute(text(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = :id'), {'id': target.id})
+
+class PrefixIndex:
+    """Per-worker sorted index of folded student keys, answering prefix queries with a binary search
+
+    Each student is indexed under their student ID, email, "first last",
+    "last first" and every name word. The 'students' DataVersion is checked at
+    most once per ROSTER_VERSION_CHECK_INTERVAL; when it changed, the index is
+    rebuilt in a background thread while the previous one keeps answering
+    (the FTS5 index, written in the same transaction as the students, is never stale).
+    """
+
+    def __init__(self):
+        self._index = None  # (sorted keys, student pks, sorted name words)
+        self._version = None
+        self._checked_at = 0.0
+        self._rebuilding = False
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def search(self, query, limit):
+        """Return up to limit student primary keys with a key starting with the folded query"""
+        keys, ids, _ = self._fresh()
+
+        found = []
+        seen = set()
+        position = bisect_left(keys, query)
+        while position < len(keys) and len(found) < limit and keys[position].startswith(query):
+            pk = ids[position]
+            if pk not in seen:
+                seen.add(pk)
+                found.append(pk)
+            position += 1
+        return found
+
+    def invalidate(self):
+        """Check the students version on the next search instead of waiting for the interval"""
+        self._checked_at = 0.0
+
+    def stats(self):
+        return {
+            'keys': len(self._index[0]) if self._index is not None else 0,
+            'version': self._version,
+            'builds': self.builds
+        }
+
+    def _fresh(self):
+        """Return the current (keys, ids, name words), building them on first use"""
+        now = time.monotonic()
+        interval = current_app.config['ROSTER_VERSION_CHECK_INTERVAL']
+        index = self._index
+        if index is not None and now - self._checked_at < interval:
+            return index
+
+        with self._lock:
+            if self._index is None or now - self._checked_at >= interval:
+                version = DataVersion.get(roster_cache.VERSION_KEY)
+                if self._index is None:
+                    self._build(version)
+                elif version != self._version and not self._rebuilding:
+                    self._rebuilding = True
+                    app = current_app._get_current_object()
+                    threading.Thread(target=self._rebuild, args=(app, version), name='search-index', daemon=True).start()
+                self._checked_at = now
+            return self._index
+
+    def _rebuild(self, app, version):
+        try:
+            with app.app_context():
+                self._build(version)
+        except Exception as e:
+            logging.error(f"Error rebuilding the student search index: {str(e)}")
+        finally:
+            self._rebuilding = False
+
+    def fuzzy(self, query, limit):
+        """Return up to limit student primary keys for the query with misspelled name words corrected"""
+        from difflib import get_close_matches
+
+        words = self._fresh()[2]
+        corrected = []
+        for word in query.split():
+            # Words that already begin some name (or are not names at all, like IDs) are kept
+            position = bisect_left(words, word)
+            if not word.isalpha() or (position < len(words) and words[position].startswith(word)):
+                corrected.append(word)
+                continue
+            matches = get_close_matches(word, words, n=1, cutoff=0.7)
+            if not matches:
+                return []
+            corrected.append(matches[0])
+
+        corrected = ' '.join(corrected)
+        return self.search(corrected, limit) if corrected != query else []
+
+    def _build(self, version):
+        keys = []
+        pks = []
+        name_keys = {}  # (first_name, last_name) -> name keys, since names repeat across a roster
+        rows = db.session.execute(
+            db.select(Student.id, Student.student_id, Student.first_name, Student.last_name, Student.email)
+        )
+        for pk, student_id, first_name, last_name, email in rows:
+            names = name_keys.get((first_name, last_name))
+            if names is None:
+                first, last = fold(first_name), fold(last_name)
+                names = {f'{first} {last}', f'{last} {first}', *first.split(), *last.split()}
+                names = name_keys[(first_name, last_name)] = tuple(names)
+            student_keys = {fold(student_id), fold(email), *names}
+            student_keys.discard('')
+            keys.extend(student_keys)
+            pks.extend([pk] * len(student_keys))
+        words = {word for names in name_keys.values() for word in names if ' ' not in word}
+
+        # Sort positions rather than (key, pk) tuples, then keep flat arrays (a few MB for 100k students)
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self._index = ([keys[i] for i in order], array('q', [pks[i] for i in order]), sorted(words))
+        self._version = version
+        self.builds += 1
+
+prefix_index = PrefixIndex()
+
+def _fts_match(query, limit, exclude):
+    """Return student primary keys whose student ID, name or email contains the query"""
+    # Unranked so SQLite stops at the limit; these follow the better-ranked prefix matches anyway
+    rows = db.session.execute(
+        text(f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :query LIMIT :limit'),
+        {'query': '"' + query.replace('"', '""') + '"', 'limit': limit + len(exclude)}
+    )
+    return [pk for (pk,) in rows if pk not in exclude][:limit]
+
+def search_students(query, limit):
+    """Return (backend, students) for a typeahead query
+
+    Prefix matches come first, then substring matches from the FTS5 index and,
+    if there are still none, prefix matches after correcting misspelled names.
+    """
+    query = fold(query)
+    if not query:
+        return 'none', []
+
+    pks = prefix_index.search(query, limit)
+    backend = 'prefix'
+    if len(pks) < limit and len(query) >= MIN_TRIGRAM_LENGTH and fts_available(db.session.connection()):
+        pks += _fts_match(query, limit - len(pks), set(pks))
+        backend = 'fts5'
+    if not pks:
+        pks = prefix_index.fuzzy(query, limit)
+        backend = 'fuzzy' if pks else backend
+
+    if not pks:
+        return backend, []
+
+    # One query for the matched rows, returned in ranking order
+    students = {
+        student.id: student
+        for student in Student.query.filter(Student.id.in_(pks))
+    }
+    return backend, [students[pk] for pk in pks if pk in students]
@@ -7,5 +7,10 @@ if [ -f "requirements.txt.glitch" ]; then
 fi
 pip install -r requirements.txt
 
-# Khởi động ứng dụng với Gunicorn
-gunicorn --bind 0.0.0.0:$PORT --reuse-port --reload main:app
\ No newline at end of file
+# Khởi động ứng dụng: ASGI=1 dùng Uvicorn (API quét và luồng điểm danh trực tiếp bất đồng bộ), mặc định dùng Gunicorn
+# (trang điểm danh khi đó hỏi định kỳ thay vì giữ một luồng xử lý)
+if [ "$ASGI" = "1" ]; then
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT
+else
+    gunicorn --bind 0.0.0.0:$PORT --reuse-port --threads 8 --reload main:app
+fi
\ No newline at end of file
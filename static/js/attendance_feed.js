@@ -0,0 +1,91 @@
+/**
+ * Live attendance feed
+ * Shows scans from every station: follows the activity's Server-Sent Events stream when the
+ * ASGI app serves the page, and otherwise polls the feed endpoint with the last id received
+ */
+
+document.addEventListener('DOMContentLoaded', function() {
+    const attendanceList = document.getElementById('attendance-list');
+    if (!attendanceList || !attendanceList.dataset.feedUrl) {
+        return;
+    }
+
+    const feedUrl = attendanceList.dataset.feedUrl;
+    const attendanceCount = document.getElementById('attendance-count');
+    const status = document.getElementById('live-feed-status');
+    const maxItems = 200;  // Older entries are dropped so long sessions stay responsive
+    let cursor = parseInt(attendanceList.dataset.feedAfter, 10) || 0;
+
+    function setStatus(live) {
+        if (status) {
+            status.textContent = live ? 'Live' : 'Reconnecting';
+            status.classList.toggle('bg-success', live);
+            status.classList.toggle('bg-secondary', !live);
+        }
+    }
+
+    function showEvent(event) {
+        cursor = Math.max(cursor, event.id);
+        addAttendanceRecord(event.student);
+        if (attendanceCount && event.count) {
+            attendanceCount.textContent = event.count;
+        }
+
+        while (attendanceList.children.length > maxItems) {
+            attendanceList.lastElementChild.remove();
+        }
+    }
+
+    if (attendanceList.dataset.feedStream === 'true' && window.EventSource) {
+        // EventSource reconnects on its own and resumes from the last event id it received
+        const source = new EventSource(`${feedUrl}?after=${cursor}`);
+
+        source.addEventListener('open', () => setStatus(true));
+        source.addEventListener('error', () => setStatus(false));
+        source.addEventListener('attendance', message => showEvent(JSON.parse(message.data)));
+
+        window.addEventListener('beforeunload', () => source.close());
+        return;
+    }
+
+    // Each poll is a short request, so open take pages never hold a server thread between scans
+    const interval = parseInt(attendanceList.dataset.feedInterval, 10) || 1000;
+    let timer = null;
+    let polling = false;
+
+    async function poll() {
+        if (polling) {
+            return;
+        }
+        polling = true;
+        clearTimeout(timer);
+
+        try {
+            const response = await fetch(`${feedUrl}?after=${cursor}`, {
+                headers: {'Accept': 'application/json', 'X-Requested-With': 'XMLHttpRequest'}
+            });
+            if (!response.ok) {
+                throw new Error(`Feed poll failed with status ${response.status}`);
+            }
+
+            const result = await response.json();
+            result.events.forEach(showEvent);
+            cursor = Math.max(cursor, result.cursor);
+            setStatus(true);
+        } catch (error) {
+            console.error('Attendance feed poll failed:', error);
+            setStatus(false);
+        }
+        polling = false;
+        timer = setTimeout(poll, document.hidden ? interval * 5 : interval);
+    }
+
+    document.addEventListener('visibilitychange', function() {
+        // Catch up at once when the page is shown again
+        if (!document.hidden) {
+            poll();
+        }
+    });
+
+    poll();
+});
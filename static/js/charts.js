@@ -272,6 +272,209 @@ class AttendanceCharts {
         });
     }
     
+    /**
+     * Load the analytics page from the analytics API
+     */
+    async initAnalytics(container) {
+        const fetchJson = url => fetch(url, {headers: {'X-Requested-With': 'XMLHttpRequest'}})
+            .then(response => response.json());
+        
+        try {
+            const [summary, heatmap, atRisk] = await Promise.all([
+                fetchJson(container.dataset.summaryUrl),
+                fetchJson(container.dataset.heatmapUrl),
+                fetchJson(container.dataset.atRiskUrl)
+            ]);
+            
+            document.getElementById('analytics-activities').textContent = summary.activities;
+            document.getElementById('analytics-attendance').textContent = summary.attendance;
+            document.getElementById('analytics-mean').textContent = summary.mean_participation + '%';
+            document.getElementById('analytics-median').textContent = summary.median_participation + '%';
+            
+            this.createParticipationChart('participation-chart', summary.histogram);
+            this.createActivityTrendChart('activity-trend-chart', summary.activity_rates);
+            this.renderHeatmap('attendance-heatmap', heatmap);
+            this.renderAtRiskList('at-risk-list', atRisk.students, container.dataset.studentUrl);
+        } catch (error) {
+            console.error('Error loading analytics:', error);
+        }
+    }
+    
+    /**
+     * Create a histogram of students by participation rate
+     */
+    createParticipationChart(canvasId, histogram) {
+        const canvas = document.getElementById(canvasId);
+        if (!canvas) return;
+        
+        const labels = histogram.counts.map((_, i) => `${histogram.edges[i]}-${histogram.edges[i + 1]}%`);
+        
+        this.charts[canvasId] = new Chart(canvas.getContext('2d'), {
+            type: 'bar',
+            data: {
+                labels: labels,
+                datasets: [{
+                    label: 'Students',
+                    data: histogram.counts,
+                    backgroundColor: 'rgba(54, 162, 235, 0.8)',
+                    borderWidth: 1
+                }]
+            },
+            options: {
+                responsive: true,
+                maintainAspectRatio: false,
+                scales: {
+                    y: {
+                        beginAtZero: true,
+                        ticks: {
+                            precision: 0
+                        },
+                        title: {
+                            display: true,
+                            text: 'Number of Students'
+                        }
+                    },
+                    x: {
+                        title: {
+                            display: true,
+                            text: 'Participation Rate'
+                        }
+                    }
+                },
+                plugins: {
+                    legend: {
+                        display: false
+                    }
+                }
+            }
+        });
+    }
+    
+    /**
+     * Create a line chart of attendance rates across activities in chronological order
+     */
+    createActivityTrendChart(canvasId, activities) {
+        const canvas = document.getElementById(canvasId);
+        if (!canvas) return;
+        
+        if (activities.length === 0) {
+            canvas.style.display = 'none';
+            return;
+        }
+        
+        this.charts[canvasId] = new Chart(canvas.getContext('2d'), {
+            type: 'line',
+            data: {
+                labels: activities.map(activity => activity.start_time.slice(0, 10)),
+                datasets: [{
+                    label: 'Attendance Rate (%)',
+                    data: activities.map(activity => activity.rate),
+                    fill: false,
+                    borderColor: 'rgb(75, 192, 192)',
+                    tension: 0.1
+                }]
+            },
+            options: {
+                responsive: true,
+                maintainAspectRatio: false,
+                scales: {
+                    y: {
+                        beginAtZero: true,
+                        max: 100
+                    }
+                },
+                plugins: {
+                    legend: {
+                        display: false
+                    },
+                    tooltip: {
+                        callbacks: {
+                            title: function(tooltipItems) {
+                                return activities[tooltipItems[0].dataIndex].name;
+                            },
+                            label: function(context) {
+                                const activity = activities[context.dataIndex];
+                                return `${activity.count} students (${activity.rate}%)`;
+                            }
+                        }
+                    }
+                }
+            }
+        });
+    }
+    
+    /**
+     * Render the activity x week heatmap as a table shaded by attendance
+     */
+    renderHeatmap(containerId, heatmap) {
+        const container = document.getElementById(containerId);
+        if (!container) return;
+        
+        if (heatmap.activities.length === 0) {
+            container.innerHTML = '<div class="alert alert-info">No activities in this period.</div>';
+            return;
+        }
+        
+        const max = Math.max(1, ...heatmap.counts.flat());
+        const table = document.createElement('table');
+        table.className = 'table table-sm table-bordered text-center heatmap';
+        
+        const headerRow = table.createTHead().insertRow();
+        headerRow.appendChild(document.createElement('th')).textContent = 'Activity';
+        heatmap.weeks.forEach(week => {
+            headerRow.appendChild(document.createElement('th')).textContent = week.slice(5);
+        });
+        
+        const body = table.createTBody();
+        heatmap.activities.forEach((name, row) => {
+            const tr = body.insertRow();
+            const label = tr.appendChild(document.createElement('th'));
+            label.textContent = name;
+            label.className = 'text-start';
+            
+            heatmap.counts[row].forEach((count, week) => {
+                const cell = tr.insertCell();
+                const sessions = heatmap.sessions[row][week];
+                cell.textContent = count || (sessions ? '0' : '');
+                cell.title = `${sessions} session(s), ${count} attendance`;
+                cell.style.backgroundColor = `rgba(75, 192, 192, ${(count / max * 0.85).toFixed(2)})`;
+            });
+        });
+        
+        container.replaceChildren(table);
+    }
+    
+    /**
+     * Fill the at-risk table body with students, worst first
+     */
+    renderAtRiskList(tbodyId, students, studentUrl) {
+        const tbody = document.getElementById(tbodyId);
+        if (!tbody) return;
+        
+        if (students.length === 0) {
+            const cell = tbody.insertRow().insertCell();
+            cell.colSpan = 6;
+            cell.className = 'text-center text-muted';
+            cell.textContent = 'No students at risk.';
+            return;
+        }
+        
+        students.forEach(student => {
+            const tr = tbody.insertRow();
+            tr.insertCell().textContent = student.student_id;
+            
+            const link = document.createElement('a');
+            link.href = studentUrl.replace('/0/', `/${student.id}/`);
+            link.textContent = student.name;
+            tr.insertCell().appendChild(link);
+            
+            tr.insertCell().textContent = student.attended;
+            tr.insertCell().textContent = student.participation + '%';
+            tr.insertCell().textContent = student.missed_streak;
+            tr.insertCell().textContent = student.last_attended ? student.last_attended.slice(0, 10) : 'Never';
+        });
+    }
+    
     /**
      * Generate an array of colors for charts
      */
@@ -313,6 +516,12 @@ document.addEventListener('DOMContentLoaded', function() {
         attendanceCharts.createAttendancePieChart('attendance-pie-chart', attended, absent);
     }
     
+    // Initialize analytics if on the analytics page
+    const analytics = document.getElementById('analytics');
+    if (analytics) {
+        attendanceCharts.initAnalytics(analytics);
+    }
+    
     // Initialize report charts if on reports page
     if (document.getElementById('attendance-report-chart')) {
         const labels = JSON.parse(document.getElementById('attendance-report-chart').dataset.labels || '[]');
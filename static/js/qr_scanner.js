@@ -1,10 +1,69 @@
 /**
  * QR Code Scanner functionality
- * Uses jsQR library to scan QR codes from camera feed
+ * Grabs downscaled camera frames and decodes them with jsQR in a Web Worker (qr_worker.js),
+ * one frame at a time and at a rate adapted to how long decoding takes on this device
  */
 
+// Rolling decode-time statistics, shown on the page to tune the scan rate per device
+class DecodeStats {
+    constructor(size = 60) {
+        this.size = size;
+        this.decodeTimes = [];  // Worker decode time (ms) of the latest frames
+        this.frameTimes = [];   // Grab-to-result time (ms) of the latest frames
+        this.resultAt = [];     // When the latest results arrived, for the frame rate
+        this.frames = 0;
+        this.roiHits = 0;
+        this.fullHits = 0;
+        this.fullPasses = 0;
+    }
+
+    record(result, frameTime) {
+        const push = (list, value) => {
+            list.push(value);
+            if (list.length > this.size) {
+                list.shift();
+            }
+        };
+        push(this.decodeTimes, result.decodeTime);
+        push(this.frameTimes, frameTime);
+        push(this.resultAt, performance.now());
+
+        this.frames++;
+        if (result.pass === 'full') {
+            this.fullPasses++;
+        }
+        if (result.code) {
+            if (result.pass === 'roi') {
+                this.roiHits++;
+            } else {
+                this.fullHits++;
+            }
+        }
+    }
+
+    average() {
+        const times = this.decodeTimes;
+        return times.length ? times.reduce((sum, time) => sum + time, 0) / times.length : 0;
+    }
+
+    summary() {
+        const sorted = [...this.decodeTimes].sort((a, b) => a - b);
+        const span = this.resultAt.length > 1 ? this.resultAt[this.resultAt.length - 1] - this.resultAt[0] : 0;
+        const hits = this.roiHits + this.fullHits;
+        return {
+            frames: this.frames,
+            decodeAvg: this.average(),
+            decodeP95: sorted.length ? sorted[Math.min(sorted.length - 1, Math.floor(sorted.length * 0.95))] : 0,
+            frameAvg: this.frameTimes.length ? this.frameTimes.reduce((sum, time) => sum + time, 0) / this.frameTimes.length : 0,
+            fps: span > 0 ? (this.resultAt.length - 1) * 1000 / span : 0,
+            roiShare: hits ? this.roiHits / hits : 0,
+            fullPasses: this.fullPasses
+        };
+    }
+}
+
 class QRScanner {
-    constructor(videoElement, canvasElement, scanCallback) {
+    constructor(videoElement, canvasElement, scanCallback, options = {}) {
         this.video = videoElement;
         this.canvas = canvasElement;
         this.canvasContext = this.canvas.getContext('2d');
@@ -13,6 +72,62 @@ class QRScanner {
         this.lastScannedCode = null;
         this.lastScannedTime = 0;
         this.scanInterval = 500; // Minimum time (ms) between successful scans
+
+        this.workerUrl = options.workerUrl || canvasElement.dataset.workerUrl;
+        this.maxDecodeWidth = options.maxDecodeWidth || 400;  // Frames are downscaled to at most this width (px)
+        this.roiFraction = options.roiFraction || 0.6;        // Centre region side, as a share of the shorter frame side
+        this.fullFrameEvery = options.fullFrameEvery || 4;    // Whole frame decoded on every Nth frame the region misses
+        this.minInterval = options.minInterval || 66;         // Fastest rate: one frame per minInterval ms
+        this.idleInterval = options.idleInterval || 250;      // Slower rate once nothing was found for idleAfter ms
+        this.idleAfter = options.idleAfter || 4000;
+        this.onStats = options.onStats || null;
+
+        // Frames are grabbed on a small canvas; the visible canvas only shows the code outline
+        this.captureCanvas = document.createElement('canvas');
+        this.captureContext = this.captureCanvas.getContext('2d', { willReadFrequently: true });
+
+        this.worker = null;
+        this.offscreen = false;   // Worker draws transferred ImageBitmaps itself
+        this.inFlight = false;    // At most one frame is being decoded
+        this.frameId = 0;
+        this.frameStarted = 0;
+        this.timer = null;
+        this.roiMisses = 0;
+        this.lastPass = null;
+        this.lastFoundAt = 0;
+        this.outlined = false;
+        this.stats = new DecodeStats();
+        this.statsShownAt = 0;
+
+        this.startWorker();
+    }
+
+    startWorker() {
+        if (!window.Worker || !this.workerUrl) {
+            return;
+        }
+
+        try {
+            this.worker = new Worker(this.workerUrl);
+        } catch (error) {
+            console.error('QR worker unavailable, decoding on the main thread:', error);
+            return;
+        }
+        this.worker.onmessage = event => {
+            if (event.data.ready) {
+                this.offscreen = event.data.offscreen && typeof createImageBitmap === 'function';
+            } else {
+                this.handleResult(event.data);
+            }
+        };
+        this.worker.onerror = error => {
+            // e.g. jsQR could not be loaded into the worker; fall back to the main thread
+            console.error('QR worker failed, decoding on the main thread:', error.message);
+            this.worker.terminate();
+            this.worker = null;
+            this.inFlight = false;
+            this.scheduleFrame(0);
+        };
     }
 
     async startScanning() {
@@ -32,7 +147,10 @@ class QRScanner {
             this.video.play();
             
             this.scanning = true;
-            requestAnimationFrame(() => this.scanFrame());
+            this.lastFoundAt = performance.now();
+            if (!this.inFlight) {
+                this.scheduleFrame(0);
+            }
             
             return true;
         } catch (error) {
@@ -43,6 +161,8 @@ class QRScanner {
 
     stopScanning() {
         this.scanning = false;
+        clearTimeout(this.timer);
+        this.clearOutline();
         
         // Stop the video stream
         if (this.video.srcObject) {
@@ -52,60 +172,162 @@ class QRScanner {
         }
     }
 
+    // Wait before the next frame: long enough for decoding to use at most about half the time,
+    // and longer still while nothing is being scanned or the page is hidden
+    nextDelay(decodeTime) {
+        if (document.hidden || performance.now() - this.lastFoundAt > this.idleAfter) {
+            return this.idleInterval;
+        }
+        return Math.max(this.minInterval - decodeTime, this.stats.average());
+    }
+
+    scheduleFrame(delay) {
+        clearTimeout(this.timer);
+        if (this.scanning) {
+            this.timer = setTimeout(() => this.scanFrame(), delay);
+        }
+    }
+
+    // Downscaled frame size and the centre region of interest within it
+    frameGeometry() {
+        const scale = Math.min(1, this.maxDecodeWidth / this.video.videoWidth);
+        const width = Math.round(this.video.videoWidth * scale);
+        const height = Math.round(this.video.videoHeight * scale);
+        const side = Math.round(Math.min(width, height) * this.roiFraction);
+        const roi = {
+            x: Math.floor((width - side) / 2),
+            y: Math.floor((height - side) / 2),
+            width: side,
+            height: side
+        };
+        return { width, height, roi };
+    }
+
     scanFrame() {
+        if (!this.scanning || this.inFlight) return;
+
+        if (this.video.readyState !== this.video.HAVE_ENOUGH_DATA || document.hidden) {
+            this.scheduleFrame(this.idleInterval);
+            return;
+        }
+
+        const { width, height, roi } = this.frameGeometry();
+        // The whole frame is decoded periodically while the region misses, and while the code sits off-centre
+        const fullFrame = this.lastPass === 'full' || this.roiMisses % this.fullFrameEvery === this.fullFrameEvery - 1;
+        this.frameStarted = performance.now();
+        this.inFlight = true;
+        const id = ++this.frameId;
+
+        if (!this.worker) {
+            this.handleResult(this.decodeOnMainThread(width, height));
+            return;
+        }
+
+        if (this.offscreen) {
+            // The worker reads the pixels, so the main thread never calls getImageData
+            createImageBitmap(this.video, { resizeWidth: width, resizeHeight: height, resizeQuality: 'low' })
+                .then(bitmap => {
+                    this.worker.postMessage({ id, width, height, bitmap, roi, fullFrame }, [bitmap]);
+                })
+                .catch(() => {
+                    this.offscreen = false;
+                    this.inFlight = false;
+                    this.scheduleFrame(0);
+                });
+            return;
+        }
+
+        const imageData = this.grabPixels(width, height);
+        this.worker.postMessage(
+            { id, width, height, buffer: imageData.data.buffer, roi, fullFrame },
+            [imageData.data.buffer]
+        );
+    }
+
+    grabPixels(width, height) {
+        if (this.captureCanvas.width !== width || this.captureCanvas.height !== height) {
+            this.captureCanvas.width = width;
+            this.captureCanvas.height = height;
+        }
+        this.captureContext.drawImage(this.video, 0, 0, width, height);
+        return this.captureContext.getImageData(0, 0, width, height);
+    }
+
+    // Fallback without workers: one downscaled whole-frame decode per frame
+    decodeOnMainThread(width, height) {
+        const started = performance.now();
+        const imageData = this.grabPixels(width, height);
+        const code = jsQR(imageData.data, width, height, {
+            inversionAttempts: "dontInvert",
+        });
+        return { code, pass: 'full', decodeTime: performance.now() - started };
+    }
+
+    handleResult(result) {
+        this.inFlight = false;
+        this.stats.record(result, performance.now() - this.frameStarted);
+        this.lastPass = result.code ? result.pass : null;
+        this.showStats();
+
         if (!this.scanning) return;
 
-        if (this.video.readyState === this.video.HAVE_ENOUGH_DATA) {
-            // Set canvas dimensions to match video
-            this.canvas.width = this.video.videoWidth;
-            this.canvas.height = this.video.videoHeight;
-            
-            // Draw video frame to canvas
-            this.canvasContext.drawImage(
-                this.video, 
-                0, 
-                0, 
-                this.canvas.width, 
-                this.canvas.height
-            );
+        if (result.code) {
+            this.roiMisses = 0;
+            this.lastFoundAt = performance.now();
+            this.drawOutline(result.code.location);
             
-            // Get image data for QR scanning
-            const imageData = this.canvasContext.getImageData(
-                0, 
-                0, 
-                this.canvas.width, 
-                this.canvas.height
-            );
+            const currentTime = new Date().getTime();
             
-            // Scan for QR code
-            const code = jsQR(imageData.data, imageData.width, imageData.height, {
-                inversionAttempts: "dontInvert",
-            });
-
-            // Process the detected QR code
-            if (code) {
-                // Draw border around detected QR code
-                this.drawQRBoundary(code.location, '#00FF00');
-                
-                const currentTime = new Date().getTime();
+            // Rate limit successful scans to avoid duplicates
+            if (result.code.data !== this.lastScannedCode || 
+                (currentTime - this.lastScannedTime > this.scanInterval)) {
+                this.lastScannedCode = result.code.data;
+                this.lastScannedTime = currentTime;
                 
-                // Rate limit successful scans to avoid duplicates
-                if (code.data !== this.lastScannedCode || 
-                    (currentTime - this.lastScannedTime > this.scanInterval)) {
-                    this.lastScannedCode = code.data;
-                    this.lastScannedTime = currentTime;
-                    
-                    // Call the callback with the scanned data
-                    if (this.scanCallback) {
-                        this.scanCallback(code.data);
-                    }
+                // Call the callback with the scanned data
+                if (this.scanCallback) {
+                    this.scanCallback(result.code.data);
                 }
             }
+        } else {
+            this.roiMisses++;
+            this.clearOutline();
         }
         
-        // Continue scanning
-        if (this.scanning) {
-            requestAnimationFrame(() => this.scanFrame());
+        this.scheduleFrame(this.nextDelay(result.decodeTime));
+    }
+
+    showStats() {
+        const now = performance.now();
+        if (this.onStats && now - this.statsShownAt > 1000) {
+            this.statsShownAt = now;
+            this.onStats(Object.assign(this.stats.summary(), {
+                mode: this.worker ? (this.offscreen ? 'worker (bitmap)' : 'worker') : 'main thread'
+            }));
+        }
+    }
+
+    // Outline a detected code on the visible canvas, which matches the video size
+    drawOutline(location) {
+        if (this.canvas.width !== this.video.videoWidth || this.canvas.height !== this.video.videoHeight) {
+            this.canvas.width = this.video.videoWidth;
+            this.canvas.height = this.video.videoHeight;
+        }
+        this.clearOutline();
+
+        const scale = this.video.videoWidth / this.frameGeometry().width;
+        const scaled = {};
+        Object.keys(location).forEach(corner => {
+            scaled[corner] = { x: location[corner].x * scale, y: location[corner].y * scale };
+        });
+        this.drawQRBoundary(scaled, '#00FF00');
+        this.outlined = true;
+    }
+
+    clearOutline() {
+        if (this.outlined) {
+            this.canvasContext.clearRect(0, 0, this.canvas.width, this.canvas.height);
+            this.outlined = false;
         }
     }
 
@@ -147,6 +369,30 @@ document.addEventListener('DOMContentLoaded', function() {
     const scanForm = document.getElementById('scan-form');
     const scanDataField = document.getElementById('scanned-data');
     const scanResults = document.getElementById('scan-results');
+    const pendingCount = document.getElementById('pending-count');
+    const scanStats = document.getElementById('scan-stats');
+    
+    // Offline-tolerant queue for scans made on the take attendance page
+    let scanQueue = null;
+    if (scanForm && scanForm.dataset.syncUrl) {
+        scanQueue = new ScanQueue(
+            scanForm.dataset.syncUrl,
+            document.getElementById('activity_id').value,
+            showScanResult,
+            {
+                onPendingChange: count => {
+                    if (pendingCount) {
+                        pendingCount.textContent = count;
+                        pendingCount.parentElement.classList.toggle('d-none', count === 0);
+                    }
+                }
+            }
+        );
+        
+        // Send anything left over from a previous session
+        scanQueue.notifyPending();
+        scanQueue.flush();
+    }
     
     if (videoElement && canvasElement) {
         // Initialize scanner
@@ -165,57 +411,26 @@ document.addEventListener('DOMContentLoaded', function() {
                 if (scanDataField) {
                     scanDataField.value = data;
                     
-                    // Submit the form if it exists
-                    if (scanForm) {
-                        // If we're in the attendance form
-                        const activityId = document.getElementById('activity_id').value;
-                        
-                        // Submit the data via AJAX
-                        fetch('/attendance/scan', {
-                            method: 'POST',
-                            headers: {
-                                'Content-Type': 'application/x-www-form-urlencoded',
-                                'X-Requested-With': 'XMLHttpRequest'
-                            },
-                            body: new URLSearchParams({
-                                'activity_id': activityId,
-                                'scanned_data': data,
-                                'csrf_token': document.querySelector('input[name="csrf_token"]').value
-                            })
-                        })
-                        .then(response => response.json())
-                        .then(result => {
-                            if (result.success) {
-                                // Add to the scanned list
-                                const student = result.student;
-                                
-                                const attendanceList = document.getElementById('attendance-list');
-                                if (attendanceList) {
-                                    const listItem = document.createElement('li');
-                                    listItem.className = 'list-group-item d-flex justify-content-between align-items-center';
-                                    listItem.innerHTML = `
-                                        <div>
-                                            <strong>${student.name}</strong> 
-                                            <small class="text-muted">(${student.student_id})</small>
-                                        </div>
-                                        <span class="badge bg-success">Recorded</span>
-                                    `;
-                                    attendanceList.prepend(listItem);
-                                }
-                                
-                                // Show success message
-                                showAlert(result.message, 'success');
-                            } else {
-                                // Show error message
-                                showAlert(result.message, 'danger');
-                            }
-                        })
-                        .catch(error => {
+                    // Buffer the scan locally; the queue syncs it as soon as the network allows
+                    if (scanQueue) {
+                        scanQueue.enqueue(data).catch(error => {
                             console.error('Error:', error);
                             showAlert('Error recording attendance', 'danger');
                         });
                     }
                 }
+            },
+            {
+                // Decode timings for tuning the scan rate on this device
+                onStats: stats => {
+                    if (scanStats) {
+                        scanStats.classList.remove('d-none');
+                        scanStats.textContent = `Decode ${stats.decodeAvg.toFixed(1)} ms avg / ` +
+                            `${stats.decodeP95.toFixed(1)} ms p95, frame ${stats.frameAvg.toFixed(1)} ms, ` +
+                            `${stats.fps.toFixed(1)} frames/s, ${Math.round(stats.roiShare * 100)}% found in centre, ` +
+                            `${stats.fullPasses} full-frame passes (${stats.mode})`;
+                    }
+                }
             }
         );
         
@@ -243,6 +458,58 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 });
 
+// Add a student to the recorded attendance list, returning false if they are already listed
+function addAttendanceRecord(student) {
+    const attendanceList = document.getElementById('attendance-list');
+    if (!attendanceList || !student || !student.name) {
+        return false;
+    }
+    
+    // A student is recorded at most once per activity, whether by this scanner or the live feed
+    if (attendanceList.querySelector(`[data-student-id="${student.id}"]`)) {
+        return false;
+    }
+    
+    const placeholder = document.getElementById('attendance-empty');
+    if (placeholder) {
+        placeholder.remove();
+    }
+    
+    const listItem = document.createElement('li');
+    listItem.className = 'list-group-item d-flex justify-content-between align-items-center';
+    listItem.dataset.studentId = student.id;
+    listItem.innerHTML = `
+        <div>
+            <strong></strong> 
+            <small class="text-muted"></small>
+        </div>
+        <span class="badge bg-success">Recorded</span>
+    `;
+    listItem.querySelector('strong').textContent = student.name;
+    listItem.querySelector('small').textContent = `(${student.student_id})`;
+    attendanceList.prepend(listItem);
+    return true;
+}
+
+// Show the outcome of a synced scan
+function showScanResult(result) {
+    if (result.success) {
+        // Add to the scanned list and keep the running total in step
+        if (addAttendanceRecord(result.student)) {
+            const attendanceCount = document.getElementById('attendance-count');
+            if (attendanceCount) {
+                attendanceCount.textContent = parseInt(attendanceCount.textContent || 0) + 1;
+            }
+        }
+        
+        // Show success message
+        showAlert(result.message, 'success');
+    } else {
+        // Show error message
+        showAlert(result.message, 'danger');
+    }
+}
+
 // Helper function to show alerts
 function showAlert(message, type) {
     const alertContainer = document.getElementById('alert-container');
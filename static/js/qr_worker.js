@@ -0,0 +1,92 @@
+/**
+ * QR decoding worker
+ * Decodes downscaled camera frames with jsQR off the main thread. Frames arrive either as a transferred
+ * ImageBitmap (drawn here on an OffscreenCanvas) or as a transferred RGBA buffer. The centre region of
+ * interest is decoded first and the whole frame only when the scanner asks for it.
+ */
+
+importScripts('https://cdn.jsdelivr.net/npm/jsqr@1.4.0/dist/jsQR.min.js');
+
+const offscreen = typeof OffscreenCanvas !== 'undefined';
+let canvas = null;
+let context = null;
+let regionBuffer = null;  // Reused for regions cut out of RGBA buffers
+
+// Draw a bitmap frame at the decode size, so its pixels can be read region by region
+function drawBitmap(bitmap, width, height) {
+    if (!canvas || canvas.width !== width || canvas.height !== height) {
+        canvas = new OffscreenCanvas(width, height);
+        context = canvas.getContext('2d', { willReadFrequently: true });
+    }
+    context.drawImage(bitmap, 0, 0, width, height);
+    bitmap.close();
+}
+
+// Copy a region of an RGBA buffer row by row into the reused region buffer
+function cropBuffer(pixels, width, region) {
+    const rowLength = region.width * 4;
+    const size = rowLength * region.height;
+    if (!regionBuffer || regionBuffer.length < size) {
+        regionBuffer = new Uint8ClampedArray(size);
+    }
+    const out = regionBuffer.subarray(0, size);
+    for (let row = 0; row < region.height; row++) {
+        const start = ((region.y + row) * width + region.x) * 4;
+        out.set(pixels.subarray(start, start + rowLength), row * rowLength);
+    }
+    return out;
+}
+
+// Decode one region, returning the code with its corners in whole-frame coordinates
+function decodeRegion(frame, region) {
+    let pixels;
+    if (frame.bitmap) {
+        pixels = context.getImageData(region.x, region.y, region.width, region.height).data;
+    } else if (region.width === frame.width && region.height === frame.height) {
+        pixels = frame.pixels;
+    } else {
+        pixels = cropBuffer(frame.pixels, frame.width, region);
+    }
+
+    const code = jsQR(pixels, region.width, region.height, { inversionAttempts: 'dontInvert' });
+    if (!code) {
+        return null;
+    }
+
+    const shift = corner => ({ x: corner.x + region.x, y: corner.y + region.y });
+    return {
+        data: code.data,
+        location: {
+            topLeftCorner: shift(code.location.topLeftCorner),
+            topRightCorner: shift(code.location.topRightCorner),
+            bottomRightCorner: shift(code.location.bottomRightCorner),
+            bottomLeftCorner: shift(code.location.bottomLeftCorner)
+        }
+    };
+}
+
+self.onmessage = event => {
+    const { id, width, height, bitmap, buffer, roi, fullFrame } = event.data;
+    const started = performance.now();
+
+    const frame = { width, height, bitmap: Boolean(bitmap), pixels: buffer ? new Uint8ClampedArray(buffer) : null };
+    if (bitmap) {
+        drawBitmap(bitmap, width, height);
+    }
+
+    let code = null;
+    let pass = null;
+    if (roi) {
+        code = decodeRegion(frame, roi);
+        pass = 'roi';
+    }
+    if (!code && (fullFrame || !roi)) {
+        code = decodeRegion(frame, { x: 0, y: 0, width, height });
+        pass = 'full';
+    }
+
+    self.postMessage({ id, code, pass, decodeTime: performance.now() - started });
+};
+
+// Tell the scanner whether it can hand over bitmaps instead of reading pixels on the main thread
+self.postMessage({ ready: true, offscreen });
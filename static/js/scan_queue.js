@@ -0,0 +1,193 @@
+/**
+ * Offline-tolerant scan queue
+ * Buffers scans in IndexedDB with idempotency keys and flushes them to the sync endpoint in chunks
+ */
+
+class ScanQueue {
+    constructor(syncUrl, activityId, resultCallback, options = {}) {
+        this.syncUrl = syncUrl;
+        this.activityId = String(activityId);
+        this.resultCallback = resultCallback;
+        this.chunkSize = options.chunkSize || 50;
+        this.retryDelay = options.retryDelay || 2000;   // Initial delay (ms) after a failed flush
+        this.maxRetryDelay = options.maxRetryDelay || 30000;
+        this.onPendingChange = options.onPendingChange || null;
+
+        this.dbPromise = this.openDatabase();
+        this.memoryQueue = [];  // Used when IndexedDB is unavailable (e.g. private browsing)
+        this.flushing = false;
+        this.flushRequested = false;
+        this.currentDelay = this.retryDelay;
+        this.retryTimer = null;
+
+        // Flush whenever the connection comes back
+        window.addEventListener('online', () => this.flush());
+    }
+
+    openDatabase() {
+        if (!window.indexedDB) {
+            return Promise.resolve(null);
+        }
+
+        return new Promise(resolve => {
+            const request = indexedDB.open('attendance-scan-queue', 1);
+
+            request.onupgradeneeded = () => {
+                const store = request.result.createObjectStore('scans', { keyPath: 'key' });
+                store.createIndex('activityId', 'activityId');
+            };
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => {
+                console.error('IndexedDB unavailable, buffering scans in memory:', request.error);
+                resolve(null);
+            };
+        });
+    }
+
+    generateKey() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+
+        // Fallback for browsers without randomUUID (non-secure contexts)
+        const bytes = new Uint8Array(16);
+        crypto.getRandomValues(bytes);
+        return Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    async enqueue(data) {
+        const scan = {
+            key: this.generateKey(),
+            activityId: this.activityId,
+            data: data,
+            capturedAt: new Date().toISOString()
+        };
+
+        const db = await this.dbPromise;
+        if (db) {
+            await this.transact(db, 'readwrite', store => store.put(scan));
+        } else {
+            this.memoryQueue.push(scan);
+        }
+
+        await this.notifyPending();
+        this.flush();
+        return scan.key;
+    }
+
+    async pending(limit) {
+        const db = await this.dbPromise;
+        if (!db) {
+            return this.memoryQueue.slice(0, limit);
+        }
+
+        return new Promise((resolve, reject) => {
+            const scans = [];
+            const index = db.transaction('scans', 'readonly').objectStore('scans').index('activityId');
+            const request = index.openCursor(IDBKeyRange.only(this.activityId));
+
+            request.onsuccess = () => {
+                const cursor = request.result;
+                if (cursor && (!limit || scans.length < limit)) {
+                    scans.push(cursor.value);
+                    cursor.continue();
+                } else {
+                    // Send the oldest captures first
+                    scans.sort((a, b) => a.capturedAt.localeCompare(b.capturedAt));
+                    resolve(scans);
+                }
+            };
+            request.onerror = () => reject(request.error);
+        });
+    }
+
+    async remove(keys) {
+        const db = await this.dbPromise;
+        if (!db) {
+            const done = new Set(keys);
+            this.memoryQueue = this.memoryQueue.filter(scan => !done.has(scan.key));
+            return;
+        }
+
+        await this.transact(db, 'readwrite', store => keys.forEach(key => store.delete(key)));
+    }
+
+    transact(db, mode, action) {
+        return new Promise((resolve, reject) => {
+            const tx = db.transaction('scans', mode);
+            action(tx.objectStore('scans'));
+            tx.oncomplete = () => resolve();
+            tx.onerror = () => reject(tx.error);
+        });
+    }
+
+    async notifyPending() {
+        if (this.onPendingChange) {
+            const scans = await this.pending();
+            this.onPendingChange(scans.length);
+        }
+    }
+
+    async flush() {
+        if (this.flushing) {
+            // Scans queued mid-flush are picked up once the current flush finishes
+            this.flushRequested = true;
+            return;
+        }
+        this.flushing = true;
+        this.flushRequested = false;
+        clearTimeout(this.retryTimer);
+        let failed = false;
+
+        try {
+            let chunk = await this.pending(this.chunkSize);
+
+            while (chunk.length > 0) {
+                const response = await fetch(this.syncUrl, {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                        'X-Requested-With': 'XMLHttpRequest',
+                        'X-CSRFToken': document.querySelector('input[name="csrf_token"]').value
+                    },
+                    body: JSON.stringify({
+                        activity_id: this.activityId,
+                        scans: chunk.map(scan => ({
+                            key: scan.key,
+                            data: scan.data,
+                            captured_at: scan.capturedAt
+                        }))
+                    })
+                });
+
+                if (!response.ok) {
+                    throw new Error(`Sync failed with status ${response.status}`);
+                }
+
+                const result = await response.json();
+
+                // The server has stored a receipt for every key, so they can be dropped locally.
+                // Replayed receipts are reported too: their original response never arrived.
+                await this.remove(chunk.map(scan => scan.key));
+                if (this.resultCallback) {
+                    result.results.forEach(item => this.resultCallback(item));
+                }
+
+                this.currentDelay = this.retryDelay;
+                await this.notifyPending();
+                chunk = await this.pending(this.chunkSize);
+            }
+        } catch (error) {
+            // Keep the scans and retry with exponential backoff
+            console.error('Scan sync failed, will retry:', error);
+            failed = true;
+            this.retryTimer = setTimeout(() => this.flush(), this.currentDelay);
+            this.currentDelay = Math.min(this.currentDelay * 2, this.maxRetryDelay);
+        } finally {
+            this.flushing = false;
+            if (this.flushRequested && !failed) {
+                this.flush();
+            }
+        }
+    }
+}
@@ -0,0 +1,149 @@
+/**
+ * Student typeahead
+ * Attaches to inputs with a data-search-url attribute and lists matches from the student search API.
+ * data-search-action="navigate" opens the chosen student's page; otherwise the input is filled with the student ID.
+ */
+
+class StudentTypeahead {
+    constructor(input, options = {}) {
+        this.input = input;
+        this.url = input.dataset.searchUrl;
+        this.action = input.dataset.searchAction || 'fill';
+        this.delay = options.delay || 120;     // Debounce (ms) between keystrokes and requests
+        this.limit = options.limit || 10;
+
+        this.timer = null;
+        this.controller = null;
+        this.results = [];
+        this.active = -1;
+
+        // Dropdown positioned under the input
+        this.input.parentElement.classList.add('position-relative');
+        this.menu = document.createElement('div');
+        this.menu.className = 'list-group position-absolute w-100 shadow-sm d-none';
+        this.menu.style.zIndex = 1050;
+        this.menu.style.top = '100%';
+        this.menu.style.left = 0;
+        this.input.insertAdjacentElement('afterend', this.menu);
+        this.input.setAttribute('autocomplete', 'off');
+
+        this.input.addEventListener('input', () => this.schedule());
+        this.input.addEventListener('keydown', event => this.onKeyDown(event));
+        this.input.addEventListener('blur', () => setTimeout(() => this.hide(), 150));
+    }
+
+    schedule() {
+        clearTimeout(this.timer);
+        const query = this.input.value.trim();
+        if (!query) {
+            this.hide();
+            return;
+        }
+        this.timer = setTimeout(() => this.fetchResults(query), this.delay);
+    }
+
+    async fetchResults(query) {
+        // Only the latest keystroke's request matters
+        if (this.controller) {
+            this.controller.abort();
+        }
+        this.controller = new AbortController();
+
+        const params = new URLSearchParams({ q: query, limit: this.limit });
+        try {
+            const response = await fetch(`${this.url}?${params}`, {
+                headers: { 'Accept': 'application/json' },
+                signal: this.controller.signal
+            });
+            const data = await response.json();
+            if (data.success) {
+                this.render(data.students);
+            }
+        } catch (error) {
+            if (error.name !== 'AbortError') {
+                console.error('Student search failed:', error);
+            }
+        }
+    }
+
+    render(students) {
+        this.results = students;
+        this.active = -1;
+        this.menu.replaceChildren();
+
+        if (!students.length) {
+            const empty = document.createElement('div');
+            empty.className = 'list-group-item text-muted small';
+            empty.textContent = 'No matching students';
+            this.menu.appendChild(empty);
+        }
+
+        students.forEach((student, index) => {
+            const item = document.createElement('button');
+            item.type = 'button';
+            item.className = 'list-group-item list-group-item-action py-1';
+
+            const name = document.createElement('div');
+            name.textContent = `${student.student_id} - ${student.name}`;
+            const email = document.createElement('small');
+            email.className = 'text-muted';
+            email.textContent = student.email;
+            item.append(name, email);
+
+            // mousedown fires before the input's blur hides the menu
+            item.addEventListener('mousedown', event => {
+                event.preventDefault();
+                this.choose(index);
+            });
+            this.menu.appendChild(item);
+        });
+
+        this.menu.classList.remove('d-none');
+    }
+
+    onKeyDown(event) {
+        if (this.menu.classList.contains('d-none')) {
+            return;
+        }
+
+        if (event.key === 'ArrowDown' || event.key === 'ArrowUp') {
+            event.preventDefault();
+            const step = event.key === 'ArrowDown' ? 1 : -1;
+            this.highlight((this.active + step + this.results.length) % this.results.length);
+        } else if (event.key === 'Enter' && this.results.length) {
+            event.preventDefault();
+            this.choose(this.active >= 0 ? this.active : 0);
+        } else if (event.key === 'Escape') {
+            this.hide();
+        }
+    }
+
+    highlight(index) {
+        this.active = index;
+        Array.from(this.menu.children).forEach((item, position) => {
+            item.classList.toggle('active', position === index);
+        });
+    }
+
+    choose(index) {
+        const student = this.results[index];
+        if (!student) {
+            return;
+        }
+
+        if (this.action === 'navigate') {
+            window.location.href = student.url;
+        } else {
+            this.input.value = student.student_id;
+            this.hide();
+        }
+    }
+
+    hide() {
+        this.menu.classList.add('d-none');
+    }
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('input[data-search-url]').forEach(input => new StudentTypeahead(input));
+});
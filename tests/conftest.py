@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.pool import StaticPool
+
+# app first: the other modules import it and it registers routes that import them
+from app import create_app, db
+from analytics import analytics_cache
+from cache import roster_cache, user_cache
+from models import Activity, StatCounter, Student, init_database, seed_admin
+from response_cache import response_cache
+import search
+from write_buffer import attendance_writer
+
+@pytest.fixture
+def database_uri():
+    """Database the app fixture uses; override with a file for tests that open other connections to it"""
+    return 'sqlite://'
+
+@pytest.fixture
+def app(database_uri):
+    """App bound to a fresh SQLite database (in memory by default), with the per-process caches emptied"""
+    for cache in (roster_cache, user_cache, analytics_cache, search.prefix_index, response_cache, attendance_writer):
+        cache.__init__()
+    search._fts_tables.clear()
+
+    config = {
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'SQLALCHEMY_DATABASE_URI': database_uri,
+        'AUTO_INIT_DB': False,
+        'METRICS_ENABLED': False
+    }
+    if database_uri == 'sqlite://':
+        # One shared connection, so every session sees the same in-memory database
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = {'poolclass': StaticPool, 'connect_args': {'check_same_thread': False}}
+    app = create_app(config)
+    with app.app_context():
+        init_database()
+        seed_admin()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture
+def client(app):
+    """Test client logged in as the seeded admin"""
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    return client
+
+@pytest.fixture
+def make_student(app):
+    """Create and commit a student with their QR data, keeping the student counter in step"""
+    def make(number, first_name='Test', last_name=None):
+        student = Student(
+            student_id=f'S{number:05d}',
+            first_name=first_name,
+            last_name=last_name or f'Student{number:05d}',
+            email=f's{number}@example.com'
+        )
+        db.session.add(student)
+        student.save_qr_data()
+        StatCounter.add(StatCounter.STUDENTS, 1)
+        db.session.commit()
+        return student
+    return make
+
+@pytest.fixture
+def make_activity(app):
+    """Create and commit an activity, ongoing unless start and end times are given"""
+    def make(name='Activity', start_time=None, end_time=None):
+        now = datetime.utcnow()
+        activity = Activity(
+            name=name,
+            location='Hall',
+            start_time=start_time or now - timedelta(hours=1),
+            end_time=end_time or now + timedelta(hours=1),
+            is_active=True,
+            created_by=1
+        )
+        db.session.add(activity)
+        StatCounter.add(StatCounter.ACTIVITIES, 1)
+        db.session.commit()
+        return activity
+    return make
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from archive import archive_attendance
+from models import ActivitySummary, Attendance, AttendanceArchive, AttendanceDailyCount
+
+@pytest.fixture
+def archived(client, make_student, make_activity):
+    """An activity that ended 40 days ago with two students' attendance archived, and a third student"""
+    ended = datetime.utcnow() - timedelta(days=40)
+    activity = make_activity('Old', start_time=ended - timedelta(hours=2), end_time=ended)
+    students = [make_student(number) for number in range(1, 4)]
+    Attendance.record_many(
+        [student.id for student in students[:2]],
+        activity_id=activity.id,
+        user_id=1,
+        timestamps={student.id: ended - timedelta(hours=1) for student in students}
+    )
+    assert archive_attendance(days=30)['rows'] == 2
+    return activity, students
+
+def stats_count(client, activity):
+    return client.get('/api/activities/stats', query_string={'id': activity.id}).get_json()['stats'][str(activity.id)]['count']
+
+def scan(client, activity, student):
+    return client.post('/attendance/scan', data={'activity_id': activity.id, 'scanned_data': student.qr_data}).get_json()
+
+def test_archived_attendance_is_still_read(client, archived):
+    activity, students = archived
+    assert Attendance.query.count() == 0
+    assert AttendanceArchive.query.count() == 2
+    assert stats_count(client, activity) == 2
+
+    report = client.get('/api/attendance/report', query_string={'activity_id': activity.id}).get_json()
+    assert sorted(record['student_id'] for record in report['records']) == [students[0].student_id, students[1].student_id]
+
+def test_rescans_of_archived_students_are_duplicates(client, archived):
+    activity, students = archived
+
+    result = scan(client, activity, students[0])
+    assert result['success'] is False
+    assert result['message'].startswith('Attendance already recorded')
+
+    batch = client.post('/attendance/scan/batch', json={
+        'activity_id': activity.id, 'scans': [students[0].qr_data, students[1].qr_data]
+    }).get_json()
+    assert batch['recorded'] == 0
+    assert [item['status'] for item in batch['results']] == ['duplicate', 'duplicate']
+
+    assert Attendance.query.count() == 0
+    assert stats_count(client, activity) == 2
+    assert AttendanceDailyCount.total() == 2
+
+def test_late_scans_are_recorded_and_archived_once(client, archived):
+    activity, students = archived
+
+    assert scan(client, activity, students[2])['success'] is True
+    assert stats_count(client, activity) == 3
+
+    assert archive_attendance(days=30)['rows'] == 1
+    assert db.session.get(ActivitySummary, activity.id).attendance_count == 3
+    assert AttendanceArchive.query.count() == 3
+    assert AttendanceDailyCount.total() == 3
+
+def test_archiving_drops_scans_that_raced_an_earlier_run(client, archived):
+    activity, students = archived
+
+    # As if recorded in the hot table while the first run was moving the student's row
+    row = {'student_id': students[0].id, 'activity_id': activity.id, 'scanned_by': 1, 'timestamp': datetime.utcnow()}
+    db.session.add(Attendance(**row))
+    AttendanceDailyCount.record([row])
+    db.session.commit()
+
+    assert archive_attendance(days=30)['rows'] == 0
+    assert Attendance.query.count() == 0
+    assert db.session.get(ActivitySummary, activity.id).attendance_count == 2
+    assert AttendanceDailyCount.total() == 2
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+
+from archive import archive_attendance
+from asgi import AsgiApp
+from models import Attendance, ScanReceipt
+
+@pytest.fixture
+def database_uri(tmp_path):
+    # The async engine opens its own connections, which cannot see an in-memory database
+    return f'sqlite:///{tmp_path / "asgi.db"}'
+
+@pytest.fixture
+def csrf_client(app):
+    """Test client logged in with CSRF protection on, with the session's CSRF token"""
+    app.config['WTF_CSRF_ENABLED'] = True
+    client = app.test_client()
+    token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', client.get('/login').get_data(as_text=True))[1]
+    client.post('/login', data={'username': 'admin', 'password': 'admin123', 'csrf_token': token})
+    client.csrf_token = token
+    return client
+
+def call(app, requests):
+    """Send (method, path, headers, body) requests through the ASGI app, returning (status, JSON) pairs"""
+    asgi_app = AsgiApp(app)
+
+    async def send_all():
+        responses = []
+        for method, path, headers, body in requests:
+            path, _, query_string = path.partition('?')
+            messages = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+
+            async def send(message):
+                messages.append(message)
+
+            await asgi_app({
+                'type': 'http',
+                'method': method,
+                'path': path,
+                'query_string': query_string.encode(),
+                'headers': [(key.lower().encode(), value.encode()) for key, value in headers.items()]
+            }, receive, send)
+            responses.append((messages[0]['status'], json.loads(messages[1]['body'])))
+        if asgi_app.engine is not None:
+            await asgi_app.engine.dispose()
+        return responses
+
+    # A fresh thread, as under uvicorn, where no app context is active around the ASGI app
+    with ThreadPoolExecutor(1) as executor:
+        return executor.submit(asyncio.run, send_all()).result()
+
+def scan_request(client, activity, student, token=None):
+    body = f'activity_id={activity.id}&scanned_data={student.qr_data}'
+    if token:
+        body += f'&csrf_token={token}'
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+    cookie = client.get_cookie('session')
+    if cookie is not None:
+        headers['Cookie'] = f'session={cookie.value}'
+    return 'POST', '/attendance/scan', headers, body.encode()
+
+def sync_request(client, body, token=None):
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['X-CSRFToken'] = token
+    cookie = client.get_cookie('session')
+    if cookie is not None:
+        headers['Cookie'] = f'session={cookie.value}'
+    return 'POST', '/attendance/scan/sync', headers, json.dumps(body).encode()
+
+def test_scans_use_the_flask_session_and_csrf_checks(app, csrf_client, make_student, make_activity):
+    student = make_student(1, 'Linh', 'Tran')
+    activity = make_activity()
+
+    anonymous, missing, forged, valid, repeat = call(app, [
+        scan_request(app.test_client(), activity, student, csrf_client.csrf_token),
+        scan_request(csrf_client, activity, student),
+        scan_request(csrf_client, activity, student, 'forged'),
+        scan_request(csrf_client, activity, student, csrf_client.csrf_token),
+        scan_request(csrf_client, activity, student, csrf_client.csrf_token)
+    ])
+    assert anonymous == (401, {'success': False, 'message': 'Login required'})
+    assert missing == (400, {'success': False, 'message': 'The CSRF token is missing.'})
+    assert forged[0] == 400
+    assert valid[0] == 200 and valid[1]['success'] is True
+    assert valid[1]['student'] == {'id': student.id, 'name': 'Linh Tran', 'student_id': student.student_id}
+    assert repeat == (200, {'success': False, 'message': 'Attendance already recorded for Linh Tran'})
+    assert Attendance.query.count() == 1
+
+def test_unexpected_errors_answer_with_the_flask_error_shape(app, client, make_activity, monkeypatch):
+    activity = make_activity()
+
+    def broken_engine(self):
+        raise RuntimeError('database unavailable')
+    monkeypatch.setattr(AsgiApp, 'get_engine', broken_engine)
+
+    headers = {'Cookie': f'session={client.get_cookie("session").value}'}
+    [(status, payload)] = call(app, [('GET', f'/api/activities/stats?id={activity.id}', headers, b'')])
+    assert status == 500
+    assert payload == {'success': False, 'message': 'Error: database unavailable'}
+
+def test_rescans_of_archived_students_are_duplicates(app, client, make_student, make_activity):
+    ended = datetime.utcnow() - timedelta(days=40)
+    activity = make_activity('Old', start_time=ended - timedelta(hours=2), end_time=ended)
+    archived, late = make_student(1, 'Linh', 'Tran'), make_student(2)
+    Attendance.record_many([archived.id], activity_id=activity.id, user_id=1, timestamps={archived.id: ended})
+    archive_attendance(days=30)
+
+    rescan, late_scan = call(app, [
+        scan_request(client, activity, archived),
+        scan_request(client, activity, late)
+    ])
+    assert rescan == (200, {'success': False, 'message': 'Attendance already recorded for Linh Tran'})
+    assert late_scan[1]['success'] is True
+    assert [row.student_id for row in Attendance.query] == [late.id]
+
+def test_syncs_answer_like_the_flask_endpoint(app, csrf_client, make_student, make_activity):
+    student = make_student(1, 'Linh', 'Tran')
+    activity = make_activity()
+    captured = activity.start_time + timedelta(minutes=5)
+    body = {'activity_id': activity.id, 'scans': [
+        {'key': 'key-1', 'data': student.qr_data, 'captured_at': captured.isoformat()},
+        {'key': 'key-2', 'data': student.qr_data},
+        {'key': 'key-3', 'data': 'not a code'},
+        {'key': 'key-1', 'data': student.qr_data}
+    ]}
+
+    anonymous, missing, malformed, first, retry = call(app, [
+        sync_request(app.test_client(), body, csrf_client.csrf_token),
+        sync_request(csrf_client, body),
+        sync_request(csrf_client, [body], csrf_client.csrf_token),
+        sync_request(csrf_client, body, csrf_client.csrf_token),
+        sync_request(csrf_client, body, csrf_client.csrf_token)
+    ])
+    assert anonymous == (401, {'success': False, 'message': 'Login required'})
+    assert missing == (400, {'success': False, 'message': 'The CSRF token is missing.'})
+    assert malformed == (400, {'success': False, 'message': 'Invalid sync submission'})
+
+    assert first[0] == 200 and first[1]['recorded'] == 1
+    assert [(item['key'], item['status'], item['replayed']) for item in first[1]['results']] == [
+        ('key-1', 'recorded', False), ('key-2', 'duplicate', False), ('key-3', 'invalid', False), ('key-1', 'recorded', False)
+    ]
+    assert first[1]['results'][0]['student'] == {'id': student.id, 'name': 'Linh Tran', 'student_id': student.student_id}
+    assert Attendance.query.one().timestamp == captured
+    assert ScanReceipt.query.count() == 3
+
+    # Retries are replayed exactly as the Flask endpoint replays them
+    flask_retry = csrf_client.post('/attendance/scan/sync', json=body, headers={'X-CSRFToken': csrf_client.csrf_token})
+    assert retry == (200, flask_retry.get_json())
+    assert retry[1]['recorded'] == 0
+    assert all(item['replayed'] for item in retry[1]['results'])
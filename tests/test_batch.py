@@ -0,0 +1,17 @@
+import pytest
+
+@pytest.mark.parametrize('body', [[1, 2], 'scans', 5, None])
+def test_non_object_bodies_are_rejected(client, body):
+    response = client.post('/attendance/scan/batch', json=body)
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'message': 'Invalid batch submission'}
+
+def test_batch_records_each_student_once(client, make_student, make_activity):
+    student = make_student(1)
+    activity = make_activity()
+
+    result = client.post('/attendance/scan/batch', json={
+        'activity_id': activity.id, 'scans': [student.qr_data, student.qr_data, 'not a code']
+    }).get_json()
+    assert result['recorded'] == 1
+    assert [item['status'] for item in result['results']] == ['recorded', 'duplicate', 'invalid']
@@ -0,0 +1,86 @@
+from sqlalchemy import event
+
+from app import db
+from models import Attendance, AttendanceDailyCount, DataVersion, StatCounter
+
+def scan(client, activity, student):
+    return client.post('/attendance/scan', data={'activity_id': activity.id, 'scanned_data': student.qr_data}).get_json()
+
+def test_record_attendance_ignores_repeats(app, make_student, make_activity):
+    student = make_student(1)
+    activity = make_activity()
+
+    assert Attendance.record_attendance(student_id=student.id, activity_id=activity.id, user_id=1) is True
+    assert Attendance.record_attendance(student_id=student.id, activity_id=activity.id, user_id=1) is False
+    assert Attendance.query.count() == 1
+    assert AttendanceDailyCount.total() == 1
+
+def test_record_many_reports_only_new_rows(app, make_student, make_activity):
+    students = [make_student(number) for number in range(1, 4)]
+    activity = make_activity()
+    Attendance.record_attendance(student_id=students[0].id, activity_id=activity.id, user_id=1)
+
+    new_ids = Attendance.record_many([student.id for student in students], activity_id=activity.id, user_id=1)
+    assert new_ids == {students[1].id, students[2].id}
+    assert AttendanceDailyCount.total() == 3
+
+def test_scans_leave_the_hot_counter_rows_alone(client, make_student, make_activity):
+    student = make_student(1)
+    activity = make_activity()
+    before = DataVersion.get(DataVersion.ATTENDANCE)
+
+    statements = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.lower())
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        assert scan(client, activity, student)['success'] is True
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+    writes = [statement for statement in statements if statement.startswith(('insert', 'update', 'delete'))]
+    assert not [statement for statement in writes if 'data_version' in statement or 'stat_counter' in statement]
+    assert len(writes) == 2  # the attendance row and its daily rollup
+
+    # The new row still moves the version cached responses are keyed by
+    assert DataVersion.get(DataVersion.ATTENDANCE) != before
+
+def test_deletes_change_the_attendance_version(client, make_student, make_activity):
+    student = make_student(1)
+    activity = make_activity()
+    scan(client, activity, student)
+    before = DataVersion.get(DataVersion.ATTENDANCE)
+
+    Attendance.delete_for_student(student.id)
+    db.session.commit()
+    after_delete = DataVersion.get(DataVersion.ATTENDANCE)
+    assert after_delete != before
+    assert AttendanceDailyCount.total() == 0
+
+    # Re-inserting may reuse the deleted row's id, but the counter has moved on
+    scan(client, activity, student)
+    assert DataVersion.get(DataVersion.ATTENDANCE) not in (before, after_delete)
+
+def test_deleting_an_activity_removes_its_rollups(client, make_student, make_activity):
+    student = make_student(1)
+    kept, deleted = make_activity('Kept'), make_activity('Deleted')
+    scan(client, kept, student)
+    scan(client, deleted, student)
+    assert AttendanceDailyCount.total() == 2
+
+    client.post(f'/activities/{deleted.id}/delete')
+    assert AttendanceDailyCount.total() == 1
+    assert StatCounter.get_many(StatCounter.ACTIVITIES)[StatCounter.ACTIVITIES] == 1
+
+def test_rebuild_matches_the_maintained_counters(client, make_student, make_activity):
+    students = [make_student(number) for number in range(1, 3)]
+    activity = make_activity()
+    for student in students:
+        scan(client, activity, student)
+    maintained = StatCounter.get_many(StatCounter.STUDENTS, StatCounter.ACTIVITIES)
+    before = DataVersion.get(DataVersion.ATTENDANCE)
+
+    counts = AttendanceDailyCount.rebuild()
+    assert counts == dict(maintained, attendance=2)
+    assert AttendanceDailyCount.total() == 2
+    assert DataVersion.get(DataVersion.ATTENDANCE) != before
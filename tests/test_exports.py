@@ -0,0 +1,23 @@
+def test_csv_export_names_its_charset_once(client, make_student, make_activity):
+    student = make_student(1, 'Linh', 'Tran')
+    activity = make_activity()
+    client.post('/attendance/scan', data={'activity_id': activity.id, 'scanned_data': student.qr_data})
+
+    response = client.get('/attendance/report/export')
+    assert response.status_code == 200
+    assert response.headers['Content-Type'] == 'text/csv; charset=utf-8'
+    assert 'Linh Tran' in response.get_data(as_text=True)
+
+def test_badge_sheets_render_in_the_request_thread(app, client, make_student, monkeypatch):
+    import qr_render
+
+    def no_pool(*args, **kwargs):
+        raise AssertionError('web requests must not start worker processes')
+    monkeypatch.setattr(qr_render, 'ProcessPoolExecutor', no_pool)
+    app.config['BADGE_WORKERS'] = 4
+    make_student(1)
+
+    response = client.get('/students/badges.pdf')
+    assert response.status_code == 200
+    body = response.get_data()
+    assert body.startswith(b'%PDF-1.4') and body.rstrip().endswith(b'%%EOF')
@@ -0,0 +1,34 @@
+import imports
+from imports import import_students
+from models import Student
+
+def student_row(number):
+    return {
+        'student_id': f'S{number:04d}',
+        'first_name': 'Test',
+        'last_name': f'Student {number}',
+        'email': f'student{number}@example.com'
+    }
+
+def test_duplicates_within_a_file_are_rejected(app):
+    report = import_students(enumerate([student_row(1), student_row(1), student_row(2)], start=2), chunk_size=2)
+    assert report.imported == 2
+    assert [error['line'] for error in report.errors] == [3]
+
+def test_rows_from_a_rolled_back_chunk_can_be_retried_later_in_the_file(app, monkeypatch):
+    insert_chunk = imports._insert_chunk
+    calls = []
+
+    def fail_first_chunk(rows):
+        calls.append(len(rows))
+        if len(calls) == 1:
+            raise RuntimeError('disk full')
+        return insert_chunk(rows)
+
+    monkeypatch.setattr(imports, '_insert_chunk', fail_first_chunk)
+    rows = [student_row(1), student_row(2), student_row(1), student_row(2)]
+    report = import_students(enumerate(rows, start=2), chunk_size=2)
+
+    assert report.imported == 2
+    assert [error['line'] for error in report.errors] == [2, 3]
+    assert Student.query.count() == 2
@@ -0,0 +1,116 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from asgi import AsgiApp
+from live_feed import live_feed
+from models import Attendance
+
+@pytest.fixture
+def database_uri(tmp_path):
+    # The ASGI stream reads through the async engine's own connections
+    return f'sqlite:///{tmp_path / "feed.db"}'
+
+def record(students, activity):
+    Attendance.record_many([student.id for student in students], activity_id=activity.id, user_id=1)
+    return [row.id for row in Attendance.query.filter_by(activity_id=activity.id).order_by(Attendance.id)]
+
+def poll(client, activity, after):
+    return client.get(f'/attendance/feed/{activity.id}', query_string={'after': after}).get_json()
+
+def stream(app, client, activity, after, during=None, disconnect=False):
+    """Follow the ASGI event stream until it closes, returning its attendance events
+
+    during(asgi_app) runs on the event loop once the stream is open; the client
+    then goes away if disconnect is set.
+    """
+    asgi_app = AsgiApp(app)
+    path = f'/attendance/feed/{activity.id}'
+    headers = [
+        (b'accept', b'text/event-stream'),
+        (b'cookie', f'session={client.get_cookie("session").value}'.encode())
+    ]
+
+    async def follow():
+        messages = []
+        opened = asyncio.Event()
+        gone = asyncio.Event()
+
+        async def receive():
+            await gone.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+            opened.set()
+
+        streaming = asyncio.ensure_future(asgi_app({
+            'type': 'http',
+            'method': 'GET',
+            'path': path,
+            'query_string': f'after={after}'.encode(),
+            'headers': headers
+        }, receive, send))
+        try:
+            await opened.wait()
+            if during is not None:
+                await during(asgi_app)
+            if disconnect:
+                gone.set()
+            await streaming
+        finally:
+            # Open aiosqlite connections would keep the process alive
+            streaming.cancel()
+            await asgi_app.engine.dispose()
+        return messages
+
+    # A fresh thread, as under uvicorn, where no app context is active around the ASGI app
+    with ThreadPoolExecutor(1) as executor:
+        messages = executor.submit(asyncio.run, follow()).result()
+
+    assert messages[0]['status'] == 200
+    body = b''.join(message.get('body', b'') for message in messages[1:]).decode()
+    return [json.loads(line[len('data: '):]) for line in body.splitlines() if line.startswith('data: ')]
+
+def test_polls_return_events_after_the_cursor_with_a_running_count(client, make_student, make_activity):
+    students = [make_student(number) for number in range(1, 5)]
+    activity = make_activity()
+    ids = record(students, activity)
+
+    assert [event['count'] for event in poll(client, activity, 0)['events']] == [1, 2, 3, 4]
+    page = poll(client, activity, ids[1])
+    assert [event['count'] for event in page['events']] == [3, 4]
+    assert page['cursor'] == ids[-1]
+    assert poll(client, activity, ids[-1]) == {'success': True, 'events': [], 'cursor': ids[-1]}
+
+def test_take_pages_poll_when_served_by_flask(client, make_activity):
+    activity = make_activity()
+    page = client.get(f'/attendance/take/{activity.id}').get_data(as_text=True)
+    assert 'data-feed-stream="false"' in page
+
+def test_the_asgi_app_streams_the_backlog_and_new_scans(app, client, make_student, make_activity):
+    app.config.update(LIVE_FEED_POLL_INTERVAL=0.05, LIVE_FEED_KEEPALIVE=0.05, LIVE_FEED_MAX_DURATION=1)
+    students = [make_student(number) for number in range(1, 5)]
+    activity = make_activity()
+    ids = record(students[:2], activity)
+    student_ids = [student.id for student in students]
+    activity_id = activity.id
+
+    async def scan_more(asgi_app):
+        for student_id in student_ids[2:]:
+            await asgi_app.record_attendance(student_id, activity_id, 1)
+
+    events = stream(app, client, activity, ids[0], during=scan_more)
+    assert [event['count'] for event in events] == [2, 3, 4]
+    assert [event['student']['id'] for event in events] == student_ids[1:]
+    assert live_feed.stats() == {}
+
+def test_streams_end_when_the_client_goes_away(app, client, make_student, make_activity):
+    app.config['LIVE_FEED_MAX_DURATION'] = 60
+    activity = make_activity()
+    ids = record([make_student(1)], activity)
+
+    assert [event['id'] for event in stream(app, client, activity, 0, disconnect=True)] == ids
+    assert live_feed.stats() == {}
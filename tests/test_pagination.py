@@ -0,0 +1,63 @@
+import base64
+import json
+from datetime import date, datetime
+
+import pytest
+
+from pagination import decode_cursor, encode_cursor
+
+def raw_cursor(items):
+    return base64.urlsafe_b64encode(json.dumps(items).encode()).decode().rstrip('=')
+
+def test_cursor_round_trip():
+    values = ['Nguyen', 42, 1.5, datetime(2024, 5, 1, 8, 30), date(2024, 5, 1)]
+    assert decode_cursor(encode_cursor(values), len(values)) == values
+
+@pytest.mark.parametrize('cursor', [
+    'not base64!',
+    raw_cursor({'v': 1}),
+    raw_cursor(5),
+    raw_cursor([['v', None]]),
+    raw_cursor([['v', True]]),
+    raw_cursor([['v', [1, 2]]]),
+    raw_cursor([['v', {'id': 1}]]),
+    raw_cursor([['x', 1]]),
+    raw_cursor([['dt', 12]]),
+    raw_cursor([['d', 'yesterday']]),
+    raw_cursor([['v', 1, 2]]),
+    raw_cursor([[[[[]]]]] * 2),
+    base64.urlsafe_b64encode(b'[' * 100000).decode()
+])
+def test_malformed_cursors_decode_to_none(cursor):
+    assert decode_cursor(cursor) is None
+
+def test_cursor_must_match_the_sort_key():
+    cursor = encode_cursor(['Nguyen', 'An', 7])
+    assert decode_cursor(cursor, 3) == ['Nguyen', 'An', 7]
+    assert decode_cursor(cursor, 2) is None
+
+def test_pages_cover_every_student_once(client, make_student):
+    students = [make_student(number) for number in range(1, 8)]
+
+    seen, cursor = [], None
+    while True:
+        page = client.get('/api/students', query_string={'per_page': 3, 'cursor': cursor}).get_json()
+        seen += [student['id'] for student in page['students']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(student.id for student in students)
+    assert len(seen) == len(set(seen))
+
+@pytest.mark.parametrize('items', [
+    [['v', 'Student00002'], ['v', 'Test']],
+    [['v', {'a': 1}], ['v', 'Test'], ['v', 2]],
+    [['v', 'Student00002'], ['v', 'Test'], ['v', [2]]]
+])
+def test_tampered_cursors_restart_the_listing(client, make_student, items):
+    for number in range(1, 4):
+        make_student(number)
+
+    response = client.get('/api/students', query_string={'per_page': 2, 'cursor': raw_cursor(items)})
+    assert response.status_code == 200
+    assert [student['student_id'] for student in response.get_json()['students']] == ['S00001', 'S00002']
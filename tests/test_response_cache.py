@@ -0,0 +1,102 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from app import db
+from models import Attendance, AttendanceDailyCount, User, increment_statement
+
+@contextmanager
+def statements():
+    """Collect the SQL statements run inside the block"""
+    executed = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        yield executed
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+def stats(client, activity):
+    response = client.get('/api/activities/stats', query_string={'id': activity.id})
+    return response.headers.get('X-Cache'), response.get_json()['stats'][str(activity.id)]
+
+def scan(client, activity, student):
+    return client.post('/attendance/scan', data={'activity_id': activity.id, 'scanned_data': student.qr_data}).get_json()
+
+def test_repeat_loads_are_served_without_queries(app, client, make_activity):
+    app.config['RESPONSE_CACHE_CHECK_INTERVAL'] = 60
+    make_activity()
+
+    assert client.get('/dashboard').headers['X-Cache'] == 'miss'
+    with statements() as executed:
+        response = client.get('/dashboard')
+    assert response.headers['X-Cache'] == 'hit'
+    assert executed == []
+
+def test_etags_answer_with_not_modified(client):
+    etag = client.get('/dashboard').headers['ETag']
+
+    response = client.get('/dashboard', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['X-Cache'] == 'revalidated'
+
+def test_etags_expire_with_the_cached_entry(app, client):
+    app.config['RESPONSE_CACHE_TTL'] = 0
+    etag = client.get('/dashboard').headers['ETag']
+
+    response = client.get('/dashboard', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['X-Cache'] == 'miss'
+
+def test_scans_in_this_worker_invalidate_at_once(app, client, make_student, make_activity):
+    app.config['RESPONSE_CACHE_CHECK_INTERVAL'] = 60
+    student = make_student(1)
+    activity = make_activity()
+    assert stats(client, activity) == ('miss', {'count': 0, 'rate': 0})
+    assert stats(client, activity)[0] == 'hit'
+
+    scan(client, activity, student)
+    assert stats(client, activity) == ('miss', {'count': 1, 'rate': 100.0})
+
+def test_other_workers_writes_are_seen_after_the_check_interval(app, client, make_student, make_activity):
+    app.config['RESPONSE_CACHE_CHECK_INTERVAL'] = 60
+    student = make_student(1)
+    activity = make_activity()
+    assert stats(client, activity)[1]['count'] == 0
+
+    # Another worker's insert: no session events here, and no version counter bump anywhere
+    with db.engine.begin() as connection:
+        connection.execute(db.insert(Attendance).values(
+            student_id=student.id, activity_id=activity.id, scanned_by=1, timestamp=activity.start_time
+        ))
+        connection.execute(increment_statement(
+            AttendanceDailyCount, {'day': activity.start_time.date(), 'activity_id': activity.id}, 'count', 1
+        ))
+    assert stats(client, activity) == ('hit', {'count': 0, 'rate': 0})
+
+    app.config['RESPONSE_CACHE_CHECK_INTERVAL'] = 0
+    assert stats(client, activity) == ('miss', {'count': 1, 'rate': 100.0})
+
+def test_new_students_invalidate_rates(client, make_student, make_activity):
+    student = make_student(1)
+    activity = make_activity()
+    scan(client, activity, student)
+    assert stats(client, activity)[1]['rate'] == 100.0
+
+    client.post('/students/add', data={
+        'student_id': 'S00002', 'first_name': 'New', 'last_name': 'Student', 'email': 'new@example.com'
+    })
+    assert stats(client, activity)[1] == {'count': 1, 'rate': 50.0}
+
+def test_pages_are_cached_per_user(app, client):
+    db.session.add(User(username='staff', email='staff@example.com', password_hash=generate_password_hash('staff123')))
+    db.session.commit()
+    staff = app.test_client()
+    staff.post('/login', data={'username': 'staff', 'password': 'staff123'})
+
+    assert client.get('/dashboard').headers['X-Cache'] == 'miss'
+    assert staff.get('/dashboard').headers['X-Cache'] == 'miss'
+    assert staff.get('/dashboard').headers['X-Cache'] == 'hit'
+    assert client.get('/dashboard').headers['ETag'] != staff.get('/dashboard').headers['ETag']
@@ -0,0 +1,14 @@
+from qr_render import _pdf_text
+from utils import ascii_fold
+
+def test_ascii_fold_strips_diacritics():
+    assert ascii_fold('Đặng Thị Ánh') == 'Dang Thi Anh'
+    assert _pdf_text('Nguyễn (Bé)') == 'Nguyen \\(Be\\)'
+
+def test_search_matches_names_without_their_diacritics(client, make_student):
+    student = make_student(1, 'Ánh', 'Đặng')
+    make_student(2, 'Minh', 'Le')
+
+    for query in ('dang', 'Đặng', 'anh dang'):
+        result = client.get('/api/students/search', query_string={'q': query}).get_json()
+        assert [found['id'] for found in result['students']] == [student.id], query
@@ -0,0 +1,16 @@
+import sqlite3
+
+import pytest
+
+from app import apply_sqlite_pragmas
+
+def pragmas(tmp_path, **config):
+    connection = sqlite3.connect(tmp_path / 'pragmas.db')
+    apply_sqlite_pragmas(connection, dict({'ARCHIVE_DATABASE_FILE': None, 'SQLITE_BUSY_TIMEOUT': 1234}, **config))
+    values = {name: connection.execute(f'PRAGMA {name}').fetchone()[0] for name in ('busy_timeout', 'journal_mode')}
+    connection.close()
+    return values
+
+@pytest.mark.parametrize('wal', [True, False])
+def test_busy_timeout_is_set_in_every_journal_mode(tmp_path, wal):
+    assert pragmas(tmp_path, SQLITE_WAL=wal) == {'busy_timeout': 1234, 'journal_mode': 'wal' if wal else 'delete'}
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Attendance, ScanReceipt
+
+def sync(client, activity, scans):
+    return client.post('/attendance/scan/sync', json={'activity_id': activity.id, 'scans': scans}).get_json()
+
+def test_retried_keys_are_replayed_with_the_student(client, make_student, make_activity):
+    student = make_student(1, 'Linh', 'Tran')
+    activity = make_activity()
+    scans = [{'key': 'key-1', 'data': student.qr_data}]
+
+    first = sync(client, activity, scans)
+    assert first['recorded'] == 1
+    assert first['results'][0]['replayed'] is False
+
+    retry = sync(client, activity, scans)
+    assert retry['recorded'] == 0
+    result = retry['results'][0]
+    assert result['replayed'] is True
+    assert result['status'] == 'recorded'
+    assert result['student'] == first['results'][0]['student'] == {
+        'id': student.id, 'name': 'Linh Tran', 'student_id': student.student_id
+    }
+    assert Attendance.query.count() == 1
+
+def test_duplicate_keys_in_one_sync_are_processed_once(client, make_student, make_activity):
+    student = make_student(1)
+    activity = make_activity()
+
+    result = sync(client, activity, [{'key': 'same', 'data': student.qr_data}] * 2)
+    assert result['recorded'] == 1
+    assert [item['key'] for item in result['results']] == ['same', 'same']
+    assert ScanReceipt.query.count() == 1
+
+def test_invalid_codes_get_a_receipt_too(client, make_activity):
+    activity = make_activity()
+
+    first = sync(client, activity, [{'key': 'bad', 'data': 'not a code'}])
+    retry = sync(client, activity, [{'key': 'bad', 'data': 'not a code'}])
+    assert first['results'][0]['status'] == retry['results'][0]['status'] == 'invalid'
+    assert retry['results'][0]['replayed'] is True
+    assert 'student' not in retry['results'][0]
+
+@pytest.mark.parametrize('body', [[1, 2], 'scans', 5, None])
+def test_non_object_bodies_are_rejected(client, body):
+    response = client.post('/attendance/scan/sync', json=body)
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'message': 'Invalid sync submission'}
+
+def test_capture_times_outside_the_activity_fall_back_to_server_time(client, make_student, make_activity):
+    activity = make_activity()
+    inside = activity.start_time + timedelta(minutes=5)
+    scans = [
+        {'key': 'inside', 'data': make_student(1).qr_data, 'captured_at': inside.isoformat()},
+        {'key': 'ancient', 'data': make_student(2).qr_data, 'captured_at': '2020-01-01T00:00:00'},
+        {'key': 'future', 'data': make_student(3).qr_data, 'captured_at': '2999-01-01T00:00:00'}
+    ]
+
+    before = datetime.utcnow()
+    sync(client, activity, scans)
+    times = [row.timestamp for row in Attendance.query.order_by(Attendance.student_id)]
+    assert times[0] == inside
+    assert all(time >= before for time in times[1:])
+
+def test_retries_racing_their_original_replay_its_receipt(client, make_student, make_activity, monkeypatch):
+    student = make_student(1)
+    activity = make_activity()
+    scans = [{'key': 'key-1', 'data': student.qr_data}]
+    sync(client, activity, scans)
+
+    # The retry looked for receipts before the original committed
+    find = ScanReceipt.find
+    lookups = []
+    def find_after_original(keys):
+        lookups.append(keys)
+        return find(keys) if len(lookups) > 1 else {}
+    monkeypatch.setattr(ScanReceipt, 'find', find_after_original)
+
+    retry = sync(client, activity, scans)
+    assert retry['success'] is True
+    assert retry['results'][0]['replayed'] is True
+    assert retry['results'][0]['status'] == 'recorded'
+    assert ScanReceipt.query.count() == 1
@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+import pytest
+
+from models import Attendance
+from write_buffer import attendance_writer
+
+@pytest.fixture
+def database_uri(tmp_path):
+    # The writer thread commits on its own connection
+    return f'sqlite:///{tmp_path / "buffered.db"}'
+
+@pytest.fixture
+def buffered(app):
+    app.config['ATTENDANCE_WRITE_MODE'] = 'buffered'
+
+def test_batches_go_through_the_writer(client, buffered, make_student, make_activity):
+    students = [make_student(number) for number in range(1, 4)]
+    activity = make_activity()
+
+    result = client.post('/attendance/scan/batch', json={
+        'activity_id': activity.id, 'scans': [student.qr_data for student in students] + [students[0].qr_data]
+    }).get_json()
+    assert result['recorded'] == 3
+    assert [item['status'] for item in result['results']] == ['recorded'] * 3 + ['duplicate']
+    assert attendance_writer.stats()['rows'] == 3
+    assert Attendance.query.count() == 3
+
+def test_syncs_go_through_the_writer_with_their_capture_times(client, buffered, make_student, make_activity):
+    student = make_student(1)
+    activity = make_activity()
+    early = activity.start_time.replace(microsecond=0)
+    scans = [
+        {'key': 'late', 'data': student.qr_data, 'captured_at': (early + timedelta(minutes=1)).isoformat()},
+        {'key': 'early', 'data': student.qr_data, 'captured_at': early.isoformat()}
+    ]
+
+    result = client.post('/attendance/scan/sync', json={'activity_id': activity.id, 'scans': scans}).get_json()
+    assert result['recorded'] == 1
+    assert attendance_writer.stats()['flushes'] >= 1
+    assert Attendance.query.one().timestamp == early
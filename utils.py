@@ -1,8 +1,11 @@
 import json
+import unicodedata
 from functools import wraps
-from flask import flash, redirect, url_for
+from flask import current_app, flash, redirect, url_for
 from flask_login import current_user
 
+from qr_tokens import decode_token, encode_token, is_token
+
 def admin_required(f):
     """Decorator to require admin access for a route"""
     @wraps(f)
@@ -15,10 +18,37 @@ def admin_required(f):
 
 def generate_qr_code_data(student):
     """Generate QR code data for a student"""
-    # This function creates the QR code data structure
-    data = {
-        'id': student.id,
-        'student_id': student.student_id,
-        'name': f"{student.first_name} {student.last_name}"
-    }
-    return json.dumps(data)
+    return encode_token(student.id)
+
+def parse_qr_payload(scanned_data):
+    """Extract the student primary key from scanned QR data, raising ValueError if invalid"""
+    # Signed tokens are verified in memory, so forged codes never reach the database
+    if is_token(scanned_data):
+        return decode_token(scanned_data)
+    
+    # Legacy JSON payloads are accepted until every printed code has been reissued
+    if not current_app.config['QR_ACCEPT_LEGACY']:
+        raise ValueError('Outdated QR code, please reissue it')
+    
+    try:
+        data = json.loads(scanned_data)
+    except (TypeError, json.JSONDecodeError):
+        raise ValueError('Invalid QR code data')
+
+    if not isinstance(data, dict) or 'id' not in data:
+        raise ValueError('Invalid QR code format')
+
+    student_id = data.get('id')
+    if student_id is None:
+        raise ValueError('Student ID missing in QR code')
+
+    try:
+        return int(student_id)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid QR code format')
+
+def ascii_fold(text):
+    """Strip diacritics down to plain ASCII (e.g. 'Đặng' -> 'Dang'), for PDF fonts and search keys"""
+    text = text.replace('đ', 'd').replace('Đ', 'D')
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).encode('ascii', 'replace').decode()
@@ -0,0 +1,141 @@
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from datetime import datetime
+
+from flask import current_app
+
+from app import db
+from models import Attendance
+
+class AttendanceWriter:
+    """Background writer that group-commits scan inserts queued by request threads
+
+    Requests wait on a future for their own row, so each still learns whether
+    the scan was new or a duplicate, but a burst of scans costs one transaction
+    (one fsync and one database lock) per flush instead of one per scan.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.flushes = 0
+        self.rows = 0
+        self.largest_flush = 0
+
+    def submit(self, student_id, activity_id, user_id, timestamp=None):
+        """Queue a scan (taken now unless timestamp is given) and return a future resolving to True if it was newly recorded"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((student_id, activity_id, user_id, timestamp or datetime.utcnow(), future))
+        return future
+
+    def stats(self):
+        return {
+            'pending': self._queue.qsize(),
+            'flushes': self.flushes,
+            'rows': self.rows,
+            'largest_flush': self.largest_flush
+        }
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                app = current_app._get_current_object()
+                self._thread = threading.Thread(target=self._run, args=(app,), name='attendance-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self, app):
+        max_rows = app.config['ATTENDANCE_FLUSH_ROWS']
+        max_wait = app.config['ATTENDANCE_FLUSH_MS'] / 1000
+        while True:
+            batch = [self._queue.get()]
+
+            # Gather whatever else arrives within the flush window
+            deadline = time.monotonic() + max_wait
+            while len(batch) < max_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._flush(app, batch)
+
+    def _flush(self, app, batch):
+        with app.app_context():
+            try:
+                groups = defaultdict(dict)
+                for student_id, activity_id, user_id, timestamp, _ in batch:
+                    # The earliest capture of each student is the one that gets recorded
+                    timestamps = groups[(activity_id, user_id)]
+                    if student_id not in timestamps or timestamp < timestamps[student_id]:
+                        timestamps[student_id] = timestamp
+
+                recorded = set()
+                for (activity_id, user_id), timestamps in groups.items():
+                    new_ids = Attendance.record_many(
+                        student_ids=timestamps.keys(),
+                        activity_id=activity_id,
+                        user_id=user_id,
+                        timestamps=timestamps,
+                        commit=False
+                    )
+                    recorded.update((activity_id, student_id) for student_id in new_ids)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Error flushing attendance writes: {str(e)}")
+                for item in batch:
+                    item[4].set_exception(e)
+                return
+
+        self.flushes += 1
+        self.rows += len(batch)
+        self.largest_flush = max(self.largest_flush, len(batch))
+
+        # Only the first scan of a student in the flush counts as new; repeats are duplicates
+        for student_id, activity_id, _, _, future in batch:
+            key = (activity_id, student_id)
+            future.set_result(key in recorded)
+            recorded.discard(key)
+
+attendance_writer = AttendanceWriter()
+
+def record_attendance(student_id, activity_id, user_id):
+    """Record a scan using the configured ATTENDANCE_WRITE_MODE, returning False if already recorded"""
+    if current_app.config['ATTENDANCE_WRITE_MODE'] != 'buffered':
+        return Attendance.record_attendance(student_id=student_id, activity_id=activity_id, user_id=user_id)
+
+    future = attendance_writer.submit(student_id, activity_id, user_id)
+    return future.result(timeout=current_app.config['ATTENDANCE_WRITE_TIMEOUT'])
+
+def record_attendance_many(student_ids, activity_id, user_id, timestamps=None):
+    """Record several scans using the configured ATTENDANCE_WRITE_MODE, returning the newly recorded student ids
+
+    In direct mode the rows join the caller's transaction; buffered mode commits
+    them with the writer's next flush, before the caller commits anything else.
+    """
+    if current_app.config['ATTENDANCE_WRITE_MODE'] != 'buffered':
+        return Attendance.record_many(
+            student_ids=student_ids,
+            activity_id=activity_id,
+            user_id=user_id,
+            timestamps=timestamps,
+            commit=False
+        )
+
+    futures = {
+        student_id: attendance_writer.submit(student_id, activity_id, user_id, timestamps.get(student_id) if timestamps else None)
+        for student_id in student_ids
+    }
+    timeout = current_app.config['ATTENDANCE_WRITE_TIMEOUT']
+    return {student_id for student_id, future in futures.items() if future.result(timeout=timeout)}